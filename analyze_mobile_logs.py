@@ -1,98 +1,227 @@
 import json
 import argparse
-import statistics
+import glob
+import gzip
 import os
-from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from quantile_sketch import QuantileSketch
+from results_table import TABLE_FORMATS, TableWriter, new_run_id, perf_log_row, resolve_format
+from tracing import server_time_ms, true_network_ms
 
 """分析前端导出的 mobile_perf_logs.json 日志文件，生成统计结果。
 使用:
     python analyze_mobile_logs.py --input mobile_perf_logs.json --out summary.json --csv summary.csv
+    python analyze_mobile_logs.py --input output/perf_logs/ archive/*.jsonl.gz --workers 8
 分组维度: 模式(mode)、压缩目标(resize_target)、网络类型(effectiveType)
-统计字段: client_total_ms, server_total_ms(或predict_ms), end_to_end_ms, network_ms
+统计字段: client_total_ms, server_total_ms, end_to_end_ms, network_ms, true_network_ms
+- server_total: 服务端处理耗时，优先取 Server-Timing 的 total（见 tracing.py），旧日志退回 endpoint_ms / total_ms / predict_ms；
+- end_to_end: 客户端从捕获到解析完响应的总耗时；network_ms 是客户端测得的往返时间，已经包含服务端处理，
+  因此不再与服务端耗时相加（旧版本的 end_to_end = 客户端 + 服务端把服务端时间算了两次）；
+- true_network: 往返时间减去服务端处理耗时，即真正花在网络传输上的时间。
+
+流式处理，内存占用与日志总量无关:
+- 输入可以是 JSON 数组（导出格式）或 JSONL（/perf_logs 落盘格式），可为 .gz；逐条增量解析，不整体载入；
+- 每组每个指标用可合并的分位数草图（quantile_sketch.QuantileSketch，相对误差 1%）代替保存全部样本；
+- 多个文件 / 目录在进程池中并行分析，各自的部分统计再合并。
+--table DIR 时同时把每条日志写成统一列式表的一行（见 results_table.py），供跨运行查询与 visualize_logs.py 直接绘图。
 """
 
-def p90(values):
-    if not values:
-        return None
-    idx = int(0.9 * (len(values) - 1))
-    return sorted(values)[idx]
-
-def stats(values):
-    if not values:
-        return {}
-    return {
-        'count': len(values),
-        'avg': statistics.mean(values),
-        'median': statistics.median(values),
-        'p90': p90(values),
-        'min': min(values),
-        'max': max(values),
-        'std': statistics.pstdev(values) if len(values) > 1 else 0.0
-    }
+METRICS = ('client_total', 'server_total', 'network_ms', 'end_to_end', 'true_network')
+_CHUNK = 1 << 20
+
+
+def open_text(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+
+def _iter_json_array(f, buf):
+    """增量解析 JSON 数组: buf 为已读入、以 '[' 开头的内容；内存中只保留一个分块加当前条目"""
+    decoder = json.JSONDecoder()
+    pos = buf.index('[') + 1
+    eof = False
+    while True:
+        while pos < len(buf) and buf[pos] in ' \t\r\n,':
+            pos += 1
+        if pos >= len(buf):
+            if eof:
+                raise ValueError('日志数组未正常结束')
+            buf, pos = f.read(_CHUNK), 0
+            eof = not buf
+            continue
+        if buf[pos] == ']':
+            return
+        try:
+            obj, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            # 条目跨越分块边界: 读入下一块后重试
+            more = f.read(_CHUNK)
+            if not more or len(buf) - pos > 64 * _CHUNK:
+                raise
+            buf, pos = buf[pos:] + more, 0
+            continue
+        yield obj
+        pos = end
+        if pos > _CHUNK:
+            buf, pos = buf[pos:], 0
+
+
+def iter_entries(path):
+    """逐条产出日志条目，自动识别 JSON 数组与 JSONL"""
+    with open_text(path) as f:
+        head = f.read(_CHUNK)
+        stripped = head.lstrip()
+        if stripped.startswith('['):
+            yield from _iter_json_array(f, stripped)
+            return
+        if stripped and not stripped.startswith('{'):
+            raise ValueError(f'{path}: 日志文件格式错误，需为数组或 JSONL')
+        # JSONL: 拼接分块后按行解析
+        pending = head
+        while True:
+            *lines, pending = pending.split('\n')
+            for line in lines:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+            more = f.read(_CHUNK)
+            if not more:
+                break
+            pending += more
+        if pending.strip():
+            yield json.loads(pending)
+
+
+def group_key(entry):
+    mode = entry.get('mode') or 'unknown'
+    resize_target = (entry.get('client_meta') or {}).get('resize_target') or 'none'
+    net_type = (entry.get('network_info') or {}).get('effectiveType') or 'unknown'
+    return (mode, resize_target, net_type)
+
+
+def new_group(relative_accuracy):
+    group = {m: QuantileSketch(relative_accuracy) for m in METRICS}
+    group['samples'] = 0
+    return group
+
+
+def summarize_file(path, relative_accuracy=0.01, table_dir=None, table_format='auto', run_id=None):
+    """单个文件的部分统计: {分组: {'samples': n, 指标: QuantileSketch}}"""
+    groups = {}
+    writer = TableWriter(table_dir, table_format) if table_dir else None
+    for entry in iter_entries(path):
+        if not isinstance(entry, dict):
+            continue
+        if writer is not None:
+            writer.add(perf_log_row(entry, run_id))
+        key = group_key(entry)
+        g = groups.get(key)
+        if g is None:
+            g = groups[key] = new_group(relative_accuracy)
+        g['samples'] += 1
+        ct = entry.get('client_timing') or {}
+        client_ms = ct.get('total_client_ms')
+        server_ms = server_time_ms(entry)
+        net = ct.get('network_ms')
+        true_net = true_network_ms(entry)
+        if client_ms is not None:
+            g['client_total'].add(client_ms)
+            g['end_to_end'].add(client_ms)
+        if server_ms is not None:
+            g['server_total'].add(server_ms)
+        if net is not None:
+            g['network_ms'].add(net)
+        if true_net is not None:
+            g['true_network'].add(true_net)
+    if writer is not None:
+        writer.close()
+    return groups
+
+
+def merge_groups(total, part):
+    for key, g in part.items():
+        if key not in total:
+            total[key] = g
+            continue
+        t = total[key]
+        t['samples'] += g['samples']
+        for m in METRICS:
+            t[m].merge(g[m])
+    return total
+
+
+def expand_inputs(inputs):
+    files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            files.extend(sorted(os.path.join(item, f) for f in os.listdir(item)
+                                if f.endswith(('.json', '.jsonl', '.json.gz', '.jsonl.gz'))))
+        elif any(c in item for c in '*?['):
+            files.extend(sorted(glob.glob(item)))
+        else:
+            files.append(item)
+    return files
+
 
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument('--input', required=True)
+    ap.add_argument('--input', required=True, nargs='+', help='日志文件、目录或通配符，可多个')
     ap.add_argument('--out', default='summary.json')
     ap.add_argument('--csv', default='summary.csv')
+    ap.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    ap.add_argument('--relative-accuracy', type=float, default=0.01, help='分位数相对误差')
+    ap.add_argument('--table', default=None, help='同时写出逐条日志的列式表目录')
+    ap.add_argument('--table-format', choices=TABLE_FORMATS, default='auto')
     args = ap.parse_args()
 
-    with open(args.input, 'r', encoding='utf-8') as f:
-        logs = json.load(f)
-    if not isinstance(logs, list):
-        raise ValueError('日志文件格式错误，需为数组')
+    files = expand_inputs(args.input)
+    if not files:
+        raise ValueError('没有找到日志文件')
 
-    groups = defaultdict(list)
-    for entry in logs:
-        mode = entry.get('mode', 'unknown')
-        resize_target = entry.get('client_meta', {}).get('resize_target', 'none')
-        net_type = entry.get('network_info', {}).get('effectiveType', 'unknown')
-        key = (mode, resize_target, net_type)
-        groups[key].append(entry)
+    groups = {}
+    workers = max(1, min(args.workers, len(files)))
+    n = len(files)
+    # 在主进程里确定表格式（退回 csv.gz 时只提示一次），各工作进程直接使用
+    table_format = resolve_format(args.table_format) if args.table else args.table_format
+    extra = ([args.relative_accuracy] * n, [args.table] * n, [table_format] * n, [new_run_id()] * n)
+    if workers == 1:
+        for part in map(summarize_file, files, *extra):
+            merge_groups(groups, part)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for part in pool.map(summarize_file, files, *extra):
+                merge_groups(groups, part)
+    print(f"分析 {len(files)} 个文件, {sum(g['samples'] for g in groups.values())} 条日志, {workers} 个进程")
 
     summary = {}
     rows = []
-    for (mode, resize_target, net_type), entries in groups.items():
-        client_total = []
-        server_total = []
-        network_ms = []
-        end_to_end = []
-        for e in entries:
-            ct = e.get('client_timing', {})
-            st = e.get('server_timing', {})
-            client_ms = ct.get('total_client_ms')
-            # server total 取 total_ms 或 predict_ms
-            server_ms = st.get('total_ms', st.get('predict_ms'))
-            net = ct.get('network_ms')
-            if client_ms is not None:
-                client_total.append(client_ms)
-            if server_ms is not None:
-                server_total.append(server_ms)
-            if client_ms is not None and server_ms is not None:
-                end_to_end.append(client_ms + server_ms)
-            if net is not None:
-                network_ms.append(net)
-
+    for (mode, resize_target, net_type), g in groups.items():
         summary_key = f"{mode}|{resize_target}|{net_type}"
         summary[summary_key] = {
             'mode': mode,
             'resize_target': resize_target,
             'network_type': net_type,
-            'samples': len(entries),
-            'client_total_stats': stats(client_total),
-            'server_total_stats': stats(server_total),
-            'network_ms_stats': stats(network_ms),
-            'end_to_end_stats': stats(end_to_end)
+            'samples': g['samples'],
+            'client_total_stats': g['client_total'].stats(),
+            'server_total_stats': g['server_total'].stats(),
+            'network_ms_stats': g['network_ms'].stats(),
+            'end_to_end_stats': g['end_to_end'].stats(),
+            'true_network_stats': g['true_network'].stats()
         }
         rows.append([
             mode,
             resize_target,
             net_type,
-            len(entries),
+            g['samples'],
             summary[summary_key]['client_total_stats'].get('avg'),
             summary[summary_key]['server_total_stats'].get('avg'),
             summary[summary_key]['end_to_end_stats'].get('avg'),
-            summary[summary_key]['end_to_end_stats'].get('p90')
+            summary[summary_key]['end_to_end_stats'].get('p90'),
+            summary[summary_key]['network_ms_stats'].get('avg'),
+            summary[summary_key]['true_network_stats'].get('avg'),
+            summary[summary_key]['true_network_stats'].get('p90')
         ])
 
     with open(args.out, 'w', encoding='utf-8') as f:
@@ -101,10 +230,13 @@ def main():
 
     # 写 CSV
     with open(args.csv, 'w', encoding='utf-8') as f:
-        f.write('mode,resize_target,network_type,samples,avg_client_ms,avg_server_ms,avg_end_to_end_ms,p90_end_to_end_ms\n')
+        f.write('mode,resize_target,network_type,samples,avg_client_ms,avg_server_ms,avg_end_to_end_ms,p90_end_to_end_ms,'
+                'avg_network_ms,avg_true_network_ms,p90_true_network_ms\n')
         for r in rows:
             f.write(','.join(str(x) for x in r) + '\n')
     print(f"写入统计 CSV: {args.csv}")
+    if args.table:
+        print(f"写入列式表: {args.table}")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
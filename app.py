@@ -1,76 +1,266 @@
 # app.py
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response, send_from_directory, g, stream_with_context
 import os
-import psutil
-from inference import PaintDefectDetector
+import json
+import zlib
+import hmac
+import ipaddress
+from functools import wraps
+from inference import PaintDefectDetector, FEATURE_SCHEMA_VERSION, decode_gray_upload, read_image
+from model_snapshot import export_edge_model
+from edge_sync import EdgeSyncStore
+from perf_log_store import PerfLogStore, LiveClientStats, decode_body, validate_entry
+from request_log import RequestLog
+from upload_archive import UploadArchive
+from inference_pool import InferenceExecutor, RollingWindow
+from batch_stream import iter_files, predict_stream
+from tracing import TRACE_HEADER, Trace
+from online_update import IncrementalTrainer
+from model_registry import ModelRegistry, ModelWatcher
+from model_pool import ModelPool
+from stream_inspect import StreamManager
 import time
-from collections import deque
+import threading
 
 app = Flask(__name__)
 
-# 初始化检测器
+# 初始化检测器（从模型注册表加载激活版本并校验，优先使用二进制快照）
+registry = ModelRegistry("model")
 try:
-    detector = PaintDefectDetector("model/svm_defect.xml")
-    print("✅ 模型加载成功")
+    model_path, model_version = registry.verified_path()
+    detector = PaintDefectDetector(model_path, model_version=model_version)
+    print(f"✅ 模型加载成功，版本: {model_version} ({os.path.basename(model_path)})")
 except Exception as e:
     print(f"❌ 模型加载失败: {e}")
     detector = None
 
-# 用于自动策略的历史窗口
-recent_server_total = deque(maxlen=50)
-recent_file_sizes = deque(maxlen=50)
+# 模型热加载：注册表激活版本变化时自动切换；增量训练器：确认样本后台重训并登记新版本
+trainer = None
+watcher = None
+if detector is not None:
+    watcher = ModelWatcher(registry, detector)
+    watcher.start()
+    trainer = IncrementalTrainer(detector, registry)
+    trainer.start()
+
+# 多产线模型池（model/lines.json）：按请求的 line 参数路由，未指定时使用上面的默认检测器
+model_pool = ModelPool(detector) if detector is not None else None
+
+# 端侧离线结果同步；端侧模型导出按版本缓存 (version, payload)
+edge_sync = EdgeSyncStore(detector)
+edge_model_cache = (None, None)
+
+# 请求计数（按端点），随 /metrics 一起输出
+request_counts = {}
+request_counts_lock = threading.Lock()
+# 级联各级结束的 /predict 请求数（第一级直接放行 / 进入完整特征 + SVM）
+cascade_counts = {1: 0, 2: 0}
+
+# 用于自动策略的历史窗口（多个请求线程同时读写，需加锁）
+recent_server_total = RollingWindow(50)
+recent_file_sizes = RollingWindow(50)
+
+# 推理线程池：并行度等于 CPU 核数，OpenCV 内部单线程，避免“请求线程 × OpenCV 线程”的超额订阅（inference_pool.py）
+INFERENCE_WORKERS = os.cpu_count() or 4
+executor = InferenceExecutor(INFERENCE_WORKERS)
+
+# 视频流连续检测会话（帧的完整检测同样经推理线程池执行）
+streams = StreamManager(detector, submit=executor.submit) if detector is not None else None
+
+# 客户端上报的端到端性能日志：落盘到轮转 JSONL，同时进入实时统计（/metrics 与 auto 策略）
+perf_store = PerfLogStore()
+client_stats = LiveClientStats()
+
+# 推理请求的逐请求日志（到达时间、模式、大小、尺寸、耗时），供 replay_traffic.py 回放真实流量；后台线程落盘
+request_log = RequestLog().start()
+LOGGED_ENDPOINTS = ('predict', 'classify_only')
+
+# 上传图片归档：请求线程只算哈希并入队，后台线程按内容寻址落盘并执行保留策略（upload_archive.py）
+upload_archive = UploadArchive().start()
+
+# 管理端点（切换模型、提交训练标签）的访问控制：服务监听 0.0.0.0，局域网内任何客户端都能访问。
+# 设置了环境变量 PAINTDEFECT_ADMIN_TOKEN 时要求请求头 X-Admin-Token 与之一致；未设置时只允许本机访问
+ADMIN_TOKEN = os.environ.get('PAINTDEFECT_ADMIN_TOKEN') or None
+ADMIN_TOKEN_HEADER = 'X-Admin-Token'
 
 # 创建必要的目录
 os.makedirs('static/uploads', exist_ok=True)
 
+def cpu_percent():
+    # psutil 仅 auto/decision 路径需要，延迟导入以缩短冷启动
+    import psutil
+    return psutil.cpu_percent(interval=0.05)
+
+def recommend_mode(file_size, avg_file, cpu, avg_server):
+    """auto 策略: 客户端日志足够时按估算的端到端耗时取较小者，否则退回 CPU/文件大小/服务端耗时规则"""
+    learned = client_stats.recommend(file_size)
+    if learned is not None:
+        rec, est = learned
+        return rec, 'client_logs: ' + ', '.join(f"{m}={v:.0f}ms" for m, v in sorted(est.items()))
+    # 规则：如果平均文件 > 600KB 且 CPU > 55 或 服务器总耗时均值 > 250ms 则建议 classify_only
+    rec = 'classify_only' if ((avg_file > 600_000 and cpu > 55) or (avg_server > 250)) else 'full_remote'
+    return rec, f"avg_file={avg_file:.0f}, cpu={cpu:.1f}, avg_server={avg_server:.1f}"
+
+def is_loopback(addr):
+    try:
+        return ipaddress.ip_address(addr or '').is_loopback
+    except ValueError:
+        return False
+
+def require_admin(view):
+    """管理端点装饰器: 配置了令牌时校验 X-Admin-Token，否则只允许来自 loopback 的请求；拒绝时返回 403"""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if ADMIN_TOKEN is not None:
+            token = request.headers.get(ADMIN_TOKEN_HEADER, '')
+            if not hmac.compare_digest(token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8')):
+                return jsonify({'error': f'需要有效的管理令牌（{ADMIN_TOKEN_HEADER} 请求头）'}), 403
+        elif not is_loopback(request.remote_addr):
+            return jsonify({'error': '未配置 PAINTDEFECT_ADMIN_TOKEN，管理端点只允许本机访问'}), 403
+        return view(*args, **kwargs)
+    return wrapped
+
+@app.before_request
+def stamp_arrival():
+    g.received_at = time.time()
+    g.started = time.perf_counter()
+    # 沿用客户端传来的 trace id（X-Trace-Id），各阶段 span 经 Server-Timing 头返回（tracing.py）
+    g.trace = Trace(request.headers.get(TRACE_HEADER), started=g.started)
+
+def receive_body():
+    """读取并解析请求体；werkzeug 在此时才从 socket 读取上传内容，记为 receive span（属于网络传输）"""
+    with g.trace.span('receive'):
+        if request.mimetype == 'application/json':
+            request.get_json(silent=True)
+        else:
+            request.files
+
+def traced_jsonify(result):
+    with g.trace.span('serialize'):
+        return jsonify(result)
+
+def log_request(response, spans):
+    """从请求表单与 JSON 响应中取出回放需要的字段，写入逐请求日志"""
+    payload = response.get_json(silent=True) if response.is_json else None
+    payload = payload if isinstance(payload, dict) else {}
+    upload = request.files.get('file')
+    details = dict(payload, mode=request.form.get('mode') or payload.get('mode'),
+                   executed_mode=payload.get('mode'),
+                   ext=os.path.splitext(upload.filename)[1].lower() if upload and upload.filename else None,
+                   tiled=request.form.get('tiled', '0') in ('1', 'true') or None,
+                   roi_enabled=request.form.get('roi', '0') in ('1', 'true') or None,
+                   trace_id=g.trace.trace_id, spans=spans)
+    request_log.record(g.received_at, request.path, response.status_code, request.content_length,
+                       (time.perf_counter() - g.started) * 1000, details)
+
+@app.after_request
+def tag_model_version(response):
+    """所有响应都带上当前生效的模型版本，并计入端点请求数"""
+    response.headers['X-Model-Version'] = str(detector.model_version if detector is not None else None)
+    with request_counts_lock:
+        request_counts[request.endpoint] = request_counts.get(request.endpoint, 0) + 1
+    if request.endpoint in LOGGED_ENDPOINTS and 'trace' in g:
+        spans = g.trace.finish()
+        response.headers['Server-Timing'] = Trace.header(spans)
+        response.headers[TRACE_HEADER] = g.trace.trace_id
+        log_request(response, spans)
+    return response
+
 @app.route('/')
 def index():
-    return render_template('index.html')
+    img_size = detector.img_size if detector is not None else (512, 512)
+    return render_template('index.html', img_size=list(img_size))
+
+@app.route('/service-worker.js')
+def service_worker():
+    """从根路径提供 Service Worker，使其作用域覆盖整个站点（含 / 页面与 /static 资源）"""
+    resp = send_from_directory('static', 'service-worker.js', mimetype='application/javascript')
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp
 
 @app.route('/predict', methods=['POST'])
 def predict():
     if detector is None:
         return jsonify({'error': '模型未加载，请先训练模型'})
+    receive_body()
 
-    mode = request.form.get('mode', 'full_remote')  # full_remote | classify_only | auto
+    mode = request.form.get('mode', 'full_remote')  # full_remote | gray_upload | classify_only | auto
+    # line（或 model）: 产线模型，逗号分隔多条产线时同一张图片交给各产线模型并共用预处理
+    lines = [l.strip() for l in (request.form.get('line') or request.form.get('model') or '').split(',') if l.strip()]
+    try:
+        target = model_pool.get(lines[0] if len(lines) == 1 else None)
+    except KeyError:
+        return jsonify({'error': f'未配置的产线: {lines[0]}', 'lines': model_pool.lines(), 'mode': mode})
 
     advisory = {}
     if mode == 'auto':
-        cpu = psutil.cpu_percent(interval=0.05)
+        cpu = cpu_percent()
         file_size = int(request.headers.get('Content-Length', 0))
         recent_file_sizes.append(file_size)
-        avg_file = sum(recent_file_sizes)/len(recent_file_sizes) if recent_file_sizes else file_size
-        avg_server = sum(recent_server_total)/len(recent_server_total) if recent_server_total else 0
-        # 规则：如果平均文件 > 600KB 且 CPU > 70 或 服务器总耗时均值 > 250ms 则建议 classify_only
-        if ((avg_file > 600_000 and cpu > 55) or (avg_server > 250)):
-            advisory['recommended_mode'] = 'classify_only'
-            advisory['reason'] = f"avg_file={avg_file:.0f}, cpu={cpu:.1f}, avg_server={avg_server:.1f}"
-            # 暂不强制修改执行模式，仍做 full_remote，客户端可根据 recommended_mode 决定是否改走特征路径
-            mode = 'full_remote'
-        else:
-            advisory['recommended_mode'] = 'full_remote'
-            advisory['reason'] = f"avg_file={avg_file:.0f}, cpu={cpu:.1f}, avg_server={avg_server:.1f}"
+        avg_file = recent_file_sizes.mean(file_size)
+        avg_server = recent_server_total.mean()
+        advisory['recommended_mode'], advisory['reason'] = recommend_mode(file_size, avg_file, cpu, avg_server)
+        # 暂不强制修改执行模式，仍做 full_remote，客户端可根据 recommended_mode 决定是否改走特征路径
+        mode = 'full_remote'
 
-    if mode in ('full_remote'):
+    if mode in ('full_remote', 'gray_upload'):
+        # gray_upload: 客户端已缩放到模型输入尺寸并转为灰度（见 inference.decode_gray_upload），服务端直接提特征
+        gray = mode == 'gray_upload'
         if 'file' not in request.files:
             return jsonify({'error': '没有选择文件'})
         file = request.files['file']
         if file.filename == '':
             return jsonify({'error': '没有选择文件'})
         filename = file.filename
-        upload_path = os.path.join('static/uploads', filename)
-        file.save(upload_path)
+        # 推理直接使用内存中的文件内容，落盘交给后台归档线程
+        with g.trace.span('save'):
+            data = file.read()
+            upload_id = upload_archive.submit(data, filename)
+        # tiled=1: 高分辨率切片推理，返回缺陷切片位置；roi=1: 裁剪到漆面区域后再推理，返回裁剪框
+        tiled = request.form.get('tiled', '0') in ('1', 'true') and not gray
+        roi = request.form.get('roi', '0') in ('1', 'true') and not gray
+        # cascade=0: 跳过级联第一级，始终走完整特征 + SVM（用于对比）
+        cascade = request.form.get('cascade', '1') not in ('0', 'false')
         try:
             start = time.perf_counter()
-            result = detector.predict_single(upload_path, with_timing=True)
+            if len(lines) > 1:
+                try:
+                    result = executor.run(model_pool.predict_lines, data, lines, with_timing=True, image_name=filename,
+                                          gray=gray, trace=g.trace)
+                except KeyError as e:
+                    return jsonify({'error': f'未配置的产线: {e.args[0]}', 'lines': model_pool.lines(), 'mode': mode})
+            elif tiled:
+                try:
+                    overlap = int(request.form.get('overlap', 64))
+                except ValueError:
+                    return jsonify({'error': 'overlap 必须为整数', 'mode': mode})
+                error = target.overlap_error(overlap)
+                if error:
+                    return jsonify({'error': error, 'mode': mode})
+                # 在请求线程中调用: 整图预处理与分块的切片特征分别提交到推理线程池（见 predict_tiled）
+                result = target.predict_tiled(data, overlap=overlap, with_timing=True, image_name=filename,
+                                              executor=executor, trace=g.trace)
+            else:
+                result = executor.run(target.predict_single, data, with_timing=True, roi=roi, cascade=cascade,
+                                      image_name=filename, gray=gray, trace=g.trace)
+            if 'error' in result:
+                return jsonify(dict(result, mode=mode))
+            g.trace.add_timing(result.get('timing'))
+            if len(lines) == 1:
+                result['line'] = lines[0]
+            result['upload_id'] = upload_id
+            if result.get('cascade_stage'):
+                with request_counts_lock:
+                    cascade_counts[result['cascade_stage']] += 1
             end = time.perf_counter()
             result['mode'] = mode
             result['timing']['endpoint_ms'] = (end - start) * 1000
-            # 记录总耗时用于 auto 策略
-            recent_server_total.append(result['timing'].get('total_ms', result['timing'].get('predict_ms', 0)))
+            # 记录总耗时用于 auto 策略（切片推理耗时不具可比性，不计入）
+            if not tiled:
+                recent_server_total.append(result['timing'].get('total_ms', result['timing'].get('predict_ms', 0)))
             if advisory:
                 result['advisory'] = advisory
-            return jsonify(result)
+            return traced_jsonify(result)
         except Exception as e:
             return jsonify({'error': f'预测失败: {str(e)}', 'mode': mode, 'advisory': advisory})
     elif mode == 'classify_only':
@@ -79,36 +269,85 @@ def predict():
         if not data or 'features' not in data:
             return jsonify({'error': '需要提供 features 数组', 'mode': mode})
         feats = data['features']
+        if data.get('line'):
+            try:
+                target = model_pool.get(data['line'])
+            except KeyError:
+                return jsonify({'error': f"未配置的产线: {data['line']}", 'lines': model_pool.lines(), 'mode': mode})
         try:
             start = time.perf_counter()
-            result = detector.classify_features(feats)
+            result = target.classify_features(feats, data.get('schema_version'))
             end = time.perf_counter()
             result['mode'] = mode
+            if data.get('line'):
+                result['line'] = data['line']
             result['timing'] = {'predict_ms': (end - start) * 1000}
             recent_server_total.append(result['timing']['predict_ms'])
-            return jsonify(result)
+            g.trace.add('predict', result['timing']['predict_ms'])
+            return traced_jsonify(result)
         except Exception as e:
             return jsonify({'error': f'分类失败: {str(e)}', 'mode': mode})
     else:
         return jsonify({'error': f'不支持的模式: {mode}'})
+
+@app.route('/predict_batch', methods=['POST'])
+def predict_batch():
+    """批量上传: multipart 请求体边接收边解析（batch_stream.py），每张图片解析完即交给推理线程池，
+    结果以 NDJSON 逐行流式返回。请求体是流式读取的，mode / line / cascade 放在查询参数中"""
+    if detector is None:
+        return jsonify({'error': '模型未加载，请先训练模型'})
+    boundary = request.mimetype_params.get('boundary')
+    if request.mimetype != 'multipart/form-data' or not boundary:
+        return jsonify({'error': '需要 multipart/form-data 请求体'})
+    mode = request.args.get('mode', 'full_remote')  # full_remote | gray_upload
+    if mode not in ('full_remote', 'gray_upload'):
+        return jsonify({'error': f'不支持的模式: {mode}'})
+    line = request.args.get('line') or None
+    try:
+        target = model_pool.get(line)
+    except KeyError:
+        return jsonify({'error': f'未配置的产线: {line}', 'lines': model_pool.lines(), 'mode': mode})
+    gray = mode == 'gray_upload'
+    cascade = request.args.get('cascade', '1') not in ('0', 'false')
+    stream = request.stream
+
+    def submit(data, filename):
+        upload_id = upload_archive.submit(data, filename)
+
+        def work():
+            result = target.predict_single(data, with_timing=True, cascade=cascade, image_name=filename, gray=gray)
+            result.update(mode=mode, upload_id=upload_id)
+            if line:
+                result['line'] = line
+            return result
+        return executor.submit(work)
+
+    def generate():
+        for result in predict_stream(iter_files(stream, boundary), submit, max_in_flight=2 * executor.workers):
+            if result.get('cascade_stage'):
+                with request_counts_lock:
+                    cascade_counts[result['cascade_stage']] += 1
+            yield json.dumps(result, ensure_ascii=False) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @app.route('/decision', methods=['POST'])
 def decision():
     """根据元数据（文件大小、客户端阶段耗时等）返回建议模式"""
     data = request.get_json(silent=True) or {}
     file_size = data.get('file_size', 0)
-    cpu = psutil.cpu_percent(interval=0.05)
-    avg_server = sum(recent_server_total)/len(recent_server_total) if recent_server_total else 0
-    avg_file = sum(recent_file_sizes)/len(recent_file_sizes) if recent_file_sizes else file_size
-    if ((avg_file > 600_000 and cpu > 55) or (avg_server > 250)):
-        rec = 'classify_only'
-    else:
-        rec = 'full_remote'
+    cpu = cpu_percent()
+    avg_server = recent_server_total.mean()
+    avg_file = recent_file_sizes.mean(file_size)
+    rec, reason = recommend_mode(file_size, avg_file, cpu, avg_server)
     return jsonify({
         'recommended_mode': rec,
+        'reason': reason,
         'cpu': cpu,
         'avg_server_ms': avg_server,
         'avg_file_size': avg_file,
-        'window_lengths': {'server': len(recent_server_total), 'file': len(recent_file_sizes)}
+        'window_lengths': {'server': len(recent_server_total), 'file': len(recent_file_sizes)},
+        'model_version': detector.model_version if detector is not None else None
     })
 
 @app.route('/classify', methods=['POST'])
@@ -116,20 +355,231 @@ def classify_only():
     """备用端点: 仅分类特征"""
     if detector is None:
         return jsonify({'error': '模型未加载'})
+    receive_body()
     data = request.get_json(silent=True)
     if not data or 'features' not in data:
         return jsonify({'error': '需要提供 features 数组'})
     feats = data['features']
+    try:
+        target = model_pool.get(data.get('line'))
+    except KeyError:
+        return jsonify({'error': f"未配置的产线: {data['line']}", 'lines': model_pool.lines()})
     try:
         start = time.perf_counter()
-        result = detector.classify_features(feats)
+        result = target.classify_features(feats, data.get('schema_version'))
         end = time.perf_counter()
         result['timing'] = {'predict_ms': (end - start) * 1000}
         result['mode'] = 'classify_only'
-        return jsonify(result)
+        if data.get('line'):
+            result['line'] = data['line']
+        g.trace.add('predict', result['timing']['predict_ms'])
+        return traced_jsonify(result)
     except Exception as e:
         return jsonify({'error': f'分类失败: {str(e)}'})
 
+@app.route('/feedback', methods=['POST'])
+@require_admin
+def feedback():
+    """操作员确认结果: 提交 features(或已上传图片的 upload_id / image_name) 与真实 label，后台增量训练"""
+    if trainer is None:
+        return jsonify({'error': '模型未加载'})
+    data = request.get_json(silent=True)
+    if not data or 'label' not in data:
+        return jsonify({'error': '需要提供 label 以及 features 或 image_name'})
+    feats = data.get('features')
+    image_name = data.get('image_name')
+    if feats is None:
+        key = data.get('upload_id') or image_name
+        if not key:
+            return jsonify({'error': '需要提供 features、upload_id 或 image_name'})
+        # 先查上传归档，再兼容旧版直接保存在 static/uploads 下的图片
+        content = upload_archive.read(key)
+        img = read_image(content) if content is not None else \
+            read_image(os.path.join('static/uploads', os.path.basename(key)))
+        if img is None and content is not None:
+            img = decode_gray_upload(content)  # gray_upload 模式上传的原始灰度图
+        if img is None:
+            return jsonify({'error': f'无法读取图片: {key}'})
+        feats = executor.run(lambda: detector.extract_robust_features(*detector.preprocess_image(img)))
+    try:
+        pending = trainer.submit(feats, data['label'], source=image_name or data.get('upload_id'))
+    except ValueError as e:
+        return jsonify({'error': str(e)})
+    if data.get('retrain'):
+        trainer.flush()
+    return jsonify({
+        'queued': True,
+        'pending': pending,
+        'last_update': trainer.last_update
+    })
+
+@app.route('/stream/start', methods=['POST'])
+def stream_start():
+    """创建视频流检测会话；可选 change_threshold（缩略图平均灰度差，低于此值复用上一结果）"""
+    if streams is None:
+        return jsonify({'error': '模型未加载'})
+    data = request.get_json(silent=True) or {}
+    try:
+        session = streams.create(change_threshold=float(data.get('change_threshold', 3.0)))
+    except RuntimeError as e:
+        return jsonify({'error': str(e)})
+    return jsonify({'session_id': session.session_id})
+
+@app.route('/stream/<session_id>/frame', methods=['POST'])
+def stream_frame(session_id):
+    """上传一帧（请求体为 JPEG 字节，或 multipart 的 frame 字段），不等待检测结果"""
+    session = streams.get(session_id) if streams is not None else None
+    if session is None:
+        return jsonify({'error': '会话不存在'})
+    data = request.files['frame'].read() if 'frame' in request.files else request.get_data()
+    if not data:
+        return jsonify({'error': '空帧'})
+    try:
+        seq, replaced = session.push_frame(data)
+    except RuntimeError as e:
+        # 查找与写入之间会话可能已被 stop 或超时关闭
+        return jsonify({'error': str(e)})
+    return jsonify({'seq': seq, 'replaced_pending': replaced})
+
+@app.route('/stream/<session_id>/events', methods=['GET'])
+def stream_events(session_id):
+    """以 Server-Sent Events 推送检测结果"""
+    session = streams.get(session_id) if streams is not None else None
+    if session is None:
+        return jsonify({'error': '会话不存在'})
+    try:
+        events = session.subscribe()
+    except RuntimeError as e:
+        return jsonify({'error': str(e)})
+    return Response(events, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/stream/<session_id>/stop', methods=['POST'])
+def stream_stop(session_id):
+    session = streams.stop(session_id) if streams is not None else None
+    if session is None:
+        return jsonify({'error': '会话不存在'})
+    return jsonify({'stopped': True, 'stats': session.stats})
+
+@app.route('/model/edge.json', methods=['GET'])
+def edge_model():
+    """导出当前模型的紧凑描述，供浏览器离线推理（static/js/edge_svm.js）；以模型版本作为 ETag"""
+    global edge_model_cache
+    if detector is None:
+        return jsonify({'error': '模型未加载'})
+    model, version = detector.active()
+    cached_version, payload = edge_model_cache
+    if payload is None or cached_version != version:
+        payload = json.dumps(export_edge_model(model, version, FEATURE_SCHEMA_VERSION))
+        edge_model_cache = (version, payload)
+    resp = Response(payload, mimetype='application/json')
+    resp.set_etag(str(version))
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp.make_conditional(request)
+
+@app.route('/sync_batch', methods=['POST'])
+def sync_batch():
+    """批量接收端侧离线推理结果与性能日志: {"records": [{client_id, features, prediction, ...}]}"""
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get('records'), list):
+        return jsonify({'error': '需要提供 records 列表'})
+    try:
+        accepted, results = edge_sync.ingest(data['records'])
+    except ValueError as e:
+        return jsonify({'error': str(e)})
+    # 离线期间的性能日志随结果一起到达，同样进入日志存储（重发的重复记录除外）
+    perf = [rec['perf_log'] for rec, res in zip(data['records'], results)
+            if 'client_id' in res and not res.get('duplicate') and not res.get('error')
+            and isinstance(rec.get('perf_log'), dict) and validate_entry(rec['perf_log']) is None]
+    perf_store.append(perf)
+    client_stats.observe(perf)
+    return jsonify({
+        'accepted': accepted,
+        'results': results,
+        'model_version': detector.model_version if detector is not None else None
+    })
+
+@app.route('/perf_logs', methods=['POST'])
+def perf_logs():
+    """批量接收客户端性能日志（JSON 数组或 {"entries": [...]}，可 Content-Encoding: gzip）"""
+    try:
+        entries = decode_body(request.get_data(), request.headers.get('Content-Encoding'))
+    except (ValueError, zlib.error) as e:
+        return jsonify({'error': f'日志解析失败: {str(e)}'})
+    # 先逐条校验再写入: 格式错误的条目单独拒绝，不会导致整批失败后被客户端重试、重复写入
+    valid, rejected = [], []
+    for i, entry in enumerate(entries):
+        error = validate_entry(entry)
+        if error:
+            rejected.append({'index': i, 'error': error})
+        else:
+            valid.append(entry)
+    stored = perf_store.append(valid) if valid else 0
+    client_stats.observe(valid)
+    return jsonify({'accepted': stored, 'rejected': rejected})
+
+@app.route('/admin/models', methods=['GET'])
+@require_admin
+def admin_models():
+    """列出注册表中的模型版本及当前服务中生效的版本"""
+    return jsonify({
+        'serving_version': detector.model_version if detector is not None else None,
+        'registry': registry.manifest(),
+        'watcher_error': watcher.last_error if watcher is not None else None
+    })
+
+@app.route('/admin/reload', methods=['POST'])
+@require_admin
+def admin_reload():
+    """重新加载模型: 可选 version 参数先激活该版本；否则加载注册表当前激活版本"""
+    if watcher is None:
+        return jsonify({'error': '模型未加载'})
+    data = request.get_json(silent=True) or {}
+    version = data.get('version')
+    try:
+        if version:
+            registry.activate(version)
+        loaded = watcher.reload(version)
+    except Exception as e:
+        return jsonify({'error': f'模型重载失败: {str(e)}', 'model_version': detector.model_version})
+    return jsonify({'reloaded': True, 'model_version': loaded})
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """运行指标: 模型版本、各端点请求数、近期服务端耗时"""
+    avg_server = recent_server_total.mean()
+    with request_counts_lock:
+        counts = dict(request_counts)
+        stages = dict(cascade_counts)
+    gate = detector.cascade if detector is not None else None
+    serving = detector.model_version if detector is not None else None
+    return jsonify({
+        'model_version': detector.model_version if detector is not None else None,
+        'request_counts': counts,
+        'avg_server_ms': avg_server,
+        'incremental': {
+            'pending': trainer.pending_count() if trainer is not None else 0,
+            'last_update': trainer.last_update if trainer is not None else None
+        },
+        'edge_sync': dict(edge_sync.stats),
+        'client_perf': client_stats.summary(),
+        'perf_logs_written': perf_store.written,
+        'requests_logged': request_log.written,
+        'requests_log_dropped': request_log.dropped,
+        'model_pool': model_pool.summary() if model_pool is not None else None,
+        'upload_archive': upload_archive.summary(),
+        'executor': executor.summary(),
+        'cascade': {
+            # 未启用时 tuned_for 为 None；inherited 表示沿用增量更新基础版本的阈值
+            'enabled': gate is not None,
+            'tuned_for': gate.model_version if gate is not None else None,
+            'inherited': gate is not None and gate.model_version != serving,
+            'thresholds': list(gate.thresholds) if gate is not None else None,
+            'stage1': stages[1],
+            'stage2': stages[2]
+        }
+    })
+
 if __name__ == '__main__':
     print("漆面缺陷检测系统启动中...")
     print("访问 http://<本机局域网IP>:5000 使用系统 (例如 http://192.168.1.10:5000)")
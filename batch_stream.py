@@ -0,0 +1,94 @@
+# batch_stream.py
+"""批量上传的流式处理（/predict_batch）
+工位离线积攒的图片原来要逐张调用 /predict，每张各自一次 multipart 解析和一次 JSON 响应。
+/predict_batch 把很多张图片放在同一个 multipart 请求体里:
+
+- iter_files 用 werkzeug.sansio.multipart.MultipartDecoder 按块（默认 64 KB）增量解析请求体，
+  每个文件分段一结束就产出，不等整个请求体接收完，也不落临时文件；
+- predict_stream 把每张图片立即交给推理线程池（InferenceExecutor.submit），同时在途的图片数不超过 max_in_flight，
+  超过时暂停读取请求体（背压，内存占用与批量大小无关）；结果按完成顺序逐条产出，index 为图片在请求体中的序号；
+- 最后一条为汇总 {"done": true, "count": ..., "errors": ..., "elapsed_ms": ...}，客户端据此确认整批处理完毕。
+"""
+
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from werkzeug.sansio.multipart import Data, Epilogue, File, MultipartDecoder, NeedData
+
+CHUNK_SIZE = 64 * 1024
+MAX_FILE_BYTES = 64 * 1024 * 1024
+
+
+def iter_files(stream, boundary, chunk_size=CHUNK_SIZE, max_file_bytes=MAX_FILE_BYTES):
+    """增量解析 multipart 请求体，逐个产出 (filename, data)；超过 max_file_bytes 的文件 data 为 None。
+    非文件字段忽略。请求体格式错误时抛出 ValueError"""
+    decoder = MultipartDecoder(boundary.encode() if isinstance(boundary, str) else boundary)
+    current, parts, size = None, [], 0
+    while True:
+        chunk = stream.read(chunk_size)
+        decoder.receive_data(chunk or None)
+        event = decoder.next_event()
+        while not isinstance(event, (NeedData, Epilogue)):
+            if isinstance(event, File):
+                current, parts, size = event, [], 0
+            elif isinstance(event, Data) and isinstance(current, File):
+                size += len(event.data)
+                if size <= max_file_bytes:
+                    parts.append(event.data)
+                else:
+                    parts = []
+                if not event.more_data:
+                    yield current.filename, (b''.join(parts) if size <= max_file_bytes else None)
+                    current = None
+            elif not isinstance(event, Data):
+                current = None
+            event = decoder.next_event()
+        if isinstance(event, Epilogue) or not chunk:
+            break
+
+
+def _result(future, index, filename):
+    try:
+        result = future.result()
+    except Exception as e:
+        result = {'error': f'预测失败: {e}'}
+    result['index'] = index
+    if result.get('image_name') is None:
+        result['image_name'] = filename
+    return result
+
+
+def predict_stream(files, submit, max_in_flight=8):
+    """files: iter_files 的输出；submit(data, filename) -> Future。边解析边提交，结果按完成顺序逐条产出"""
+    t0 = time.perf_counter()
+    pending = {}
+    count = errors = 0
+
+    def drain(block):
+        nonlocal errors
+        done, _ = wait(list(pending), timeout=None if block else 0, return_when=FIRST_COMPLETED)
+        for future in done:
+            result = _result(future, *pending.pop(future))
+            errors += 'error' in result
+            yield result
+
+    try:
+        for filename, data in files:
+            index, count = count, count + 1
+            if not data:
+                errors += 1
+                yield {'index': index, 'image_name': filename,
+                       'error': '空文件' if data is not None else '图片超过大小上限'}
+                continue
+            pending[submit(data, filename)] = (index, filename)
+            yield from drain(len(pending) >= max_in_flight)
+    except ValueError as e:
+        # 请求体格式错误或被截断: 已提交的图片照常返回结果，最后说明错误
+        while pending:
+            yield from drain(True)
+        yield {'done': True, 'count': count, 'errors': errors + 1, 'error': f'请求体解析失败: {e}',
+               'elapsed_ms': (time.perf_counter() - t0) * 1000}
+        return
+    while pending:
+        yield from drain(True)
+    yield {'done': True, 'count': count, 'errors': errors, 'elapsed_ms': (time.perf_counter() - t0) * 1000}
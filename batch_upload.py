@@ -0,0 +1,125 @@
+# batch_upload.py
+"""工位批量上传: 把一个目录的图片放进一个 multipart 请求体流式发给 /predict_batch，逐行读取 NDJSON 结果
+请求体由生成器按块产生（chunked 传输），不在内存中拼接整批图片；服务端每收到一张图片就开始推理。
+--compare 时先按原来的方式逐张调用 /predict，对比整批同步耗时。
+
+示例:
+    python batch_upload.py --server http://127.0.0.1:5000 --images static/uploads --out output/batch_results.jsonl
+    python batch_upload.py --images dataset/valid --limit 200 --compare
+    python batch_upload.py --images station_cache/ --mode full_remote --line A
+"""
+
+import argparse
+import json
+import mimetypes
+import os
+import time
+import uuid
+
+import requests
+
+from dataset_index import list_images
+
+CHUNK_SIZE = 64 * 1024
+
+
+def multipart_body(paths, boundary):
+    """逐个文件产出 multipart 分段（文件按块读取）"""
+    for path in paths:
+        name = os.path.basename(path)
+        mime = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        yield (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{name}"\r\n'
+               f'Content-Type: {mime}\r\n\r\n').encode('utf-8')
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        yield b'\r\n'
+    yield f'--{boundary}--\r\n'.encode()
+
+
+def upload_batch(server, paths, mode='full_remote', line=None, timeout=600):
+    """返回 (逐张结果列表, 汇总行, 总耗时 ms)"""
+    boundary = uuid.uuid4().hex
+    params = {'mode': mode}
+    if line:
+        params['line'] = line
+    start = time.perf_counter()
+    resp = requests.post(server.rstrip('/') + '/predict_batch', params=params, data=multipart_body(paths, boundary),
+                         headers={'Content-Type': f'multipart/form-data; boundary={boundary}'},
+                         stream=True, timeout=timeout)
+    results, summary = [], None
+    for raw in resp.iter_lines():
+        if not raw:
+            continue
+        row = json.loads(raw)
+        if row.get('done'):
+            summary = row
+        elif 'index' in row:
+            results.append(row)
+        else:
+            summary = row  # 参数错误等: 服务端直接返回单个 JSON
+    return results, summary, (time.perf_counter() - start) * 1000
+
+
+def upload_each(server, paths, mode='full_remote', line=None):
+    """对比基线: 逐张调用 /predict"""
+    start = time.perf_counter()
+    errors = 0
+    with requests.Session() as s:
+        for path in paths:
+            with open(path, 'rb') as f:
+                data = {'mode': mode}
+                if line:
+                    data['line'] = line
+                j = s.post(server.rstrip('/') + '/predict', files={'file': (os.path.basename(path), f)},
+                           data=data, timeout=60).json()
+            errors += 'error' in j
+    return errors, (time.perf_counter() - start) * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--server', default='http://127.0.0.1:5000')
+    ap.add_argument('--images', required=True, help='图片目录')
+    ap.add_argument('--limit', type=int, default=None)
+    ap.add_argument('--mode', choices=['full_remote', 'gray_upload'], default='full_remote',
+                    help='gray_upload 时目录中应为 .pdg 或灰度图（见 /predict 的 gray_upload 说明）')
+    ap.add_argument('--line', default=None, help='产线模型')
+    ap.add_argument('--out', default=None, help='逐张结果写入 JSONL')
+    ap.add_argument('--compare', action='store_true', help='同时测逐张调用 /predict 的耗时')
+    args = ap.parse_args()
+
+    paths = list_images(args.images, args.limit)
+    if not paths:
+        print('未找到图片')
+        return 1
+    total_mb = sum(os.path.getsize(p) for p in paths) / 1e6
+
+    if args.compare:
+        errors, each_ms = upload_each(args.server, paths, args.mode, args.line)
+        print(f"逐张 /predict: {len(paths)} 张 ({total_mb:.1f} MB), {each_ms / 1000:.2f} s, "
+              f"{len(paths) / each_ms * 1000:.1f} 张/秒, 错误 {errors}")
+
+    results, summary, batch_ms = upload_batch(args.server, paths, args.mode, args.line)
+    errors = sum('error' in r for r in results)
+    print(f"/predict_batch: {len(results)} 张 ({total_mb:.1f} MB), {batch_ms / 1000:.2f} s, "
+          f"{len(results) / batch_ms * 1000:.1f} 张/秒, 错误 {errors}")
+    if args.compare:
+        print(f"加速比: {each_ms / batch_ms:.2f}x")
+    if summary is None or summary.get('error') or summary.get('count') != len(paths):
+        print(f"❌ 批量未完整处理: {summary}")
+        return 1
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+        with open(args.out, 'w', encoding='utf-8') as f:
+            for r in sorted(results, key=lambda r: r['index']):
+                f.write(json.dumps(r, ensure_ascii=False) + '\n')
+        print('Saved:', args.out)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
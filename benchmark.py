@@ -5,10 +5,13 @@ import json
 import statistics
 import requests
 
+from dataset_index import list_images
+from results_table import TABLE_FORMATS, TableWriter, benchmark_row, new_run_id
+
 """简单基准脚本: 发送图片到服务端不同模式, 收集时延
 用法示例:
     python benchmark.py --server http://127.0.0.1:5000 --images dataset/train --modes full_remote auto --repeat 3
-输出: 每模式下统计的平均/中位/最大/最小总耗时(ms)
+输出: 每模式下统计的平均/中位/最大/最小总耗时(ms)；--table DIR 时逐请求写入列式表（results_table.py）
 """
 
 def send_image(server_url, image_path, mode):
@@ -33,23 +36,20 @@ def main():
     parser.add_argument('--repeat', type=int, default=3)
     parser.add_argument('--limit', type=int, default=10, help='最多使用的图片数量')
     parser.add_argument('--ext', nargs='+', default=['.png', '.jpg', '.jpeg'])
+    parser.add_argument('--table', default=None, help='逐请求结果写入列式表目录')
+    parser.add_argument('--table-format', choices=TABLE_FORMATS, default='auto')
     args = parser.parse_args()
 
-    # 收集图片
-    image_files = []
-    for root, _, files in os.walk(args.images):
-        for fn in files:
-            if any(fn.lower().endswith(e) for e in args.ext):
-                image_files.append(os.path.join(root, fn))
-            if len(image_files) >= args.limit:
-                break
-        if len(image_files) >= args.limit:
-            break
+    # 收集图片（有数据集清单时直接读取）
+    exts = tuple(e.lower() for e in args.ext)
+    image_files = [p for p in list_images(args.images) if p.lower().endswith(exts)][:args.limit]
 
     if not image_files:
         print('未找到图片')
         return
 
+    writer = TableWriter(args.table, args.table_format, prefix='benchmark') if args.table else None
+    run_id = new_run_id()
     results = {}
     for mode in args.modes:
         latencies = []
@@ -57,8 +57,14 @@ def main():
         print(f'模式: {mode}')
         for img in image_files:
             for _ in range(args.repeat):
+                started = time.time()
                 l, payload = send_image(args.server, img, mode)
                 latencies.append(l)
+                if writer:
+                    ok = isinstance(payload, dict) and 'error' not in payload
+                    writer.add(benchmark_row(run_id, mode, '/predict', 1, started, l, ok,
+                                             uploaded_size=os.path.getsize(img), payload=payload,
+                                             image_name=os.path.basename(img)))
                 timing = payload.get('timing') if isinstance(payload, dict) else None
                 if timing:
                     stage_samples.append(timing.get('total_ms', timing.get('predict_ms', l)))
@@ -74,6 +80,9 @@ def main():
 
     print('\n=== 汇总 ===')
     print(json.dumps(results, ensure_ascii=False, indent=2))
+    if writer:
+        writer.close()
+        print(f'列式表: {args.table} ({writer.rows_written} 行, {writer.ext})')
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
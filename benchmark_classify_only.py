@@ -6,19 +6,17 @@ import time
 import queue
 import requests
 
+from dataset_index import list_images
+from results_table import TABLE_FORMATS, TableWriter, benchmark_row, new_run_id
+
 # 使用本地提取的特征并发 POST /classify，评估 classify_only 模式吞吐与延迟
 # 示例：
 #   python benchmark_classify_only.py --server http://127.0.0.1:5000 --images dataset/train --concurrency 1 5 10 --duration 30 --limit 50 --out classify_only_conc.json
+# 加 --table DIR 时逐请求写入列式表（results_table.py）
 
 def load_image_paths(path, limit=50):
-    imgs = []
-    for root, _, files in os.walk(path):
-        for fn in files:
-            if fn.lower().endswith(('.png','.jpg','.jpeg')):
-                imgs.append(os.path.join(root, fn))
-                if len(imgs) >= limit:
-                    return imgs
-    return imgs
+    # 有数据集清单（dataset_index.py）时直接读取，不再遍历目录
+    return list_images(path, limit)
 
 def extract_features_batch_py(image_paths):
     # 直接调用项目的 Python 推理模块进行特征提取，避免重复实现
@@ -36,21 +34,30 @@ def extract_features_batch_py(image_paths):
         names.append(os.path.basename(p))
     return names, feats
 
-def worker(stop_event, server, names, features, results_q):
+def worker(stop_event, server, names, features, results_q, schema_version=None, rows=None, run_id=None, conc=None):
     idx = 0
     url = server.rstrip('/') + '/classify'
     while not stop_event.is_set():
         i = idx % len(features)
         idx += 1
-        payload = {"features": features[i], "name": names[i]}
+        payload = {"features": features[i], "name": names[i], "schema_version": schema_version}
+        started = time.time()
+        latency, ok, r = None, False, None
         try:
             start = time.perf_counter()
             r = requests.post(url, json=payload, timeout=30)
             end = time.perf_counter()
-            ok = (r.status_code == 200)
-            results_q.put(((end - start) * 1000, ok))
+            latency, ok = (end - start) * 1000, (r.status_code == 200)
         except Exception:
-            results_q.put((None, False))
+            pass
+        results_q.put((latency, ok))
+        if rows is not None:
+            try:
+                body = r.json() if ok else None
+            except ValueError:
+                body = None
+            rows.append(benchmark_row(run_id, 'classify_only', '/classify', conc, started, latency, ok,
+                                      payload=body, image_name=names[i]))
 
 def percentile(sorted_list, p):
     if not sorted_list:
@@ -73,12 +80,13 @@ def summarize(latencies):
         'max_ms': s[-1]
     }
 
-def run_once(conc, duration, server, names, features):
+def run_once(conc, duration, server, names, features, schema_version=None, rows=None, run_id=None):
     stop_event = threading.Event()
     q = queue.Queue()
     threads = []
     for _ in range(conc):
-        t = threading.Thread(target=worker, args=(stop_event, server, names, features, q))
+        t = threading.Thread(target=worker, args=(stop_event, server, names, features, q, schema_version,
+                                                  rows, run_id, conc))
         t.start()
         threads.append(t)
     start = time.time()
@@ -117,6 +125,8 @@ def main():
     ap.add_argument('--duration', type=int, default=30)
     ap.add_argument('--limit', type=int, default=50, help='最大图片数用于生成特征集')
     ap.add_argument('--out', default='classify_only_conc.json')
+    ap.add_argument('--table', default=None, help='逐请求结果写入列式表目录')
+    ap.add_argument('--table-format', choices=TABLE_FORMATS, default='auto')
     args = ap.parse_args()
 
     image_paths = load_image_paths(args.images, args.limit)
@@ -128,16 +138,25 @@ def main():
     if not feats:
         print('No features extracted.')
         return
+    from inference import FEATURE_SCHEMA_VERSION
 
+    writer = TableWriter(args.table, args.table_format, prefix='classify_only') if args.table else None
+    run_id = new_run_id()
     all_results = []
     for c in args.concurrency:
         print(f'Running classify_only concurrency={c} duration={args.duration}s ...')
-        res = run_once(c, args.duration, args.server, names, feats)
+        rows = [] if writer else None
+        res = run_once(c, args.duration, args.server, names, feats, FEATURE_SCHEMA_VERSION, rows, run_id)
+        if writer:
+            writer.extend(rows)
         print(res)
         all_results.append(res)
     with open(args.out, 'w', encoding='utf-8') as f:
         json.dump(all_results, f, ensure_ascii=False, indent=2)
     print('Saved:', args.out)
+    if writer:
+        writer.close()
+        print(f'Table: {args.table} ({writer.rows_written} rows, {writer.ext})')
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
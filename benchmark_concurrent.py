@@ -6,6 +6,9 @@ import queue
 import requests
 import statistics
 
+from dataset_index import list_images
+from results_table import TABLE_FORMATS, TableWriter, benchmark_row, new_run_id
+
 """并发基准脚本
 测量不同并发度下的吞吐量、平均/分位延迟，支持模式选择与图片目录。
 
@@ -14,23 +17,20 @@ import statistics
       --concurrency 5 10 --duration 30 --mode full_remote --resize none
 
 输出: 每个并发度下的统计 (成功请求数、失败数、RPS、平均延迟、P50/P90/P99)。
+--table DIR 时另把每个请求（含服务端返回的分阶段耗时）写入列式表，见 results_table.py。
 """
 
 def load_images(path, limit=50):
-    imgs = []
-    for root, _, files in os.walk(path):
-        for fn in files:
-            if fn.lower().endswith(('.png','.jpg','.jpeg')):
-                imgs.append(os.path.join(root, fn))
-                if len(imgs) >= limit:
-                    return imgs
-    return imgs
+    # 有数据集清单（dataset_index.py）时直接读取，不再遍历目录
+    return list_images(path, limit)
 
-def worker(stop_event, server, mode, resize, images, results_q):
+def worker(stop_event, server, mode, resize, images, results_q, rows=None, run_id=None, conc=None):
     idx = 0
     while not stop_event.is_set():
         img_path = images[idx % len(images)]
         idx += 1
+        started = time.time()
+        latency, ok, resp = None, False, None
         try:
             with open(img_path, 'rb') as f:
                 files = {'file': (os.path.basename(img_path), f, 'image/jpeg')}
@@ -40,9 +40,17 @@ def worker(stop_event, server, mode, resize, images, results_q):
                 end = time.perf_counter()
             latency = (end - start) * 1000
             ok = resp.status_code == 200
-            results_q.put((latency, ok))
         except Exception:
-            results_q.put((None, False))
+            pass
+        results_q.put((latency, ok))
+        if rows is not None:
+            try:
+                payload = resp.json() if ok else None
+            except ValueError:
+                payload = None
+            rows.append(benchmark_row(run_id, mode, '/predict', conc, started, latency, ok,
+                                      uploaded_size=os.path.getsize(img_path), payload=payload,
+                                      resize_target=resize, image_name=os.path.basename(img_path)))
 
 def stats(latencies):
     if not latencies:
@@ -62,12 +70,13 @@ def stats(latencies):
         'max_ms': sl[-1]
     }
 
-def run_test(conc, duration, server, mode, resize, images):
+def run_test(conc, duration, server, mode, resize, images, rows=None, run_id=None):
     stop_event = threading.Event()
     results_q = queue.Queue()
     threads = []
     for _ in range(conc):
-        t = threading.Thread(target=worker, args=(stop_event, server, mode, resize, images, results_q))
+        t = threading.Thread(target=worker, args=(stop_event, server, mode, resize, images, results_q,
+                                                  rows, run_id, conc))
         t.start()
         threads.append(t)
     start = time.time()
@@ -110,6 +119,8 @@ def main():
     ap.add_argument('--duration', type=int, default=20)
     ap.add_argument('--limit', type=int, default=20)
     ap.add_argument('--out', default='concurrent_results.json')
+    ap.add_argument('--table', default=None, help='逐请求结果写入列式表目录')
+    ap.add_argument('--table-format', choices=TABLE_FORMATS, default='auto')
     args = ap.parse_args()
 
     images = load_images(args.images, limit=args.limit)
@@ -118,15 +129,23 @@ def main():
         return
 
     import json
+    writer = TableWriter(args.table, args.table_format, prefix='concurrent') if args.table else None
+    run_id = new_run_id()
     all_results = []
     for c in args.concurrency:
         print(f'Running concurrency={c} duration={args.duration}s ...')
-        res = run_test(c, args.duration, args.server, args.mode, args.resize, images)
+        rows = [] if writer else None
+        res = run_test(c, args.duration, args.server, args.mode, args.resize, images, rows, run_id)
+        if writer:
+            writer.extend(rows)
         all_results.append(res)
         print(res)
     with open(args.out,'w',encoding='utf-8') as f:
         json.dump(all_results, f, ensure_ascii=False, indent=2)
     print('Saved:', args.out)
+    if writer:
+        writer.close()
+        print(f'Table: {args.table} ({writer.rows_written} rows, {writer.ext})')
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
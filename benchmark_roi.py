@@ -0,0 +1,124 @@
+# benchmark_roi.py
+"""ROI 裁剪基准: 同一批图片分别走原流程（整幅解码、整幅预处理）与 ROI 流程（缩小解码 + 裁剪到漆面区域），
+对比单张端到端耗时（含解码）、分类结果一致性与准确率，以及裁剪比例。进程内执行，不经过 HTTP。
+
+示例:
+    python benchmark_roi.py --source dataset/valid
+    python benchmark_roi.py --source static/uploads --unlabeled --repeat 3 --out output/roi_benchmark.json
+--unlabeled: 来源没有标注（如现场整板照片），只比较耗时与两种流程的一致性
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from evaluate import index_source, load_detector, CLASS_NAMES
+
+
+def _percentile(values, q):
+    s = sorted(values)
+    return s[int(q * (len(s) - 1))]
+
+
+def _stats(values):
+    return {'avg': float(np.mean(values)), 'p50': _percentile(values, 0.5), 'p90': _percentile(values, 0.9),
+            'max': max(values)}
+
+
+def run(detector, items, repeat=1):
+    rows = []
+    for item in items:
+        row = {'file': os.path.basename(item['path']), 'true_label': 1 if item['boxes'] > 0 else 0}
+        for name, roi in (('full', False), ('roi', True)):
+            best, result = None, None
+            for _ in range(max(1, repeat)):
+                t0 = time.perf_counter()
+                result = detector.predict_single(item['path'], with_timing=True, roi=roi)
+                ms = (time.perf_counter() - t0) * 1000
+                best = ms if best is None else min(best, ms)
+            if 'error' in result:
+                row = None
+                break
+            row[f'{name}_ms'] = best
+            row[f'{name}_pred'] = result['prediction']
+            if roi:
+                w, h = result['image_size']
+                box = result['roi']
+                row['roi'] = box
+                row['roi_stage_ms'] = result['timing']['roi_ms']
+                row['kept_fraction'] = box[2] * box[3] / (w * h) if box else 1.0
+        if row is not None:
+            rows.append(row)
+    return rows
+
+
+def summarize(rows, labeled=True):
+    full = [r['full_ms'] for r in rows]
+    roi = [r['roi_ms'] for r in rows]
+    cropped = [r for r in rows if r['roi']]
+    report = {
+        'images': len(rows),
+        'latency_ms': {'full': _stats(full), 'roi': _stats(roi),
+                       'roi_stage': _stats([r['roi_stage_ms'] for r in rows])},
+        'speedup': float(np.mean(full) / np.mean(roi)),
+        'cropped': len(cropped),
+        'kept_fraction_avg': float(np.mean([r['kept_fraction'] for r in cropped])) if cropped else None,
+        'agreement': float(np.mean([r['full_pred'] == r['roi_pred'] for r in rows])),
+        'changed': [r['file'] for r in rows if r['full_pred'] != r['roi_pred']],
+    }
+    if labeled:
+        report['accuracy'] = {name: float(np.mean([r[f'{name}_pred'] == r['true_label'] for r in rows]))
+                              for name in ('full', 'roi')}
+    return report
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--source', default='dataset/valid', help='图片目录或列表文件')
+    ap.add_argument('--data-root', default=None, help='列表文件中的路径按该数据集目录的清单映射到本地')
+    ap.add_argument('--unlabeled', action='store_true', help='来源没有标注，不统计准确率')
+    ap.add_argument('--model', default=None, help='模型文件；默认使用注册表中的激活版本')
+    ap.add_argument('--version', default=None)
+    ap.add_argument('--repeat', type=int, default=1, help='每张图片每种流程重复次数（取最小耗时）')
+    ap.add_argument('--limit', type=int, default=None)
+    ap.add_argument('--out', default=None, help='写出 JSON 报告（含逐张结果）')
+    args = ap.parse_args()
+
+    items, _ = index_source(args.source, args.data_root)
+    items = items[:args.limit] if args.limit else items
+    if not items:
+        print('未找到图片')
+        return
+    detector = load_detector(args.model, args.version)
+    rows = run(detector, items, args.repeat)
+    report = summarize(rows, labeled=not args.unlabeled)
+
+    lat = report['latency_ms']
+    print(f"\n=== ROI 基准 ({report['images']} 张) ===")
+    for name, label in (('full', '原流程'), ('roi', 'ROI 流程')):
+        s = lat[name]
+        print(f"{label}: avg {s['avg']:.1f}ms, p50 {s['p50']:.1f}ms, p90 {s['p90']:.1f}ms, max {s['max']:.1f}ms")
+    print(f"ROI 定位: avg {lat['roi_stage']['avg']:.2f}ms; 加速 {report['speedup']:.2f}x")
+    kept = report['kept_fraction_avg']
+    print(f"裁剪 {report['cropped']}/{report['images']} 张" + (f", 平均保留面积 {kept:.0%}" if kept else ''))
+    print(f"结果一致率: {report['agreement']:.3f}" +
+          (f" (变化: {', '.join(report['changed'][:10])})" if report['changed'] else ''))
+    if 'accuracy' in report:
+        print(f"准确率: 原流程 {report['accuracy']['full']:.3f}, ROI 流程 {report['accuracy']['roi']:.3f}")
+    for r in rows:
+        if r['roi']:
+            print(f"  {r['file']}: roi={r['roi']} 保留 {r['kept_fraction']:.0%}, "
+                  f"{r['full_ms']:.1f}ms -> {r['roi_ms']:.1f}ms, {CLASS_NAMES[r['full_pred']]} -> {CLASS_NAMES[r['roi_pred']]}")
+
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(dict(report, source=args.source, results=rows), f, ensure_ascii=False, indent=2)
+        print('Saved:', args.out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,275 @@
+"""容量规划扫描: 逐步加压找到各模式的饱和拐点
+对每个模式（full_remote / classify_only / auto）按 --start、--factor 逐级提高并发，每级压测 --step-duration 秒，
+同时在后台采样服务进程（含子进程，如 debug 重载器或 gunicorn worker）的 CPU 与 RSS。
+满足以下任一条件即认为越过拐点，停止该模式的加压:
+  - p99 超过 --slo-p99-ms，或失败率超过 --max-error-rate；
+  - 吞吐进入平台: 相比上一级 RPS 增幅小于 --plateau（并发翻倍而吞吐几乎不变）。
+拐点之前满足 SLO 的最大 RPS 即“可持续吞吐”，再按该级实际占用的 CPU 核数折算为每核 RPS，供服务集群选型。
+
+示例:
+  python capacity_sweep.py --server http://127.0.0.1:5000 --images dataset/train --slo-p99-ms 500
+  python capacity_sweep.py --server http://127.0.0.1:5000 --images dataset/train --server-pid 12345 --max-concurrency 128
+输出（--outdir）:
+  - capacity_report.json : 每模式的逐级结果、拐点与容量结论
+  - <mode>_sweep.json    : 逐级结果，格式与 benchmark_concurrent.py 相同，可直接交给 summarize_concurrency.py 作图
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+import benchmark_classify_only
+import benchmark_concurrent
+from results_table import TABLE_FORMATS, TableWriter, new_run_id
+
+MODES = ('full_remote', 'classify_only', 'auto')
+
+
+def find_server_pid(server):
+    """按服务 URL 的端口找到监听该端口的进程"""
+    import psutil
+    port = urlparse(server).port or 80
+    for conn in psutil.net_connections(kind='tcp'):
+        if conn.status == psutil.CONN_LISTEN and conn.laddr and conn.laddr.port == port and conn.pid:
+            return conn.pid
+    return None
+
+
+class ResourceSampler:
+    """后台线程定时采样进程树的 CPU（以核为单位，1.0 = 占满一个核）与 RSS"""
+
+    def __init__(self, pid, interval=0.5):
+        import psutil
+        self._psutil = psutil
+        self.root = psutil.Process(pid)
+        self.interval = interval
+        self._procs = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.cpu_samples = []
+        self.rss_samples = []
+
+    def _tree(self):
+        try:
+            procs = [self.root] + self.root.children(recursive=True)
+        except self._psutil.NoSuchProcess:
+            return []
+        for p in procs:
+            if p.pid not in self._procs:
+                p.cpu_percent(None)  # 首次调用只建立基准
+                self._procs[p.pid] = p
+        return [self._procs[p.pid] for p in procs]
+
+    def _sample(self):
+        cpu = 0.0
+        rss = 0
+        for p in self._tree():
+            try:
+                cpu += p.cpu_percent(None) / 100
+                rss += p.memory_info().rss
+            except self._psutil.NoSuchProcess:
+                self._procs.pop(p.pid, None)
+        with self._lock:
+            self.cpu_samples.append(cpu)
+            self.rss_samples.append(rss)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._tree()
+        with self._lock:
+            self.cpu_samples = []
+            self.rss_samples = []
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            cpu, rss = list(self.cpu_samples), list(self.rss_samples)
+        if not cpu:
+            return {}
+        return {
+            'cpu_cores_avg': sum(cpu) / len(cpu),
+            'cpu_cores_max': max(cpu),
+            'rss_mb_avg': sum(rss) / len(rss) / 1e6,
+            'rss_mb_max': max(rss) / 1e6,
+            'samples': len(cpu),
+        }
+
+
+def concurrency_levels(start, maximum, factor):
+    levels = []
+    c = start
+    while c <= maximum:
+        levels.append(c)
+        c = max(c + 1, int(round(c * factor)))
+    return levels
+
+
+def run_step(mode, conc, args, images, features, rows, run_id):
+    if mode == 'classify_only':
+        names, feats, schema_version = features
+        return benchmark_classify_only.run_once(conc, args.step_duration, args.server, names, feats,
+                                                schema_version, rows, run_id)
+    return benchmark_concurrent.run_test(conc, args.step_duration, args.server, mode, args.resize, images,
+                                         rows, run_id)
+
+
+def check_step(step, prev, args):
+    """返回 (是否满足 SLO, 越过拐点的原因或 None)"""
+    total = step['success'] + step['fail']
+    error_rate = step['fail'] / total if total else 1.0
+    p99 = (step['latency_stats'] or {}).get('p99_ms')
+    step['error_rate'] = error_rate
+    if p99 is None or p99 > args.slo_p99_ms:
+        return False, f'p99 {p99 if p99 is None else round(p99, 1)} ms > SLO {args.slo_p99_ms} ms'
+    if error_rate > args.max_error_rate:
+        return False, f'失败率 {error_rate:.1%} > {args.max_error_rate:.1%}'
+    if prev is not None and prev['rps'] > 0 and step['rps'] < prev['rps'] * (1 + args.plateau):
+        return True, f'吞吐平台: {prev["rps"]:.1f} -> {step["rps"]:.1f} RPS'
+    return True, None
+
+
+def capacity(mode, steps, knee_reason, cores_available):
+    ok_steps = [s for s in steps if s['within_slo']]
+    result = {
+        'mode': mode,
+        'knee_reason': knee_reason or '达到最大并发仍未饱和',
+        'cores_available': cores_available,
+        'steps': len(steps),
+    }
+    if not ok_steps:
+        result['max_sustainable_rps'] = 0
+        return result
+    best = max(ok_steps, key=lambda s: s['rps'])
+    used = (best.get('server') or {}).get('cpu_cores_avg')
+    result.update({
+        'knee_concurrency': best['concurrency'],
+        'max_sustainable_rps': best['rps'],
+        'p99_ms_at_knee': best['latency_stats'].get('p99_ms'),
+        # 按机器可用核数折算（选型时的保守值）与按实测占用核数折算（进程效率）
+        'rps_per_core': best['rps'] / cores_available if cores_available else None,
+        'rps_per_busy_core': best['rps'] / used if used else None,
+        'cpu_cores_at_knee': used,
+        'rss_mb_max': max(((s.get('server') or {}).get('rss_mb_max') or 0) for s in steps) or None,
+    })
+    return result
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--server', required=True)
+    ap.add_argument('--images', required=True)
+    ap.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    ap.add_argument('--resize', default='none')
+    ap.add_argument('--limit', type=int, default=20, help='最多使用的图片数')
+    ap.add_argument('--start', type=int, default=1, help='起始并发')
+    ap.add_argument('--max-concurrency', type=int, default=64)
+    ap.add_argument('--factor', type=float, default=2.0, help='每级并发放大倍数')
+    ap.add_argument('--step-duration', type=int, default=15, help='每级压测秒数')
+    ap.add_argument('--cooldown', type=float, default=2.0, help='两级之间的间隔秒数')
+    ap.add_argument('--slo-p99-ms', type=float, default=1000.0)
+    ap.add_argument('--max-error-rate', type=float, default=0.01)
+    ap.add_argument('--plateau', type=float, default=0.05, help='相邻两级 RPS 增幅低于该比例视为平台')
+    ap.add_argument('--server-pid', type=int, default=None, help='服务进程 PID；默认按端口查找')
+    ap.add_argument('--cores', type=int, default=None, help='服务可用核数；默认取服务进程的 CPU 亲和性')
+    ap.add_argument('--outdir', default='output/capacity')
+    ap.add_argument('--table', default=None, help='逐请求结果写入列式表目录')
+    ap.add_argument('--table-format', choices=TABLE_FORMATS, default='auto')
+    args = ap.parse_args()
+
+    images = benchmark_concurrent.load_images(args.images, limit=args.limit)
+    if not images:
+        print('No images found.')
+        return
+
+    pid = args.server_pid or find_server_pid(args.server)
+    sampler = None
+    cores = args.cores
+    if pid:
+        sampler = ResourceSampler(pid)
+        if cores is None:
+            try:
+                cores = len(sampler.root.cpu_affinity())
+            except (AttributeError, OSError):
+                cores = os.cpu_count()
+        print(f'Sampling server process tree pid={pid}, cores={cores}')
+    else:
+        cores = cores or os.cpu_count()
+        print('Server process not found, CPU/RSS will not be recorded (use --server-pid).')
+
+    features = None
+    if 'classify_only' in args.modes:
+        print(f'Preparing features from {len(images)} images ...')
+        from inference import FEATURE_SCHEMA_VERSION
+        names, feats = benchmark_classify_only.extract_features_batch_py(images)
+        features = (names, feats, FEATURE_SCHEMA_VERSION)
+
+    writer = TableWriter(args.table, args.table_format, prefix='capacity') if args.table else None
+    run_id = new_run_id()
+    os.makedirs(args.outdir, exist_ok=True)
+    report = {
+        'server': args.server,
+        'run_id': run_id,
+        'slo_p99_ms': args.slo_p99_ms,
+        'max_error_rate': args.max_error_rate,
+        'plateau': args.plateau,
+        'step_duration_s': args.step_duration,
+        'modes': {},
+    }
+    for mode in args.modes:
+        steps = []
+        knee_reason = None
+        for conc in concurrency_levels(args.start, args.max_concurrency, args.factor):
+            print(f'[{mode}] concurrency={conc} duration={args.step_duration}s ...')
+            rows = [] if writer else None
+            if sampler:
+                sampler.start()
+            step = run_step(mode, conc, args, images, features, rows, run_id)
+            step['server'] = sampler.stop() if sampler else {}
+            if writer:
+                writer.extend(rows)
+            step['within_slo'], knee_reason = check_step(step, steps[-1] if steps else None, args)
+            steps.append(step)
+            server = step['server']
+            print(f"  rps={step['rps']:.1f} p99={step['latency_stats'].get('p99_ms')} fail={step['fail']}"
+                  + (f" cpu={server['cpu_cores_avg']:.2f} cores rss={server['rss_mb_max']:.0f} MB" if server else ''))
+            if knee_reason:
+                print(f'  knee: {knee_reason}')
+                break
+            time.sleep(args.cooldown)
+        with open(os.path.join(args.outdir, f'{mode}_sweep.json'), 'w', encoding='utf-8') as f:
+            json.dump(steps, f, ensure_ascii=False, indent=2)
+        report['modes'][mode] = dict(capacity(mode, steps, knee_reason, cores), results=steps)
+
+    out = os.path.join(args.outdir, 'capacity_report.json')
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    if writer:
+        writer.close()
+
+    print('\n=== 容量报告 ===')
+    print(f"{'mode':<15}{'knee conc':>10}{'max RPS':>10}{'p99 ms':>10}{'RPS/core':>10}{'RPS/busy core':>15}{'RSS MB':>9}")
+    for mode, r in report['modes'].items():
+        def fmt(v, spec='.1f'):
+            return format(v, spec) if isinstance(v, (int, float)) else '-'
+        print(f"{mode:<15}{fmt(r.get('knee_concurrency'), 'd'):>10}{fmt(r['max_sustainable_rps']):>10}"
+              f"{fmt(r.get('p99_ms_at_knee')):>10}{fmt(r.get('rps_per_core'), '.2f'):>10}"
+              f"{fmt(r.get('rps_per_busy_core'), '.2f'):>15}{fmt(r.get('rss_mb_max'), '.0f'):>9}")
+        print(f"{'':<15}{r['knee_reason']}")
+    print('Saved:', out)
+
+
+if __name__ == '__main__':
+    main()
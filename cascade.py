@@ -0,0 +1,216 @@
+# cascade.py
+"""两级级联: 廉价的第一级直接放行明显正常的面板，只有可疑图片才进入完整特征提取 + SVM
+生产线上约 90% 的面板没有缺陷，但每张图都要做 512x512 的缺陷掩码、findContours、Hu 矩和 Sobel 梯度。
+第一级在 128x128 的缩小灰度图上只算两项（约 0.5 ms）:
+    defect_ratio  缺陷掩码（与第二级同一个 defect_mask）中前景像素占比
+    edge_density  Canny 边缘像素占比
+两项都不超过阈值即判为正常（stage 1），否则交给原有的 extract_robust_features + SVM（stage 2）。
+
+阈值按模型版本在验证集上调出: 在“所有标注为缺陷的图片中被第一级放行的比例 ≤ 1 - 目标召回率”的约束下，
+使第一级放行的正常图片最多。结果写入 model/versions/cascade-<版本>.json，服务端加载与激活版本一致的阈值；
+增量更新（online_update.py）发布的版本沿用其基础版本的阈值，其余没有阈值文件的版本不启用级联（行为与原来完全相同）。
+
+示例:
+    python cascade.py --source dataset/valid --target-recall 0.99
+    python cascade.py --source output/gen_valid.txt --data-root dataset --version v2 --dry-run
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+CASCADE_SIDE = 128
+STAGE1_FEATURES = ('defect_ratio', 'edge_density')
+
+
+def stage1_features(detector, gray):
+    """第一级特征；gray 为预处理后的模型输入尺寸灰度图"""
+    small = cv2.resize(gray, (CASCADE_SIDE, CASCADE_SIDE), interpolation=cv2.INTER_AREA)
+    mask = detector.defect_mask(small)
+    edges = cv2.Canny(small, 50, 150)
+    return np.count_nonzero(mask) / mask.size, np.count_nonzero(edges) / edges.size
+
+
+def gate_path(root, version):
+    return os.path.join(root, 'versions', f'cascade-{version}.json')
+
+
+class CascadeGate:
+    def __init__(self, thresholds, model_version=None, target_recall=None, stats=None):
+        self.thresholds = tuple(float(t) for t in thresholds)
+        self.model_version = model_version
+        self.target_recall = target_recall
+        self.stats = stats or {}
+
+    def accepts(self, feats):
+        """第一级是否直接判为正常"""
+        return all(v <= t for v, t in zip(feats, self.thresholds))
+
+    def to_dict(self):
+        return {'features': list(STAGE1_FEATURES), 'side': CASCADE_SIDE,
+                'thresholds': dict(zip(STAGE1_FEATURES, self.thresholds)),
+                'model_version': self.model_version, 'target_recall': self.target_recall,
+                'tuned_at': time.time(), 'stats': self.stats}
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('side') != CASCADE_SIDE or tuple(data.get('features', ())) != STAGE1_FEATURES:
+            raise ValueError(f'级联阈值与当前第一级特征不一致: {path}')
+        return cls([data['thresholds'][k] for k in STAGE1_FEATURES], data.get('model_version'),
+                   data.get('target_recall'), data.get('stats'))
+
+
+def load_gate(root, version):
+    """加载某个模型版本的级联阈值；没有或不兼容时返回 None（不启用级联）"""
+    path = gate_path(root, version)
+    if version is None or not os.path.exists(path):
+        return None
+    try:
+        return CascadeGate.load(path)
+    except (ValueError, KeyError) as e:
+        print(f"⚠️ 忽略级联阈值: {e}")
+        return None
+
+
+def tune(values, labels, target_recall=0.99, candidates=100):
+    """values: (n, 2) 第一级特征；labels: 0/1 真实标签。
+    在缺陷召回约束下网格搜索放行阈值，返回 (thresholds, stats)；无法满足约束时 thresholds 为 None"""
+    values = np.asarray(values, dtype=np.float64)
+    labels = np.asarray(labels, dtype=int)
+    pos, neg = values[labels == 1], values[labels == 0]
+    if not len(neg):
+        return None, {'reason': '验证集中没有正常样本'}
+    # 候选阈值取正常样本各特征的分位数（放行区域的边界只可能落在这些值上）
+    qs = np.linspace(0, 1, candidates + 1)
+    grid = [np.unique(np.quantile(neg[:, j], qs, method='lower')) for j in range(values.shape[1])]
+    t0, t1 = np.meshgrid(grid[0], grid[1], indexing='ij')
+    t0, t1 = t0.ravel(), t1.ravel()
+
+    def accepted(v):
+        return (v[:, 0][None, :] <= t0[:, None]) & (v[:, 1][None, :] <= t1[:, None])
+
+    missed = accepted(pos).sum(axis=1) if len(pos) else np.zeros(len(t0), dtype=int)
+    allowed = int(np.floor((1 - target_recall) * len(pos) + 1e-9))
+    passed = accepted(neg).sum(axis=1)
+    ok = np.flatnonzero(missed <= allowed)
+    if not len(ok) or passed[ok].max() == 0:
+        return None, {'reason': '在目标召回率下第一级无法放行任何正常样本'}
+    best = ok[np.argmax(passed[ok])]
+    thresholds = (float(t0[best]), float(t1[best]))
+    stats = {
+        'images': int(len(labels)), 'defects': int(len(pos)),
+        'clean_accepted': int(passed[best]), 'clean_accept_rate': float(passed[best] / len(neg)),
+        'defects_accepted': int(missed[best]),
+        'stage1_recall': float(1 - missed[best] / len(pos)) if len(pos) else None,
+    }
+    return thresholds, stats
+
+
+def collect(detector, items, workers=4):
+    """验证集: 第一级特征、第一级耗时与完整流程预测（用于评估级联整体召回与一致性）"""
+    def work(item):
+        img = cv2.imread(item['path'])
+        if img is None:
+            return None
+        gray = detector.gray_image(img)
+        t0 = time.perf_counter()
+        feats = stage1_features(detector, gray)
+        t1 = time.perf_counter()
+        full = detector.extract_robust_features(gray, detector.defect_mask(gray))
+        t2 = time.perf_counter()
+        return feats, (t1 - t0) * 1000, (t2 - t1) * 1000, full
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        results = list(pool.map(work, items))
+    keep = [i for i, r in enumerate(results) if r is not None]
+    values = np.array([results[i][0] for i in keep])
+    stage1_ms = [results[i][1] for i in keep]
+    stage2_ms = [results[i][2] for i in keep]
+    model, _ = detector.active()
+    _, preds = model.predict(np.array([results[i][3] for i in keep], dtype=np.float32))
+    labels = np.array([1 if items[i]['boxes'] > 0 else 0 for i in keep])
+    return values, labels, preds.ravel().astype(int), stage1_ms, stage2_ms
+
+
+def cascade_report(values, labels, preds, thresholds, stage1_ms, stage2_ms, clean_rate=0.9):
+    """级联与完整流程的对比: 召回率、一致率、平均第一级之后的计算量；并按生产正常率估算平均耗时"""
+    accepted = (values[:, 0] <= thresholds[0]) & (values[:, 1] <= thresholds[1])
+    cascade_preds = np.where(accepted, 0, preds)
+    defects = labels == 1
+
+    def recall(p):
+        return float(np.mean(p[defects] == 1)) if defects.any() else None
+
+    s1, s2 = float(np.mean(stage1_ms)), float(np.mean(stage2_ms))
+    clean_accept = float(np.mean(accepted[~defects])) if (~defects).any() else 0.0
+    defect_accept = float(np.mean(accepted[defects])) if defects.any() else 0.0
+    # 按生产正常率加权: 每张图都算第一级，未被放行的再算第二级
+    expected = s1 + s2 * (1 - clean_rate * clean_accept - (1 - clean_rate) * defect_accept)
+    return {
+        'recall_full': recall(preds), 'recall_cascade': recall(cascade_preds),
+        'accuracy_full': float(np.mean(preds == labels)), 'accuracy_cascade': float(np.mean(cascade_preds == labels)),
+        'agreement': float(np.mean(cascade_preds == preds)),
+        'accepted_at_stage1': float(np.mean(accepted)),
+        'stage1_ms': s1, 'stage2_ms': s2,
+        'production_clean_rate': clean_rate,
+        'expected_ms_per_image': expected, 'full_ms_per_image': s2,
+        'expected_saving': 1 - expected / s2 if s2 else None,
+    }
+
+
+def main():
+    from evaluate import index_source, load_detector
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--source', default='dataset/valid', help='验证集目录或列表文件（需要 YOLO 标注）')
+    ap.add_argument('--data-root', default=None, help='列表文件中的路径按该数据集目录的清单映射到本地')
+    ap.add_argument('--version', default=None, help='为注册表中的指定版本调阈值（默认激活版本）')
+    ap.add_argument('--root', default='model', help='模型注册表目录')
+    ap.add_argument('--target-recall', type=float, default=0.99, help='第一级对缺陷样本的最低召回率')
+    ap.add_argument('--clean-rate', type=float, default=0.9, help='生产环境正常面板比例（用于估算平均耗时）')
+    ap.add_argument('--workers', type=int, default=os.cpu_count() or 4)
+    ap.add_argument('--dry-run', action='store_true', help='只输出调参结果，不写阈值文件')
+    args = ap.parse_args()
+
+    items, _ = index_source(args.source, args.data_root)
+    if not items:
+        print('未找到图片')
+        return
+    detector = load_detector(version=args.version)
+    version = detector.model_version
+    values, labels, preds, stage1_ms, stage2_ms = collect(detector, items, args.workers)
+    thresholds, stats = tune(values, labels, args.target_recall)
+    print(f"验证集 {len(labels)} 张 (缺陷 {int(labels.sum())})，模型版本 {version}")
+    if thresholds is None:
+        print(f"❌ {stats['reason']}")
+        return
+    report = cascade_report(values, labels, preds, thresholds, stage1_ms, stage2_ms, args.clean_rate)
+    stats.update(report)
+    print(f"阈值: defect_ratio ≤ {thresholds[0]:.4f}, edge_density ≤ {thresholds[1]:.4f}")
+    print(f"第一级放行正常样本 {stats['clean_accept_rate']:.1%}，缺陷召回 {stats['stage1_recall']:.3f}")
+    print(f"整体召回: 完整流程 {report['recall_full']:.3f} -> 级联 {report['recall_cascade']:.3f}，"
+          f"与完整流程一致率 {report['agreement']:.3f}")
+    print(f"单张耗时: 第一级 {report['stage1_ms']:.2f} ms，第二级 {report['stage2_ms']:.2f} ms；"
+          f"正常率 {args.clean_rate:.0%} 时平均 {report['expected_ms_per_image']:.2f} ms "
+          f"(节省 {report['expected_saving']:.0%})")
+    if not args.dry_run:
+        path = gate_path(args.root, version)
+        CascadeGate(thresholds, version, args.target_recall, stats).save(path)
+        print('Saved:', path)
+
+
+if __name__ == '__main__':
+    main()
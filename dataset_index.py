@@ -0,0 +1,327 @@
+# dataset_index.py
+"""数据集索引清单
+一次扫描数据集目录，把每张图片的相对路径、大小、mtime、内容哈希（sha256）、分辨率以及对应 YOLO 标注的摘要
+（框数、类别）写入紧凑的 dataset_index.json（放在数据集根目录）。训练、评估与压测脚本直接读取清单，
+不再各自 glob / os.walk / exists / getsize；在网络存储上这些重复扫描比提特征还慢。
+
+- 增量更新: 重新扫描时大小与 mtime 未变的文件沿用旧记录，只对新增或改动的文件读取内容、计算哈希与分辨率；
+- 标注: 同目录同名 txt，或 darknet 结构中 images/ 对应的 labels/ 平行目录；
+- 过期检查: 打开已有清单时只 stat 清单中出现过的目录（不列目录、不逐个 stat 文件），任一目录的 mtime 晚于清单文件
+  （有文件增删或改名）就先增量更新；原地覆盖同名文件不改变目录 mtime，这种情况需要显式 refresh；
+- 路径映射: 列表文件（output/gen_train.txt 等）里写死的其它机器路径（如 F:/.../images/valid/0003.PNG）
+  按“目录名/文件名”后缀匹配到清单中的本地文件，见 DatasetIndex.resolve。
+
+示例:
+    python dataset_index.py --root dataset                       # 建立或增量更新 dataset/dataset_index.json
+    python dataset_index.py --root dataset --remap output/gen_valid.txt --out output/gen_valid.local.txt
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+INDEX_NAME = 'dataset_index.json'
+INDEX_VERSION = 1
+IMAGE_EXTS = ('.png', '.jpg', '.jpeg', '.bmp')
+# 清单文件本身写在根目录，保存时的原子替换会让根目录 mtime 略晚于清单文件
+ROOT_MTIME_GRACE_NS = 2 * 10 ** 9
+
+
+def image_dims(data):
+    """从文件头解析 (宽, 高)，为存储的原始尺寸（不按 EXIF 方向旋转）；不认识的格式返回 None"""
+    if data[:8] == b'\x89PNG\r\n\x1a\n' and len(data) >= 24:
+        return struct.unpack('>II', data[16:24])
+    if data[:2] == b'BM' and len(data) >= 26:
+        w, h = struct.unpack('<ii', data[18:26])
+        return w, abs(h)
+    if data[:2] == b'\xff\xd8':
+        i = 2
+        while i + 9 < len(data):
+            if data[i] != 0xFF:
+                i += 1
+                continue
+            marker = data[i + 1]
+            if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7 or marker == 0xFF:
+                i += 1 if marker == 0xFF else 2
+                continue
+            length = struct.unpack('>H', data[i + 2:i + 4])[0]
+            # SOF0..SOF15，不含 DHT(C4)/JPG(C8)/DAC(CC)
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                h, w = struct.unpack('>HH', data[i + 5:i + 9])
+                return w, h
+            i += 2 + length
+    return None
+
+
+def _describe_image(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    dims = image_dims(data)
+    if dims is None:
+        import cv2
+        import numpy as np
+        img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_UNCHANGED)
+        dims = (img.shape[1], img.shape[0]) if img is not None else (None, None)
+    return hashlib.sha256(data).hexdigest(), dims
+
+
+def _describe_label(path):
+    boxes, classes = 0, set()
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            parts = line.split()
+            if parts:
+                boxes += 1
+                classes.add(parts[0])
+    return boxes, sorted(classes)
+
+
+def _walk(root):
+    """递归 scandir，产出 (相对路径, DirEntry)"""
+    stack = ['']
+    while stack:
+        rel_dir = stack.pop()
+        with os.scandir(os.path.join(root, rel_dir)) as it:
+            for entry in it:
+                if entry.name.startswith('.'):
+                    continue
+                rel = f'{rel_dir}/{entry.name}' if rel_dir else entry.name
+                if entry.is_dir():
+                    stack.append(rel)
+                elif entry.is_file():
+                    yield rel, entry
+
+
+def _label_key(rel_image):
+    """图片相对路径 -> 可能的标注相对路径（同目录优先，其次 images/ -> labels/）"""
+    stem = os.path.splitext(rel_image)[0]
+    keys = [stem + '.txt']
+    parts = stem.split('/')
+    if 'images' in parts[:-1]:
+        i = len(parts) - 2 - parts[-2::-1].index('images')
+        keys.append('/'.join(parts[:i] + ['labels'] + parts[i + 1:]) + '.txt')
+    return keys
+
+
+class DatasetIndex:
+    def __init__(self, root, entries=None, built_at=None):
+        self.root = os.path.abspath(root)
+        self.path = os.path.join(self.root, INDEX_NAME)
+        self.entries = entries or []
+        self.built_at = built_at
+        self._by_tail = None
+
+    @classmethod
+    def load(cls, root):
+        path = os.path.join(root, INDEX_NAME)
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != INDEX_VERSION:
+            raise ValueError(f'清单版本不兼容: {data.get("version")}')
+        return cls(root, data['entries'], data.get('built_at'))
+
+    def refresh(self, workers=8):
+        """增量更新: 返回 {'images', 'hashed', 'reused', 'removed'}"""
+        previous = {e['path']: e for e in self.entries}
+        images, labels = {}, {}
+        for rel, entry in _walk(self.root):
+            ext = os.path.splitext(entry.name)[1].lower()
+            if ext in IMAGE_EXTS:
+                images[rel] = entry.stat()
+            elif ext == '.txt':
+                labels[rel] = entry.stat()
+
+        entries, todo = [], []
+        for rel in sorted(images):
+            st = images[rel]
+            old = previous.get(rel)
+            if old is not None and old['size'] == st.st_size and old['mtime_ns'] == st.st_mtime_ns:
+                entry = dict(old)
+            else:
+                entry = {'path': rel, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+                todo.append(entry)
+            entry['label'] = self._label_entry(rel, labels, old)
+            entries.append(entry)
+
+        def describe(entry):
+            sha, (w, h) = _describe_image(os.path.join(self.root, entry['path']))
+            entry.update(sha256=sha, width=w, height=h)
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            list(pool.map(describe, todo))
+
+        stats = {'images': len(entries), 'hashed': len(todo), 'reused': len(entries) - len(todo),
+                 'removed': len(set(previous) - set(images))}
+        self.entries = entries
+        self.built_at = time.time()
+        self._by_tail = None
+        return stats
+
+    def is_stale(self):
+        """清单覆盖的目录在清单保存后有文件增删或改名时返回 True"""
+        try:
+            saved_ns = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return True
+        dirs = {''}
+        for e in self.entries:
+            for path in (e['path'], (e.get('label') or {}).get('path')):
+                while path:
+                    path = path.rpartition('/')[0]
+                    dirs.add(path)
+        for rel_dir in dirs:
+            try:
+                mtime_ns = os.stat(os.path.join(self.root, rel_dir)).st_mtime_ns
+            except FileNotFoundError:
+                return True
+            if mtime_ns >= saved_ns + (ROOT_MTIME_GRACE_NS if rel_dir == '' else 0):
+                return True
+        return False
+
+    def _label_entry(self, rel_image, labels, old):
+        for key in _label_key(rel_image):
+            st = labels.get(key)
+            if st is None:
+                continue
+            prev = (old or {}).get('label')
+            if prev and prev['path'] == key and prev['size'] == st.st_size and prev['mtime_ns'] == st.st_mtime_ns:
+                return prev
+            boxes, classes = _describe_label(os.path.join(self.root, key))
+            return {'path': key, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'boxes': boxes, 'classes': classes}
+        return None
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': INDEX_VERSION, 'built_at': self.built_at, 'entries': self.entries},
+                      f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+
+    def abspath(self, entry):
+        return os.path.join(self.root, entry['path'])
+
+    @staticmethod
+    def label_of(entry):
+        """1 = 缺陷（标注中有框），0 = 正常"""
+        return 1 if (entry.get('label') or {}).get('boxes', 0) > 0 else 0
+
+    def images(self, under=None):
+        """某个子目录（绝对或相对路径）下的图片记录；under 为 None 时返回全部"""
+        if under is None:
+            return list(self.entries)
+        rel = os.path.relpath(os.path.abspath(under), self.root).replace(os.sep, '/')
+        if rel == '.':
+            return list(self.entries)
+        prefix = rel.rstrip('/') + '/'
+        return [e for e in self.entries if e['path'].startswith(prefix)]
+
+    def resolve(self, foreign_path):
+        """把其它机器上的路径映射到清单中的本地文件: 先按“上级目录/文件名”匹配，再按唯一的文件名匹配"""
+        if self._by_tail is None:
+            self._by_tail = {}
+            for e in self.entries:
+                parts = e['path'].split('/')
+                for n in (2, 1):
+                    self._by_tail.setdefault('/'.join(parts[-n:]), []).append(e)
+        parts = foreign_path.replace('\\', '/').split('/')
+        for n in (2, 1):
+            hits = self._by_tail.get('/'.join(parts[-n:]))
+            if hits and len(hits) == 1:
+                return hits[0]
+        return None
+
+
+def find_index(directory):
+    """从 directory 向上查找 dataset_index.json，返回所在目录或 None"""
+    d = os.path.abspath(directory)
+    while True:
+        if os.path.isfile(os.path.join(d, INDEX_NAME)):
+            return d
+        parent = os.path.dirname(d)
+        if parent == d:
+            return None
+        d = parent
+
+
+def open_index(directory, refresh=False, workers=8):
+    """打开覆盖 directory 的清单；没有时以 directory 为根建立并保存。
+    refresh=True 或清单已过期（DatasetIndex.is_stale）时先增量更新"""
+    root = find_index(directory)
+    index = None
+    if root is not None:
+        try:
+            index = DatasetIndex.load(root)
+        except ValueError:
+            index = DatasetIndex(root)
+            refresh = True
+        if not refresh and index.is_stale():
+            print(f"⚠️ 数据集清单已过期（{index.root} 下有文件增删），先增量更新")
+            refresh = True
+    if index is None:
+        index = DatasetIndex(directory)
+        refresh = True
+    if refresh:
+        index.refresh(workers)
+        index.save()
+    return index
+
+
+def list_images(directory, limit=None):
+    """目录下图片的绝对路径（按相对路径排序），供压测脚本使用。
+    有清单时直接读清单；没有时只列目录（不计算哈希，也不在该目录写清单）"""
+    if find_index(directory) is not None:
+        index = open_index(directory)
+        paths = [index.abspath(e) for e in index.images(under=directory)]
+    else:
+        root = os.path.abspath(directory)
+        paths = sorted(os.path.join(root, rel) for rel, entry in _walk(root)
+                       if os.path.splitext(entry.name)[1].lower() in IMAGE_EXTS)
+    return paths[:limit] if limit else paths
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--root', default='dataset', help='数据集根目录')
+    ap.add_argument('--workers', type=int, default=8, help='计算哈希与分辨率的线程数')
+    ap.add_argument('--remap', default=None, help='把列表文件中的路径映射为本地路径')
+    ap.add_argument('--out', default=None, help='--remap 的输出文件（默认打印）')
+    args = ap.parse_args()
+
+    try:
+        index = DatasetIndex.load(args.root)
+    except (FileNotFoundError, ValueError):
+        index = DatasetIndex(args.root)
+    t0 = time.perf_counter()
+    stats = index.refresh(args.workers)
+    index.save()
+    labeled = sum(DatasetIndex.label_of(e) for e in index.entries)
+    print(f"{index.path}: {stats['images']} 张图片 (缺陷 {labeled}), 新计算 {stats['hashed']}, "
+          f"沿用 {stats['reused']}, 移除 {stats['removed']}, 耗时 {time.perf_counter() - t0:.2f}s")
+
+    if args.remap:
+        lines, missing = [], 0
+        with open(args.remap, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                entry = index.resolve(line)
+                if entry is None:
+                    missing += 1
+                    continue
+                lines.append(index.abspath(entry))
+        text = '\n'.join(lines) + '\n'
+        if args.out:
+            with open(args.out, 'w', encoding='utf-8') as f:
+                f.write(text)
+            print(f'映射 {len(lines)} 条, 未找到 {missing} 条 -> {args.out}')
+        else:
+            print(text, end='')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+# edge_sync.py
+"""端侧离线结果的批量同步
+浏览器离线时用 static/js/edge_svm.js 在本地分类，结果与性能日志暂存在 IndexedDB，
+联网后通过 POST /sync_batch 分批提交。服务端对带特征的记录用当前模型重新分类
+（作为权威结果，并统计端侧与服务端是否一致），然后逐条追加写入 JSONL。
+
+客户端在收到 accepted 列表后才删除本地记录，响应丢失时会重发同一批，
+因此按 client_id 去重（保留最近 dedup_window 个 id）。
+每条记录单独校验（validate_record）: 格式错误的记录在 results 中单独给出 error、不写入 JSONL，
+但仍列入 accepted，让客户端删除这条重发也不会变好的记录；同批其余记录照常处理。
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from perf_log_store import _is_number
+
+
+def validate_record(record):
+    """检查一条同步记录的 prediction / features / schema_version；合法时返回 None，否则返回错误说明"""
+    prediction = record.get('prediction')
+    if prediction is not None and not (_is_number(prediction) and prediction in (0, 1)):
+        return f'prediction 必须为 0 或 1: {prediction!r}'
+    features = record.get('features')
+    if features is not None and not (isinstance(features, list) and all(_is_number(v) for v in features)):
+        return 'features 必须为数值列表'
+    schema_version = record.get('schema_version')
+    if schema_version is not None and not _is_number(schema_version):
+        return f'schema_version 不是数值: {schema_version!r}'
+    return None
+
+
+class EdgeSyncStore:
+    def __init__(self, detector, path='output/edge_sync.jsonl', dedup_window=10000, max_batch=500):
+        self.detector = detector
+        self.path = path
+        self.dedup_window = dedup_window
+        self.max_batch = max_batch
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'received': 0, 'duplicates': 0, 'invalid': 0, 'reclassified': 0, 'disagreements': 0}
+
+    def _remember(self, client_id):
+        """记录 client_id，已见过则返回 False"""
+        if client_id in self._seen:
+            return False
+        self._seen[client_id] = None
+        while len(self._seen) > self.dedup_window:
+            self._seen.popitem(last=False)
+        return True
+
+    def _reclassify(self, record):
+        feats = record.get('features')
+        if feats is None or self.detector is None:
+            return {}
+        try:
+            result = self.detector.classify_features(feats, record.get('schema_version'))
+        except (TypeError, ValueError) as e:
+            return {'server_error': str(e)}
+        out = {'server_prediction': result['prediction'], 'server_model_version': result['model_version']}
+        if record.get('prediction') is not None:
+            out['agree'] = int(record['prediction']) == result['prediction']
+        return out
+
+    def ingest(self, records):
+        """写入一批记录，返回 (accepted client_id 列表, 每条的处理结果)"""
+        if len(records) > self.max_batch:
+            raise ValueError(f'单批最多 {self.max_batch} 条，实际 {len(records)}')
+        accepted, results, lines = [], [], []
+        received_at = time.time()
+        with self._lock:
+            for record in records:
+                client_id = record.get('client_id') if isinstance(record, dict) else None
+                if not client_id or not isinstance(client_id, str):
+                    results.append({'error': '缺少 client_id'})
+                    continue
+                accepted.append(client_id)
+                self.stats['received'] += 1
+                if not self._remember(client_id):
+                    self.stats['duplicates'] += 1
+                    results.append({'client_id': client_id, 'duplicate': True})
+                    continue
+                error = validate_record(record)
+                if error:
+                    self.stats['invalid'] += 1
+                    results.append({'client_id': client_id, 'error': error})
+                    continue
+                server = self._reclassify(record)
+                if 'server_prediction' in server:
+                    self.stats['reclassified'] += 1
+                    if server.get('agree') is False:
+                        self.stats['disagreements'] += 1
+                results.append(dict(server, client_id=client_id))
+                lines.append(json.dumps(dict(record, received_at=received_at, **server), ensure_ascii=False))
+            if lines:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write('\n'.join(lines) + '\n')
+        return accepted, results
@@ -0,0 +1,273 @@
+# evaluate.py
+"""模型评估引擎（取代 test_model.comprehensive_test 的逐张串行测试）
+1. 索引: 图片（扩展名不区分大小写，数据集实际是 .PNG）及其 YOLO 标注来自数据集清单（dataset_index.py），
+   不再逐个 stat；也可以读取 darknet 风格的列表文件（如 output/gen_valid.txt）。标注里有框即为缺陷；
+2. 特征: 线程池并行解码、预处理、提特征（OpenCV 运算释放 GIL）；
+   结果按 (路径, 大小, mtime, 特征版本) 缓存在 model/eval_feature_cache.npz，未改动的图片不再重复计算；
+3. 分类: 所有特征一次 model.predict 批量分类；
+4. 报告: 准确率、混淆矩阵、各类别精确率/召回率、单张特征耗时分布（仅统计未命中缓存的图片）与吞吐量。
+
+示例:
+    python evaluate.py --source dataset/valid
+    python evaluate.py --source output/gen_valid.txt --data-root dataset --workers 8 --out output/eval_valid.json
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from dataset_index import open_index
+from inference import PaintDefectDetector, FEATURE_SCHEMA_VERSION
+
+CACHE_PATH = "model/eval_feature_cache.npz"
+CLASS_NAMES = ('正常', '缺陷')
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    s = sorted(values)
+    return s[int(q * (len(s) - 1))]
+
+
+def _item(index, entry):
+    return {'path': index.abspath(entry), 'boxes': (entry.get('label') or {}).get('boxes', 0)}
+
+
+def read_list_file(list_path, data_root=None, refresh=False):
+    """列表文件中的路径（可能是其它机器上的绝对路径，如 F:/.../images/valid/0003.PNG）按数据集清单映射到本地文件"""
+    index = open_index(data_root or os.path.dirname(os.path.abspath(list_path)), refresh)
+    items, missing = [], []
+    with open(list_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = index.resolve(line)
+            if entry is None:
+                missing.append(line)
+                continue
+            items.append(_item(index, entry))
+    return items, missing
+
+
+def index_source(source, data_root=None, refresh=False):
+    """目录或列表文件 -> ([{path, boxes}], 无法定位的列表项)；图片与标注信息来自数据集清单（dataset_index.py）"""
+    if os.path.isdir(source):
+        index = open_index(source, refresh)
+        return [_item(index, e) for e in index.images(under=source)], []
+    return read_list_file(source, data_root, refresh)
+
+
+class FeatureCache:
+    """按 (绝对路径, 大小, mtime) 缓存特征；特征版本变化时整体失效"""
+
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        if os.path.exists(path):
+            data = np.load(path, allow_pickle=False)
+            if int(data['schema_version']) == FEATURE_SCHEMA_VERSION:
+                for key, size, mtime, feats in zip(data['paths'], data['sizes'], data['mtimes'], data['X']):
+                    self.entries[str(key)] = (int(size), int(mtime), feats)
+
+    @staticmethod
+    def _stat(path):
+        st = os.stat(path)
+        return os.path.abspath(path), st.st_size, st.st_mtime_ns
+
+    def get(self, path):
+        key, size, mtime = self._stat(path)
+        hit = self.entries.get(key)
+        if hit is not None and hit[0] == size and hit[1] == mtime:
+            return hit[2]
+        return None
+
+    def put(self, path, feats):
+        key, size, mtime = self._stat(path)
+        self.entries[key] = (size, mtime, np.asarray(feats, dtype=np.float32))
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        keys = list(self.entries)
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + ".tmp.npz"
+        np.savez_compressed(tmp_path,
+                            schema_version=np.int32(FEATURE_SCHEMA_VERSION),
+                            paths=np.asarray(keys, dtype=str),
+                            sizes=np.asarray([self.entries[k][0] for k in keys], dtype=np.int64),
+                            mtimes=np.asarray([self.entries[k][1] for k in keys], dtype=np.int64),
+                            X=np.asarray([self.entries[k][2] for k in keys], dtype=np.float32))
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+
+def featurize(detector, items, workers=4, cache=None):
+    """并行提特征，返回 (特征矩阵, 有效下标, 单张耗时ms列表, 缓存命中数)"""
+    var_count = detector.model.getVarCount()
+    features = np.zeros((len(items), var_count), dtype=np.float32)
+    ok = np.zeros(len(items), dtype=bool)
+    latencies = [None] * len(items)
+    hits = 0
+    todo = []
+    for i, item in enumerate(items):
+        cached = cache.get(item['path']) if cache is not None else None
+        if cached is not None and len(cached) == var_count:
+            features[i] = cached
+            ok[i] = True
+            hits += 1
+        else:
+            todo.append(i)
+
+    def work(i):
+        t0 = time.perf_counter()
+        gray, mask = detector.enhanced_preprocess(items[i]['path'])
+        if gray is None:
+            return i, None, None
+        feats = detector.extract_robust_features(gray, mask)
+        return i, feats, (time.perf_counter() - t0) * 1000
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for i, feats, ms in pool.map(work, todo):
+            if feats is None:
+                continue
+            features[i] = feats
+            ok[i] = True
+            latencies[i] = ms
+            if cache is not None:
+                cache.put(items[i]['path'], feats)
+    return features, np.flatnonzero(ok), [ms for ms in latencies if ms is not None], hits
+
+
+def evaluate(detector, items, workers=4, cache=None):
+    t0 = time.perf_counter()
+    features, valid, latencies, hits = featurize(detector, items, workers, cache)
+    t1 = time.perf_counter()
+    model, version = detector.active()
+    _, result = model.predict(features[valid]) if len(valid) else (None, np.empty((0, 1)))
+    preds = result.ravel().astype(int)
+    t2 = time.perf_counter()
+
+    truth = np.array([1 if items[i]['boxes'] > 0 else 0 for i in valid], dtype=int)
+    confusion = [[int(np.sum((truth == t) & (preds == p))) for p in (0, 1)] for t in (0, 1)]
+    per_class = {}
+    for c, name in enumerate(CLASS_NAMES):
+        tp = confusion[c][c]
+        support = sum(confusion[c])
+        predicted = confusion[0][c] + confusion[1][c]
+        per_class[name] = {
+            'support': support,
+            'precision': tp / predicted if predicted else None,
+            'recall': tp / support if support else None,
+        }
+    wall = t2 - t0
+    valid_set = set(valid.tolist())
+    results = [{'file': os.path.basename(items[i]['path']), 'path': items[i]['path'],
+                'true_label': int(t), 'pred_label': int(p), 'correct': bool(t == p)}
+               for i, t, p in zip(valid, truth, preds)]
+    return {
+        'model_version': version,
+        'images': len(items),
+        'evaluated': int(len(valid)),
+        'unreadable': [items[i]['path'] for i in range(len(items)) if i not in valid_set],
+        'accuracy': float(np.mean(truth == preds)) if len(valid) else None,
+        'confusion_matrix': {'labels': list(CLASS_NAMES), 'rows_true_cols_pred': confusion},
+        'per_class': per_class,
+        'latency_ms': {
+            'measured': len(latencies),
+            'avg': float(np.mean(latencies)) if latencies else None,
+            'p50': _percentile(latencies, 0.5),
+            'p90': _percentile(latencies, 0.9),
+            'p99': _percentile(latencies, 0.99),
+            'max': max(latencies) if latencies else None,
+        },
+        'timing_s': {'featurize': t1 - t0, 'classify': t2 - t1, 'total': wall},
+        'throughput_ips': len(valid) / wall if wall > 0 else None,
+        'cache_hits': hits,
+        'workers': workers,
+        'results': results,
+    }
+
+
+def load_detector(model_path=None, version=None):
+    """未指定模型文件时按注册表加载激活版本（或 version），与服务端一致"""
+    if model_path:
+        return PaintDefectDetector(model_path)
+    from model_registry import ModelRegistry
+    path, version = ModelRegistry("model").verified_path(version)
+    return PaintDefectDetector(path, model_version=version)
+
+
+def print_report(report, show_errors=10):
+    print(f"\n=== 测试结果汇总 (模型版本 {report['model_version']}) ===")
+    print(f"总测试图片: {report['evaluated']}/{report['images']}")
+    if report['accuracy'] is None:
+        return
+    print(f"总体准确率: {report['accuracy']:.3f}")
+    cm = report['confusion_matrix']['rows_true_cols_pred']
+    print("混淆矩阵 (行=真实, 列=预测):")
+    print(f"          {'正常':>6}{'缺陷':>6}")
+    for name, row in zip(CLASS_NAMES, cm):
+        print(f"  {name:<6}{row[0]:>8}{row[1]:>8}")
+    for name, m in report['per_class'].items():
+        p = '-' if m['precision'] is None else f"{m['precision']:.3f}"
+        r = '-' if m['recall'] is None else f"{m['recall']:.3f}"
+        print(f"  {name}: 精确率 {p}, 召回率 {r}, 样本 {m['support']}")
+    lat = report['latency_ms']
+    if lat['measured']:
+        print(f"单张特征耗时(ms): avg {lat['avg']:.1f}, p50 {lat['p50']:.1f}, p90 {lat['p90']:.1f}, "
+              f"p99 {lat['p99']:.1f} ({lat['measured']} 张)")
+    t = report['timing_s']
+    print(f"吞吐: {report['throughput_ips']:.1f} 张/秒 (特征 {t['featurize']:.2f}s, 批量分类 {t['classify'] * 1000:.1f}ms, "
+          f"{report['workers']} 线程, 缓存命中 {report['cache_hits']})")
+    wrong = [r for r in report['results'] if not r['correct']]
+    if wrong and show_errors:
+        print(f"\n=== 错误预测案例 (前{show_errors}个) ===")
+        for r in wrong[:show_errors]:
+            print(f"❌ {r['file']}: 真实={CLASS_NAMES[r['true_label']]}, 预测={CLASS_NAMES[r['pred_label']]}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--source', default='dataset/train', help='图片目录或列表文件（每行一个图片路径）')
+    ap.add_argument('--data-root', default=None, help='列表文件中的路径按该数据集目录的清单映射到本地')
+    ap.add_argument('--refresh-index', action='store_true', help='评估前增量更新数据集清单')
+    ap.add_argument('--model', default=None, help='模型文件；默认使用注册表中的激活版本')
+    ap.add_argument('--version', default=None, help='评估注册表中的指定版本')
+    ap.add_argument('--workers', type=int, default=os.cpu_count() or 4)
+    ap.add_argument('--cache', default=CACHE_PATH, help='特征缓存文件')
+    ap.add_argument('--no-cache', action='store_true', help='不读写特征缓存（测量冷启动耗时）')
+    ap.add_argument('--out', default=None, help='写出 JSON 报告')
+    args = ap.parse_args()
+
+    items, missing = index_source(args.source, args.data_root, args.refresh_index)
+    if missing:
+        print(f"⚠️ 列表中 {len(missing)} 个路径无法定位（例如 {missing[0]}），可用 --data-root 指定本地目录")
+    if not items:
+        print('未找到图片')
+        return
+
+    detector = load_detector(args.model, args.version)
+    cache = None if args.no_cache else FeatureCache(args.cache)
+    report = evaluate(detector, items, args.workers, cache)
+    if cache is not None:
+        cache.save()
+    report['source'] = args.source
+    report['missing'] = missing
+    print_report(report)
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print('Saved:', args.out)
+
+
+if __name__ == '__main__':
+    main()
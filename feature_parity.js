@@ -0,0 +1,59 @@
+// 浏览器端特征流水线的无头运行器（Node + 本地 OpenCV.js），由 feature_parity.py 调用
+// 用法: node feature_parity.js <opencv.js 路径> <manifest.json>
+// manifest: [{"name": ..., "width": W, "height": H, "rgba": "原始 RGBA 字节文件"}]
+// 输出（stdout）: {"schema_version": N, "results": [{"name": ..., "features": [...], "feature_ms": ...}]}
+const fs = require('fs');
+const path = require('path');
+const { extractFeatures, SCHEMA_VERSION } = require('./static/js/features.js');
+
+function loadOpenCv(file) {
+    return new Promise((resolve, reject) => {
+        let cv;
+        try {
+            cv = require(path.resolve(file));
+        } catch (e) {
+            reject(e);
+            return;
+        }
+        // 与 feature_worker.js 相同：兼容 Promise/工厂 与 onRuntimeInitialized 两种导出
+        if (typeof cv === 'function' && !cv.Mat) cv = cv();
+        if (cv instanceof Promise || (cv && typeof cv.then === 'function' && !cv.Mat)) {
+            cv.then(m => { if (m && m.then) delete m.then; resolve(m); }, reject);
+        } else if (cv.Mat) {
+            resolve(cv);
+        } else {
+            cv.onRuntimeInitialized = () => resolve(cv);
+        }
+    });
+}
+
+async function main() {
+    const [opencvPath, manifestPath] = process.argv.slice(2);
+    if (!opencvPath || !manifestPath) {
+        console.error('用法: node feature_parity.js <opencv.js> <manifest.json>');
+        process.exit(2);
+    }
+    const cv = await loadOpenCv(opencvPath);
+    const manifest = JSON.parse(fs.readFileSync(manifestPath, 'utf8'));
+    const results = [];
+    for (const item of manifest) {
+        const data = new Uint8Array(fs.readFileSync(item.rgba));
+        const mat = cv.matFromArray(item.height, item.width, cv.CV_8UC4, data);
+        try {
+            const t0 = process.hrtime.bigint();
+            const features = extractFeatures(cv, mat);
+            const featureMs = Number(process.hrtime.bigint() - t0) / 1e6;
+            results.push({ name: item.name, features, feature_ms: featureMs });
+        } catch (e) {
+            results.push({ name: item.name, error: e.message || String(e) });
+        } finally {
+            mat.delete();
+        }
+    }
+    process.stdout.write(JSON.stringify({ schema_version: SCHEMA_VERSION, results }));
+}
+
+main().catch(e => {
+    console.error(e.stack || String(e));
+    process.exit(1);
+});
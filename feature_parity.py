@@ -0,0 +1,165 @@
+"""浏览器端 / 服务端特征一致性检查
+同一批图片（默认上传归档中服务端实际收到的图片，见 upload_archive.py）分别走两条流水线：
+- 服务端: PaintDefectDetector.preprocess_image + extract_robust_features（Python OpenCV）
+- 浏览器端: static/js/features.js（OpenCV.js，通过 feature_parity.js 在 Node 中无头运行）
+浏览器拿到的是解码后的 RGBA 像素，这里用 cv2 解码后转为 RGBA 原始字节交给 Node，
+两边输入像素完全相同，差异只来自特征实现本身。
+输出每一维特征的绝对/相对误差，以及两组特征经同一 SVM 分类后的标签一致率。
+
+需要先下载 OpenCV.js（python fetch_opencv_js.py）并安装 Node.js。
+
+示例:
+    python feature_parity.py --out output/feature_parity.json
+    python feature_parity.py --images static/uploads    # 仓库自带的样本图
+    python feature_parity.py --max-rel 0.01 --min-agreement 1.0   # 超出阈值时以非零状态退出
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+
+import cv2
+import numpy as np
+
+from dataset_index import list_images
+from upload_archive import ARCHIVE_BLOBS
+
+FEATURE_NAMES = [f'hu{i}' for i in range(1, 8)] + [
+    'contour_total_area', 'contour_max_area', 'contour_area_ratio', 'contour_count', 'contour_perimeter',
+    'defect_ratio', 'mask_mean', 'mask_std', 'grad_mean',
+]
+
+
+def server_features(detector, img):
+    gray, mask = detector.preprocess_image(img)
+    return detector.extract_robust_features(gray, mask)
+
+
+def run_node(node, opencv_js, image_dir, names, workdir):
+    """把图片写成 RGBA 原始字节，调用 feature_parity.js，返回 (schema_version, {name: 结果})"""
+    manifest = []
+    for name in names:
+        img = cv2.imread(os.path.join(image_dir, name), cv2.IMREAD_COLOR)
+        if img is None:
+            continue
+        rgba = cv2.cvtColor(img, cv2.COLOR_BGR2RGBA)
+        raw_path = os.path.join(workdir, f'{len(manifest)}.rgba')  # name 可能含子目录（归档按哈希前缀分目录）
+        rgba.tofile(raw_path)
+        manifest.append({'name': name, 'width': rgba.shape[1], 'height': rgba.shape[0], 'rgba': raw_path})
+    manifest_path = os.path.join(workdir, 'manifest.json')
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+
+    runner = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'feature_parity.js')
+    proc = subprocess.run([node, runner, opencv_js, manifest_path], capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f'Node 运行失败 (exit {proc.returncode}): {proc.stderr.strip()}')
+    out = json.loads(proc.stdout)
+    return out['schema_version'], {r['name']: r for r in out['results']}
+
+
+def compare(server, client, eps=1e-9):
+    """server/client: (N, D)。返回每维误差统计"""
+    abs_diff = np.abs(server - client)
+    rel_diff = abs_diff / np.maximum(np.abs(server), eps)
+    per_feature = []
+    for j in range(server.shape[1]):
+        per_feature.append({
+            'feature': FEATURE_NAMES[j] if j < len(FEATURE_NAMES) else f'f{j}',
+            'mean_abs': float(abs_diff[:, j].mean()),
+            'max_abs': float(abs_diff[:, j].max()),
+            'mean_rel': float(rel_diff[:, j].mean()),
+            'max_rel': float(rel_diff[:, j].max()),
+        })
+    return per_feature
+
+
+def main():
+    from inference import PaintDefectDetector, FEATURE_SCHEMA_VERSION
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--images', default=ARCHIVE_BLOBS, help='图片目录（默认上传归档）')
+    ap.add_argument('--limit', type=int, default=None)
+    ap.add_argument('--model', default='model/svm_defect.xml')
+    ap.add_argument('--opencv-js', default='static/vendor/opencv.js')
+    ap.add_argument('--node', default='node')
+    ap.add_argument('--out', default='output/feature_parity.json')
+    ap.add_argument('--max-rel', type=float, default=None, help='任一特征的平均相对误差超过该值则失败')
+    ap.add_argument('--min-agreement', type=float, default=None, help='标签一致率低于该值则失败')
+    args = ap.parse_args()
+
+    if not os.path.exists(args.opencv_js):
+        raise SystemExit(f'未找到 {args.opencv_js}，请先运行 python fetch_opencv_js.py')
+    if shutil.which(args.node) is None:
+        raise SystemExit(f'未找到 Node.js 可执行文件: {args.node}')
+
+    detector = PaintDefectDetector(args.model)
+    names = ([os.path.relpath(p, args.images) for p in list_images(args.images, args.limit)]
+             if os.path.isdir(args.images) else [])
+    if not names:
+        raise SystemExit(f'{args.images} 下没有图片')
+
+    with tempfile.TemporaryDirectory(prefix='parity_') as workdir:
+        client_version, client_results = run_node(args.node, args.opencv_js, args.images, names, workdir)
+
+    if client_version != FEATURE_SCHEMA_VERSION:
+        print(f'⚠️ 特征版本不一致: features.js={client_version}, inference.py={FEATURE_SCHEMA_VERSION}')
+
+    rows, server_rows, client_rows, errors = [], [], [], []
+    for name in names:
+        img = cv2.imread(os.path.join(args.images, name), cv2.IMREAD_COLOR)
+        client = client_results.get(name)
+        if img is None or client is None or 'error' in client:
+            errors.append({'name': name, 'error': (client or {}).get('error', '无法读取图片')})
+            continue
+        s = server_features(detector, img)
+        c = np.asarray(client['features'], dtype=np.float64)
+        s_label = detector.classify_features(s)['prediction']
+        c_label = detector.classify_features(c)['prediction']
+        server_rows.append(s)
+        client_rows.append(c)
+        rows.append({'name': name, 'server_label': s_label, 'client_label': c_label,
+                     'agree': s_label == c_label, 'max_abs': float(np.abs(s - c).max()),
+                     'client_feature_ms': client.get('feature_ms')})
+
+    if not rows:
+        raise SystemExit(f'没有可比较的图片，错误: {errors[:3]}')
+
+    per_feature = compare(np.array(server_rows), np.array(client_rows))
+    agreement = sum(r['agree'] for r in rows) / len(rows)
+    report = {
+        'images': len(rows),
+        'schema_version': {'server': FEATURE_SCHEMA_VERSION, 'client': client_version},
+        'label_agreement': agreement,
+        'per_feature': per_feature,
+        'per_image': rows,
+        'errors': errors,
+    }
+    os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f'{"特征":<20}{"平均绝对":>12}{"最大绝对":>12}{"平均相对":>12}{"最大相对":>12}')
+    for p in per_feature:
+        print(f'{p["feature"]:<20}{p["mean_abs"]:>12.3e}{p["max_abs"]:>12.3e}{p["mean_rel"]:>12.3e}{p["max_rel"]:>12.3e}')
+    print(f'标签一致率: {agreement * 100:.1f}% ({sum(r["agree"] for r in rows)}/{len(rows)}), 失败 {len(errors)} 张')
+    print('Saved:', args.out)
+
+    failed = False
+    if args.max_rel is not None:
+        worst = max(per_feature, key=lambda p: p['mean_rel'])
+        if worst['mean_rel'] > args.max_rel:
+            print(f'❌ {worst["feature"]} 平均相对误差 {worst["mean_rel"]:.3e} 超过阈值 {args.max_rel}')
+            failed = True
+    if args.min_agreement is not None and agreement < args.min_agreement:
+        print(f'❌ 标签一致率 {agreement:.3f} 低于阈值 {args.min_agreement}')
+        failed = True
+    if client_version != FEATURE_SCHEMA_VERSION or failed:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
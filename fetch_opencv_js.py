@@ -0,0 +1,113 @@
+"""下载 OpenCV.js 到 static/vendor/，由本服务直接提供并被 Service Worker 预缓存，
+避免每次冷启动都从外部 CDN 下载数 MB 脚本。
+
+下载内容必须与 opencv_js.sha256.json 中为该 URL 固定的 sha256 一致，否则不替换本地文件并以非零状态退出。
+还没有固定值时，在可信网络下用 --pin 下载一次，把记录下的 opencv_js.sha256.json 提交到仓库。
+
+示例:
+    python fetch_opencv_js.py                      # 下载官方预编译版本（校验固定的 sha256）
+    python fetch_opencv_js.py --pin                # 首次下载: 记录 sha256
+    python fetch_opencv_js.py --url <裁剪构建地址> --sha256 <期望值>
+    python fetch_opencv_js.py --print-whitelist    # 输出裁剪构建用的函数白名单
+
+裁剪构建（只包含特征流水线用到的算子，体积可显著缩小）需要 emscripten 环境:
+    python fetch_opencv_js.py --print-whitelist > opencv_js.config.py
+    python opencv/platforms/js/build_js.py build_js --build_wasm --config opencv_js.config.py
+    cp build_js/bin/opencv.js static/vendor/opencv.js
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import requests
+
+DEFAULT_URL = 'https://docs.opencv.org/4.10.0/opencv.js'
+DEFAULT_OUT = 'static/vendor/opencv.js'
+PIN_FILE = 'opencv_js.sha256.json'  # {url: sha256}
+
+# static/js/features.js 使用到的 OpenCV 函数
+WHITELIST = {
+    'core': ['bitwise_or', 'countNonZero', 'meanStdDev'],
+    'imgproc': ['resize', 'cvtColor', 'adaptiveThreshold', 'Canny', 'getStructuringElement',
+                'morphologyEx', 'moments', 'HuMoments', 'findContours', 'contourArea',
+                'arcLength', 'Sobel'],
+}
+
+
+def whitelist_config():
+    lines = ['# OpenCV.js 裁剪构建白名单，由 fetch_opencv_js.py 生成']
+    for module, funcs in WHITELIST.items():
+        lines.append(f"{module} = {{'': {funcs!r}}}")
+    lines.append('white_list = makeWhiteList([' + ', '.join(WHITELIST) + '])')
+    return '\n'.join(lines)
+
+
+def load_pins(path=PIN_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_pin(url, digest, path=PIN_FILE):
+    pins = load_pins(path)
+    pins[url] = digest
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(pins, f, indent=2, sort_keys=True)
+        f.write('\n')
+    os.replace(tmp_path, path)
+
+
+def download(url, out, expected=None):
+    """下载到临时文件并计算 sha256；给出 expected 且不一致时删除临时文件并抛出 ValueError，不替换 out"""
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    resp = requests.get(url, timeout=120, stream=True)
+    resp.raise_for_status()
+    h = hashlib.sha256()
+    tmp_path = out + '.tmp'
+    size = 0
+    with open(tmp_path, 'wb') as f:
+        for chunk in resp.iter_content(1 << 16):
+            f.write(chunk)
+            h.update(chunk)
+            size += len(chunk)
+    digest = h.hexdigest()
+    if expected is not None and digest != expected.lower():
+        os.remove(tmp_path)
+        raise ValueError(f'sha256 不匹配: 下载内容为 {digest}，期望 {expected}')
+    os.replace(tmp_path, out)
+    return size, digest
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--url', default=DEFAULT_URL)
+    ap.add_argument('--out', default=DEFAULT_OUT)
+    ap.add_argument('--sha256', default=None, help='期望的 sha256（覆盖固定值）')
+    ap.add_argument('--pin', action='store_true', help=f'没有固定值时下载并把 sha256 记录到 {PIN_FILE}')
+    ap.add_argument('--print-whitelist', action='store_true')
+    args = ap.parse_args()
+
+    if args.print_whitelist:
+        print(whitelist_config())
+        return 0
+    expected = args.sha256 or load_pins().get(args.url)
+    if expected is None and not args.pin:
+        print(f'❌ {args.url} 没有固定的 sha256: 用 --sha256 指定，或在可信网络下用 --pin 下载并提交 {PIN_FILE}')
+        return 1
+    try:
+        size, digest = download(args.url, args.out, expected)
+    except ValueError as e:
+        print(f'❌ {e}')
+        return 1
+    print(f'已下载 {args.url} -> {args.out} ({size / 1024 / 1024:.1f} MB, sha256={digest})')
+    if expected is None:
+        save_pin(args.url, digest)
+        print(f'已记录 sha256 到 {PIN_FILE}，请确认来源后提交')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -2,27 +2,109 @@
 import cv2
 import numpy as np
 import os
-import glob
+import struct
 import time
+import zlib
+from model_snapshot import load_model
+from roi import decode_reduced, find_roi
+from cascade import stage1_features
+from sliding_window import SlidingWindowFeatures, STAT_FEATURE_SLICE
+
+def read_image(source):
+    """解码 BGR 图像；source 为文件路径，或上传后留在内存中的文件内容（bytes，不落盘）"""
+    if isinstance(source, (bytes, bytearray)):
+        return cv2.imdecode(np.frombuffer(source, np.uint8), cv2.IMREAD_COLOR)
+    return cv2.imread(source)
+
+
+# gray_upload 模式的原始格式: 'PDG1' + 宽、高（uint16 小端）+ 逐行 uint8 灰度像素，整体可再 gzip
+GRAY_MAGIC = b'PDG1'
+GRAY_MAX_BYTES = 8 + 4096 * 4096
+
+
+def decode_gray_upload(source):
+    """解码客户端已缩放好的单通道上传（gray_upload 模式），返回二维 uint8 数组，失败时返回 None。
+    支持上面的原始格式（可 gzip），也接受灰度 PNG / WebP 等常规图片（按单通道解码）"""
+    if not isinstance(source, (bytes, bytearray)):
+        with open(source, 'rb') as f:
+            source = f.read()
+    data = bytes(source)
+    if data[:2] == b'\x1f\x8b':
+        try:
+            # 限制解压后的大小，防止压缩炸弹
+            data = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(data, GRAY_MAX_BYTES)
+        except zlib.error:
+            return None
+    if data[:4] == GRAY_MAGIC:
+        if len(data) < 8:
+            return None
+        width, height = struct.unpack_from('<HH', data, 4)
+        if width == 0 or height == 0 or len(data) != 8 + width * height:
+            return None
+        return np.frombuffer(data, np.uint8, offset=8).reshape(height, width)
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
+
+
+def source_name(source, image_name=None):
+    if image_name is not None or isinstance(source, (bytes, bytearray)):
+        return image_name
+    return os.path.basename(source)
+
+# 特征向量格式版本：特征定义、顺序或预处理变化时递增，客户端 static/js/features.js 需同步修改
+FEATURE_SCHEMA_VERSION = 1
 
 class PaintDefectDetector:
-    def __init__(self, model_path="model/svm_defect.xml", img_size=(512, 512)):
+    def __init__(self, model_path="model/svm_defect.xml", img_size=(512, 512), model_version=None):
         if not os.path.exists(model_path):
             raise FileNotFoundError(f"模型文件不存在: {model_path}")
         
-        self.model = cv2.ml.SVM_load(model_path)
+        # (模型, 版本) 作为一个整体引用保存，保证切换时二者一致
+        self._active = (load_model(model_path), model_version)
         self.img_size = img_size
+        # 级联第一级阈值（cascade.CascadeGate），由 ModelWatcher 按当前模型版本（或其增量更新的基础版本）设置
+        self.cascade = None
         print(f"✅ 模型加载成功，输入尺寸: {img_size}")
+
+    @property
+    def model(self):
+        return self._active[0]
+
+    @property
+    def model_version(self):
+        return self._active[1]
+
+    def active(self):
+        """返回 (model, version)，二者来自同一次赋值，不会在热切换中错配"""
+        return self._active
+
+    def swap_model(self, model, version=None):
+        """热切换模型：单次属性赋值是原子的，进行中的请求继续使用旧模型引用"""
+        self._active = (model, version)
+
+    def set_cascade(self, gate):
+        """设置级联阈值；None 表示关闭级联"""
+        self.cascade = gate
         
     def enhanced_preprocess(self, img_path):
         """增强的预处理"""
         img = cv2.imread(img_path)
         if img is None:
             return None, None
-        
-        img = cv2.resize(img, self.img_size)
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        
+        return self.preprocess_image(img)
+
+    def preprocess_image(self, img):
+        """对已解码的 BGR 图像做预处理"""
+        gray = self.gray_image(img)
+        return gray, self.defect_mask(gray)
+
+    def gray_image(self, img):
+        """缩放到模型输入尺寸并转灰度；单通道输入（gray_upload）已是模型输入尺寸时原样使用"""
+        if img.ndim == 2:
+            return img if img.shape[::-1] == tuple(self.img_size) else cv2.resize(img, self.img_size)
+        return cv2.cvtColor(cv2.resize(img, self.img_size), cv2.COLOR_BGR2GRAY)
+
+    def defect_mask(self, gray):
+        """由灰度图生成缺陷掩码（与输入同尺寸，不做缩放）"""
         # 多种阈值方法组合
         binary1 = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C,
                                        cv2.THRESH_BINARY_INV, 15, 8)
@@ -33,10 +115,29 @@ class PaintDefectDetector:
         kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
         cleaned = cv2.morphologyEx(combined, cv2.MORPH_OPEN, kernel, iterations=1)
         
-        return gray, cleaned
+        return cleaned
     
-    def extract_robust_features(self, gray, mask):
-        """提取更鲁棒的特征"""
+    def extract_robust_features(self, gray, mask, gradient_magnitude=None):
+        """提取更鲁棒的特征；gradient_magnitude 可传入预先算好的梯度幅值（切片推理时共享整图结果）"""
+        features = self.shape_features(mask)
+        
+        # 3. 纹理特征
+        defect_ratio = np.count_nonzero(mask) / (mask.shape[0] * mask.shape[1])
+        features.append(defect_ratio)
+        
+        # 4. 统计特征
+        features.append(np.mean(mask) / 255.0)
+        features.append(np.std(mask) / 255.0)
+        
+        # 5. 梯度特征
+        if gradient_magnitude is None:
+            gradient_magnitude = self.gradient_magnitude(gray)
+        features.append(np.mean(gradient_magnitude) * 1e-3)
+        
+        return np.array(features)
+
+    def shape_features(self, mask):
+        """形状特征: Hu 矩 7 维 + 轮廓统计 5 维（后 4 维统计特征见 sliding_window.py 的积分图实现）"""
         features = []
         
         # 1. 基础形状特征
@@ -82,44 +183,229 @@ class PaintDefectDetector:
         else:
             features.extend([0, 0, 0, 0, 0])
         
-        # 3. 纹理特征
-        defect_ratio = np.count_nonzero(mask) / (mask.shape[0] * mask.shape[1])
-        features.append(defect_ratio)
-        
-        # 4. 统计特征
-        features.append(np.mean(mask) / 255.0)
-        features.append(np.std(mask) / 255.0)
-        
-        # 5. 梯度特征
+        return features
+
+    def gradient_magnitude(self, gray):
         sobelx = cv2.Sobel(gray, cv2.CV_64F, 1, 0, ksize=3)
         sobely = cv2.Sobel(gray, cv2.CV_64F, 0, 1, ksize=3)
-        gradient_magnitude = np.sqrt(sobelx**2 + sobely**2)
-        features.append(np.mean(gradient_magnitude) * 1e-3)
-        
-        return np.array(features)
+        return np.sqrt(sobelx**2 + sobely**2)
     
-    def predict_single(self, img_path, with_timing=False):
-        """预测单张图片，可选返回时间分解"""
+    def predict_single(self, img_path, with_timing=False, roi=False, cascade=True, image_name=None, gray=False):
+        """预测单张图片（路径或内存中的文件内容），可选返回时间分解；roi=True 时缩小解码并裁剪到漆面区域（见 roi.py）；
+        gray=True 时内容为客户端缩放好的灰度图（decode_gray_upload），跳过彩色解码、缩放与转灰度"""
         t0 = time.perf_counter()
-        gray, mask = self.enhanced_preprocess(img_path)
-        if gray is None:
+        scale = 1
+        if gray:
+            img, roi = decode_gray_upload(img_path), False
+        elif roi:
+            img, scale = decode_reduced(img_path, max(self.img_size))
+        else:
+            img = read_image(img_path)
+        if img is None:
             return {'error': '无法读取图片'}
+        decode_ms = (time.perf_counter() - t0) * 1000
+        resp = self.predict_image(img, with_timing, image_name=source_name(img_path, image_name), started=t0,
+                                  roi=roi, scale=scale, cascade=cascade)
+        if with_timing:
+            resp['timing']['decode_ms'] = decode_ms
+        return resp
+
+    def predict_image(self, img, with_timing=False, image_name=None, started=None, roi=False, scale=1,
+                      cascade=True):
+        """预测已解码的 BGR 图像；started 为计时起点（默认为调用时刻，预处理耗时含解码时传入）。
+        roi=True 时先裁剪到漆面区域，响应中 roi 为原图坐标的 [x, y, w, h]（未裁剪时为 null）；
+        scale 为缩小解码倍数，用于把尺寸与裁剪框换算回原图坐标。
+        已设置级联阈值（ModelWatcher 按当前版本或其增量更新的基础版本选出）且 cascade=True 时，第一级放行的图片直接判为正常（见 cascade.py），
+        响应中 cascade_stage 为 1 或 2"""
+        t0 = time.perf_counter() if started is None else started
+        image_size = [int(img.shape[1]) * scale, int(img.shape[0]) * scale]
+        box, roi_ms = None, 0.0
+        # 不超过模型输入 2 倍的图片（如数据集中 512x512 的近景图）本身已经取景到漆面，不裁剪
+        if roi and max(image_size) > 2 * max(self.img_size):
+            tr = time.perf_counter()
+            box = find_roi(img)
+            roi_ms = (time.perf_counter() - tr) * 1000
+            if box is not None:
+                x, y, w, h = box
+                img = img[y:y + h, x:x + w]
+        model, version = self._active
+        gate = self.cascade if cascade else None
+        gray = self.gray_image(img)
+        stage, cascade_ms = None, 0.0
+        if gate is not None:
+            tc = time.perf_counter()
+            stage = 1 if gate.accepts(stage1_features(self, gray)) else 2
+            cascade_ms = (time.perf_counter() - tc) * 1000
+
+        if stage == 1:
+            prediction = 0
+            t1 = t2 = t3 = time.perf_counter()
+        else:
+            mask = self.defect_mask(gray)
+            t1 = time.perf_counter()
+            features = self.extract_robust_features(gray, mask)
+            t2 = time.perf_counter()
+            features = features.reshape(1, -1).astype(np.float32)
+            _, result = model.predict(features)
+            prediction = int(result[0, 0])
+            t3 = time.perf_counter()
+
+        resp = {
+            'prediction': prediction,
+            'confidence': '缺陷' if prediction == 1 else '正常',
+            'image_name': image_name,
+            'image_size': image_size,
+            'model_version': version
+        }
+        if roi:
+            resp['roi'] = [v * scale for v in box] if box is not None else None
+        if stage is not None:
+            resp['cascade_stage'] = stage
+        if with_timing:
+            resp['timing'] = {
+                'preprocess_ms': (t1 - t0) * 1000,
+                'feature_ms': (t2 - t1) * 1000,
+                'predict_ms': (t3 - t2) * 1000,
+                'total_ms': (t3 - t0) * 1000
+            }
+            if roi:
+                resp['timing']['roi_ms'] = roi_ms
+            if stage is not None:
+                resp['timing']['cascade_ms'] = cascade_ms
+        return resp
+
+    def tile_grid(self, width, height, overlap):
+        """计算覆盖整图的切片左上角坐标，最后一行/列与图像边缘对齐"""
+        tile_w, tile_h = self.img_size
+        def starts(length, tile):
+            stride = max(1, tile - overlap)
+            pos = list(range(0, max(length - tile, 0) + 1, stride))
+            if pos[-1] + tile < length:
+                pos.append(length - tile)
+            return pos
+        return [(x, y) for y in starts(height, tile_h) for x in starts(width, tile_w)]
+
+    def overlap_error(self, overlap):
+        """切片重叠需满足 0 <= overlap < 切片边长 / 2: 负值会在切片间留下空隙，过大则步长趋近 1 个像素"""
+        limit = min(self.img_size) / 2
+        if not 0 <= overlap < limit:
+            return f'overlap 需满足 0 <= overlap < {limit:g}，实际为 {overlap}'
+        return None
+
+    def _prepare_tiles(self, img_path, overlap, max_tiles):
+        """predict_tiled 的整图阶段: 解码、缩放/补边、整图掩码与梯度、切片网格和统计特征；无法读取时返回 None"""
+        t0 = time.perf_counter()
+        img = read_image(img_path)
+        if img is None:
+            return None
+        td = time.perf_counter()
+        orig_h, orig_w = img.shape[:2]
+        tile_w, tile_h = self.img_size
+
+        # 宽高按同一比例缩放（不拉伸）；小于单个切片的图像等比放大到恰好容纳一个切片
+        scale = max(1.0, min(tile_w / orig_w, tile_h / orig_h) if orig_w < tile_w and orig_h < tile_h
+                    else 1.0)
+
+        def scaled(s):
+            return max(1, round(orig_w * s)), max(1, round(orig_h * s))
+
+        def grid(s):
+            w, h = scaled(s)
+            return self.tile_grid(max(w, tile_w), max(h, tile_h), overlap)
+        positions = grid(scale)
+        while len(positions) > max_tiles:
+            scale *= 0.8
+            positions = grid(scale)
+        if scale != 1.0:
+            img = cv2.resize(img, scaled(scale), interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+        # 短边不足一个切片时（极端长宽比）按反射方式补边，而不是拉伸
+        pad_h, pad_w = max(0, tile_h - img.shape[0]), max(0, tile_w - img.shape[1])
+        if pad_h or pad_w:
+            img = cv2.copyMakeBorder(img, 0, pad_h, 0, pad_w, cv2.BORDER_REFLECT)
+
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        mask = self.defect_mask(gray)
+        grad = self.gradient_magnitude(gray)
         t1 = time.perf_counter()
 
-        features = self.extract_robust_features(gray, mask)
+        features = np.empty((len(positions), self.model.getVarCount()), dtype=np.float32)
+        swf = SlidingWindowFeatures(mask, grad)
+        features[:, STAT_FEATURE_SLICE] = swf.features([p[0] for p in positions],
+                                                       [p[1] for p in positions], tile_w, tile_h)
+        return mask, positions, features, scale, (orig_w, orig_h), (t0, td, t1)
+
+    def predict_tiled(self, img_path, overlap=64, max_tiles=64, with_timing=False, image_name=None,
+                      executor=None, trace=None):
+        """高分辨率切片推理: 按 img_size 大小、带重叠地切片，批量提特征与分类，返回缺陷切片位置
+
+        灰度图、缺陷掩码和梯度幅值都只在整图上计算一次，各切片是这些缓冲区的视图；
+        统计特征由整图积分图 O(1) 查表得到，只有形状特征需要逐切片计算。
+        切片数超过 max_tiles 时先等比缩小整图，使单张大图的耗时有上界。
+        executor 为 InferenceExecutor 时（服务端在请求线程中调用），整图预处理作为一个任务、各切片的形状特征
+        按工作线程数分块作为多个任务提交到该线程池并行计算，总并行度仍由线程池上限控制；trace 记录预处理任务的排队等待。
+        未传入 executor，或调用方本身就在该线程池的工作线程中（等待同一线程池的任务可能死锁）时，切片在调用线程中顺序处理。
+        """
+        error = self.overlap_error(overlap)
+        if error:
+            return {'error': error}
+        if executor is not None and executor.in_worker():
+            executor = None
+        if executor is not None:
+            prepared = executor.run(self._prepare_tiles, img_path, overlap, max_tiles, trace=trace)
+        else:
+            prepared = self._prepare_tiles(img_path, overlap, max_tiles)
+        if prepared is None:
+            return {'error': '无法读取图片'}
+        mask, positions, features, scale, (orig_w, orig_h), (t0, td, t1) = prepared
+        tile_w, tile_h = self.img_size
+
+        def featurize(indices):
+            for i in indices:
+                x, y = positions[i]
+                features[i, :STAT_FEATURE_SLICE.start] = self.shape_features(mask[y:y + tile_h, x:x + tile_w])
+
+        if executor is not None and len(positions) > 1:
+            n = min(executor.workers, len(positions))
+            for future in [executor.submit(featurize, range(k, len(positions), n)) for k in range(n)]:
+                future.result()
+        else:
+            featurize(range(len(positions)))
         t2 = time.perf_counter()
-        features = features.reshape(1, -1).astype(np.float32)
-        _, result = self.model.predict(features)
-        prediction = int(result[0, 0])
+        sx = sy = 1 / scale
+
+        model, version = self._active
+        _, result = model.predict(features)
+        labels = result.ravel().astype(int)
         t3 = time.perf_counter()
 
+        xs = sorted(set(p[0] for p in positions))
+        ys = sorted(set(p[1] for p in positions))
+        defect_map = [[0] * len(xs) for _ in ys]
+        tiles = []
+        for (x, y), label in zip(positions, labels):
+            defect_map[ys.index(y)][xs.index(x)] = int(label)
+            if label == 1:
+                bx, by = int(round(x * sx)), int(round(y * sy))
+                tiles.append({
+                    'x': bx, 'y': by,
+                    'w': min(int(round(tile_w * sx)), orig_w - bx), 'h': min(int(round(tile_h * sy)), orig_h - by)
+                })
+        prediction = int(labels.max()) if len(labels) else 0
+
         resp = {
             'prediction': prediction,
             'confidence': '缺陷' if prediction == 1 else '正常',
-            'image_name': os.path.basename(img_path)
+            'image_name': source_name(img_path, image_name),
+            'model_version': version,
+            'image_size': [orig_w, orig_h],
+            'tiling': {'tile': [tile_w, tile_h], 'overlap': overlap, 'scale': scale,
+                       'count': len(positions), 'grid': [len(xs), len(ys)]},
+            'defect_map': defect_map,
+            'boxes': tiles
         }
         if with_timing:
             resp['timing'] = {
+                'decode_ms': (td - t0) * 1000,
                 'preprocess_ms': (t1 - t0) * 1000,
                 'feature_ms': (t2 - t1) * 1000,
                 'predict_ms': (t3 - t2) * 1000,
@@ -127,18 +413,29 @@ class PaintDefectDetector:
             }
         return resp
 
-    def classify_features(self, features_array):
-        """仅对由客户端/其他节点提取的特征进行分类。features_array: list/np.array"""
+    def classify_features(self, features_array, schema_version=None):
+        """仅对由客户端/其他节点提取的特征进行分类。features_array: list/np.array
+
+        schema_version 为客户端声明的特征格式版本，与 FEATURE_SCHEMA_VERSION 不一致时拒绝分类
+        """
+        if schema_version is not None and int(schema_version) != FEATURE_SCHEMA_VERSION:
+            raise ValueError(f"特征版本不匹配: 客户端 {schema_version}, 服务端 {FEATURE_SCHEMA_VERSION}")
         feats = np.array(features_array, dtype=np.float32).reshape(1, -1)
-        _, result = self.model.predict(feats)
+        model, version = self._active
+        if feats.shape[1] != model.getVarCount():
+            raise ValueError(f"特征维度不匹配: 期望 {model.getVarCount()}, 实际 {feats.shape[1]}")
+        _, result = model.predict(feats)
         prediction = int(result[0, 0])
         return {
             'prediction': prediction,
-            'confidence': '缺陷' if prediction == 1 else '正常'
+            'confidence': '缺陷' if prediction == 1 else '正常',
+            'model_version': version,
+            'schema_version': FEATURE_SCHEMA_VERSION
         }
     
     def predict_batch(self, image_dir):
         """批量预测"""
+        import glob
         results = []
         for img_path in glob.glob(os.path.join(image_dir, "*.png")) + \
                       glob.glob(os.path.join(image_dir, "*.jpg")):
@@ -0,0 +1,108 @@
+# inference_pool.py
+"""进程内并发推理
+Flask 以多线程处理请求，每个请求线程原本直接调用检测器；OpenCV 的 resize、自适应阈值、Sobel 等又各自
+用全部核并行（parallel_for_），并发请求一多就是“请求数 × 核数”个线程争抢 CPU。这里把推理收拢到一个固定大小的线程池:
+
+- 并行度由请求层面决定: 线程池大小默认等于 CPU 核数，OpenCV 内部线程数设为 1（cv2.setNumThreads），
+  单核或只有一个工作线程时保留 OpenCV 默认并行；
+- OpenCV 与 SVM 预测在 C++ 中执行并释放 GIL，多个工作线程可以真正并行；
+- 模型共享: 所有线程共用同一个 cv2.ml.SVM。SVM::predict 是 const 方法，只读模型参数、缓冲区在调用内分配，
+  stress_inference.py 在 1..N 线程下逐张比对特征与预测结果验证这一点（模型热切换本身是原子的引用替换）；
+- 请求线程把任务交给线程池并等待结果，排队时间计入 summary()，可以在 /metrics 中观察是否需要扩容。
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+
+def configure_opencv_threads(workers, opencv_threads=None):
+    """按请求层面的并行度设置 OpenCV 内部线程数；返回设置后的值"""
+    if opencv_threads is None:
+        opencv_threads = 1 if workers > 1 else -1  # -1: 恢复 OpenCV 默认
+    cv2.setNumThreads(opencv_threads)
+    return cv2.getNumThreads()
+
+
+class RollingWindow:
+    """线程安全的滚动窗口（替代在多个请求线程中直接 append / sum 的 deque）"""
+
+    def __init__(self, maxlen=50):
+        self._values = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def append(self, value):
+        with self._lock:
+            self._values.append(value)
+
+    def mean(self, default=0):
+        with self._lock:
+            return sum(self._values) / len(self._values) if self._values else default
+
+    def __len__(self):
+        with self._lock:
+            return len(self._values)
+
+
+class InferenceExecutor:
+    def __init__(self, workers=None, opencv_threads=None):
+        self.workers = workers or os.cpu_count() or 4
+        self.opencv_threads = configure_opencv_threads(self.workers, opencv_threads)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='inference')
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waits = deque(maxlen=200)
+        self._local = threading.local()
+        self.stats = {'submitted': 0, 'completed': 0, 'failed': 0}
+
+    def in_worker(self):
+        """当前线程是否为本线程池的工作线程（工作线程中再提交并等待同一线程池的任务可能死锁）"""
+        return getattr(self._local, 'worker', False)
+
+    def run(self, fn, *args, trace=None, **kwargs):
+        """在线程池中执行 fn 并等待结果（异常原样抛给调用方）；trace 为 tracing.Trace 时记录排队等待 span"""
+        return self.submit(fn, *args, trace=trace, **kwargs).result()
+
+    def submit(self, fn, *args, trace=None, **kwargs):
+        """提交到线程池但不等待，返回 Future（/predict_batch 边接收边提交）"""
+        submitted_at = time.perf_counter()
+
+        def task():
+            wait_ms = (time.perf_counter() - submitted_at) * 1000
+            if trace is not None:
+                trace.add('queue', wait_ms)
+            self._local.worker = True
+            with self._lock:
+                self._waits.append(wait_ms)
+                self._active += 1
+            try:
+                result = fn(*args, **kwargs)
+            except Exception:
+                with self._lock:
+                    self._active -= 1
+                    self.stats['failed'] += 1
+                raise
+            with self._lock:
+                self._active -= 1
+                self.stats['completed'] += 1
+            return result
+
+        with self._lock:
+            self.stats['submitted'] += 1
+        return self._pool.submit(task)
+
+    def summary(self):
+        with self._lock:
+            waits = sorted(self._waits)
+            out = dict(self.stats, workers=self.workers, opencv_threads=self.opencv_threads, active=self._active,
+                       queued=self.stats['submitted'] - self.stats['completed'] - self.stats['failed'] - self._active)
+        out['queue_wait_p50_ms'] = waits[int(0.5 * (len(waits) - 1))] if waits else None
+        out['queue_wait_p90_ms'] = waits[int(0.9 * (len(waits) - 1))] if waits else None
+        return out
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
@@ -0,0 +1,162 @@
+# model_pool.py
+"""多模型池: 一个服务进程按产线（line）路由到不同的检测模型
+不同漆面（高光、哑光、金属漆……）的产线使用各自训练的模型，输入尺寸也可能不同。
+每条产线单独起一个服务进程会重复占用内存与 CPU 核，模型池在同一进程内按需加载各产线的 PaintDefectDetector:
+
+- 配置: model/lines.json，例如
+    {
+      "max_loaded": 4,
+      "max_rss_mb": 1500,
+      "lines": {
+        "gloss": {"registry": "model/lines/gloss"},
+        "matte": {"model": "model/lines/matte/svm_defect.xml", "img_size": [384, 384]}
+      }
+    }
+  registry 为该产线的模型注册表目录（加载并校验其激活版本），model 为直接指定的模型文件；img_size 默认 [512, 512]。
+  未指定产线的请求使用默认检测器（model/ 注册表的激活版本，支持热加载与增量训练）。
+- 懒加载 + LRU: 第一次请求某产线时加载，之后复用；已加载的产线模型超过 max_loaded 个，
+  或进程常驻内存超过 max_rss_mb 时，卸载最久未使用的产线模型（默认检测器从不卸载）。
+  被卸载的检测器若仍有请求在使用，会在请求结束后随引用释放。
+- 共享预处理: 一次请求可以指定多条产线（line=gloss,matte），图片只解码一次；
+  输入尺寸相同的模型共用同一份灰度图、缺陷掩码与特征向量（特征只依赖输入尺寸），每个模型只做一次 SVM 分类。
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from inference import PaintDefectDetector, decode_gray_upload, read_image, source_name
+
+LINES_CONFIG = "model/lines.json"
+
+
+class ModelPool:
+    def __init__(self, default_detector, config_path=LINES_CONFIG):
+        self.default = default_detector
+        self.config_path = config_path
+        self.config = {}
+        if os.path.exists(config_path):
+            with open(config_path, 'r', encoding='utf-8') as f:
+                self.config = json.load(f)
+        self.max_loaded = int(self.config.get('max_loaded', 4))
+        self.max_rss_mb = self.config.get('max_rss_mb')
+        self._loaded = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'loads': 0, 'hits': 0, 'evictions': 0}
+
+    def lines(self):
+        return sorted(self.config.get('lines', {}))
+
+    def get(self, line=None):
+        """返回产线对应的检测器；line 为空时返回默认检测器，未配置的产线抛出 KeyError"""
+        if not line:
+            return self.default
+        spec = self.config.get('lines', {}).get(line)
+        if spec is None:
+            raise KeyError(line)
+        with self._lock:
+            detector = self._loaded.get(line)
+            if detector is not None:
+                self._loaded.move_to_end(line)
+                self.stats['hits'] += 1
+                return detector
+        # 加载（含 sha256 校验）可能要几百毫秒，不持锁，其他产线的请求不必等待；
+        # 同一产线被并发加载时保留先插入的那个
+        loaded = self._load(spec)
+        with self._lock:
+            detector = self._loaded.get(line)
+            if detector is not None:
+                self._loaded.move_to_end(line)
+                return detector
+            self._loaded[line] = loaded
+            self.stats['loads'] += 1
+            self._evict()
+            return loaded
+
+    def _load(self, spec):
+        img_size = tuple(spec.get('img_size', (512, 512)))
+        if 'registry' in spec:
+            from model_registry import ModelRegistry
+            path, version = ModelRegistry(spec['registry']).verified_path()
+            return PaintDefectDetector(path, img_size=img_size, model_version=version)
+        return PaintDefectDetector(spec['model'], img_size=img_size, model_version=spec.get('version'))
+
+    def _evict(self):
+        # 调用方持有 self._lock；刚加载的产线位于末尾，至少保留它
+        while len(self._loaded) > max(1, self.max_loaded):
+            self._loaded.popitem(last=False)
+            self.stats['evictions'] += 1
+        if self.max_rss_mb:
+            import psutil
+            process = psutil.Process()
+            while len(self._loaded) > 1 and process.memory_info().rss > self.max_rss_mb * 1024 * 1024:
+                self._loaded.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def unload(self, line):
+        with self._lock:
+            return self._loaded.pop(line, None) is not None
+
+    def predict_lines(self, img_path, lines, with_timing=False, image_name=None, gray=False):
+        """同一张图片交给多条产线的模型: 只解码一次，输入尺寸相同的模型共用预处理与特征；gray 见 predict_single"""
+        detectors = [(line, self.get(line)) for line in lines]
+        t0 = time.perf_counter()
+        img = decode_gray_upload(img_path) if gray else read_image(img_path)
+        if img is None:
+            return {'error': '无法读取图片'}
+        t1 = time.perf_counter()
+
+        groups = OrderedDict()
+        for line, detector in detectors:
+            groups.setdefault(tuple(detector.img_size), []).append((line, detector))
+        results = {}
+        preprocess_ms = feature_ms = predict_ms = 0.0
+        for members in groups.values():
+            first = members[0][1]
+            ta = time.perf_counter()
+            processed, mask = first.preprocess_image(img)
+            tb = time.perf_counter()
+            features = first.extract_robust_features(processed, mask).reshape(1, -1).astype(np.float32)
+            tc = time.perf_counter()
+            for line, detector in members:
+                model, version = detector.active()
+                _, result = model.predict(features)
+                prediction = int(result[0, 0])
+                results[line] = {
+                    'prediction': prediction,
+                    'confidence': '缺陷' if prediction == 1 else '正常',
+                    'model_version': version,
+                    'img_size': list(detector.img_size)
+                }
+            td = time.perf_counter()
+            preprocess_ms += (tb - ta) * 1000
+            feature_ms += (tc - tb) * 1000
+            predict_ms += (td - tc) * 1000
+
+        resp = {
+            'lines': results,
+            'image_name': source_name(img_path, image_name),
+            'image_size': [int(img.shape[1]), int(img.shape[0])],
+            'shared_groups': len(groups)
+        }
+        if with_timing:
+            resp['timing'] = {
+                'decode_ms': (t1 - t0) * 1000,
+                'preprocess_ms': preprocess_ms,
+                'feature_ms': feature_ms,
+                'predict_ms': predict_ms,
+                'total_ms': (time.perf_counter() - t0) * 1000
+            }
+        return resp
+
+    def summary(self):
+        with self._lock:
+            loaded = {line: {'model_version': d.model_version, 'img_size': list(d.img_size)}
+                      for line, d in self._loaded.items()}
+            stats = dict(self.stats)
+        return {'configured': self.lines(), 'loaded': loaded, 'max_loaded': self.max_loaded,
+                'max_rss_mb': self.max_rss_mb, **stats}
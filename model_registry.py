@@ -0,0 +1,284 @@
+# model_registry.py
+"""模型注册表：版本化模型文件 + 校验和 + 原子切换
+目录结构:
+    model/registry.json            # 清单: 当前激活版本与所有版本的文件名/sha256/创建时间
+    model/versions/svm_defect-v3.xml
+    model/versions/svm_defect-v3.npz  # 同版本的二进制快照，冷启动时优先加载（免 XML 解析）
+    model/svm_defect.xml           # 始终是激活版本的副本，兼容 train.py / test_model.py 等脚本
+
+所有写入都先写临时文件再 os.replace，读取方不会看到写了一半的模型或清单；
+加载时校验 sha256，校验失败则拒绝切换，继续使用旧模型。
+
+用法:
+    python model_registry.py --list
+    python model_registry.py --publish model/svm_defect.xml --note "full retrain"
+    python model_registry.py --activate v2
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+import cv2
+
+from cascade import gate_path, load_gate
+from model_snapshot import export_snapshot, load_model
+
+DEFAULT_MODEL_PATH = "model/svm_defect.xml"
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _write_json_atomic(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _copy_atomic(src, dst):
+    tmp_path = dst + ".tmp"
+    shutil.copyfile(src, tmp_path)
+    os.replace(tmp_path, dst)
+
+
+class ModelRegistry:
+    def __init__(self, root="model", default_model=DEFAULT_MODEL_PATH):
+        self.root = root
+        self.versions_dir = os.path.join(root, "versions")
+        self.manifest_path = os.path.join(root, "registry.json")
+        self.default_model = default_model
+        self._lock = threading.Lock()
+        os.makedirs(self.versions_dir, exist_ok=True)
+        if not os.path.exists(self.manifest_path) and os.path.exists(default_model):
+            # 首次使用：把现有模型登记为 v1
+            self.publish_file(default_model, note='bootstrap')
+
+    def manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {'active': None, 'versions': {}}
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def manifest_mtime(self):
+        try:
+            return os.stat(self.manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def active_version(self):
+        return self.manifest().get('active')
+
+    def _next_version(self, manifest):
+        nums = [int(v[1:]) for v in manifest['versions'] if v[1:].isdigit()]
+        return f"v{max(nums, default=0) + 1}"
+
+    def publish_file(self, path, note='', activate=True, base=None):
+        """登记一个已保存的模型文件为新版本，返回版本号；base 为增量更新所基于的版本"""
+        with self._lock:
+            manifest = self.manifest()
+            version = self._next_version(manifest)
+            filename = f"svm_defect-{version}.xml"
+            dst = os.path.join(self.versions_dir, filename)
+            _copy_atomic(path, dst)
+            entry = {
+                'file': filename,
+                'sha256': file_sha256(dst),
+                'created': time.time(),
+                'note': note
+            }
+            if base is not None:
+                entry['base'] = base
+            try:
+                snapshot = f"svm_defect-{version}.npz"
+                snapshot_path = os.path.join(self.versions_dir, snapshot)
+                tmp_path = snapshot_path + ".tmp.npz"
+                export_snapshot(cv2.ml.SVM_load(dst), tmp_path)
+                os.replace(tmp_path, snapshot_path)
+                entry['snapshot'] = snapshot
+                entry['snapshot_sha256'] = file_sha256(snapshot_path)
+            except ValueError as e:
+                print(f"⚠️ 未生成快照: {e}")
+            manifest['versions'][version] = entry
+            if activate:
+                manifest['active'] = version
+                _copy_atomic(dst, self.default_model)
+            _write_json_atomic(self.manifest_path, manifest)
+        print(f"✅ 模型已登记: {version} ({note})")
+        return version
+
+    def publish(self, model, note='', activate=True, base=None):
+        """保存 OpenCV SVM 对象并登记为新版本"""
+        tmp_path = os.path.join(self.versions_dir, f".publish-{os.getpid()}-{threading.get_ident()}.xml")
+        model.save(tmp_path)
+        try:
+            return self.publish_file(tmp_path, note=note, activate=activate, base=base)
+        finally:
+            os.remove(tmp_path)
+
+    def activate(self, version):
+        with self._lock:
+            manifest = self.manifest()
+            if version not in manifest['versions']:
+                raise KeyError(f"未知模型版本: {version}")
+            path = self.path_of(version, manifest)
+            self._verify(version, path, manifest)
+            manifest['active'] = version
+            _copy_atomic(path, self.default_model)
+            _write_json_atomic(self.manifest_path, manifest)
+        return version
+
+    def lineage(self, version, manifest=None):
+        """version 及其增量更新的基础版本链，由近及远"""
+        versions = (manifest or self.manifest())['versions']
+        chain = []
+        while version is not None and version not in chain:
+            chain.append(version)
+            version = versions.get(version, {}).get('base')
+        return chain
+
+    def path_of(self, version, manifest=None):
+        manifest = manifest or self.manifest()
+        return os.path.join(self.versions_dir, manifest['versions'][version]['file'])
+
+    def _verify(self, version, path, manifest, key='sha256'):
+        expected = manifest['versions'][version][key]
+        actual = file_sha256(path)
+        if actual != expected:
+            raise ValueError(f"模型校验失败: {version} sha256={actual[:12]}, 期望 {expected[:12]}")
+
+    def verified_path(self, version=None, prefer_snapshot=True):
+        """返回校验通过的模型文件路径 (path, version)；有快照时优先返回快照"""
+        manifest = self.manifest()
+        version = version or manifest.get('active')
+        if version is None:
+            raise FileNotFoundError(f"注册表中没有可用模型: {self.manifest_path}")
+        entry = manifest['versions'][version]
+        if prefer_snapshot and entry.get('snapshot'):
+            path = os.path.join(self.versions_dir, entry['snapshot'])
+            self._verify(version, path, manifest, key='snapshot_sha256')
+            return path, version
+        path = self.path_of(version, manifest)
+        self._verify(version, path, manifest)
+        return path, version
+
+    def load(self, version=None, prefer_snapshot=True):
+        """加载并校验模型，返回 (model, version)"""
+        path, version = self.verified_path(version, prefer_snapshot)
+        return load_model(path), version
+
+
+class ModelWatcher:
+    """后台轮询注册表清单，激活版本变化时加载、校验并热切换检测器模型；
+    同时跟踪当前版本的级联阈值文件（cascade.py），重新调参后自动生效。
+    增量更新得到的版本没有自己的阈值时，沿用 base 链上最近一个调过阈值的版本:
+    第一级特征与阈值只依赖图片和真实标签，与 SVM 无关，增量更新不会改变它们的召回约束"""
+
+    def __init__(self, registry, detector, interval_s=2.0):
+        self.registry = registry
+        self.detector = detector
+        self.interval_s = interval_s
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_mtime = registry.manifest_mtime()
+        self._gate_source = None
+        self._cascade_version = None  # 当前阈值是为哪个模型版本选出的
+        self.last_error = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='model-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _find_gate(self):
+        """返回当前模型版本应使用的阈值 (版本, 文件 mtime)；没有可用阈值时返回 None"""
+        for version in self.registry.lineage(self.detector.model_version):
+            path = gate_path(self.registry.root, version)
+            if os.path.exists(path):
+                return version, os.path.getmtime(path)
+        return None
+
+    def reload_cascade(self):
+        """按检测器当前模型版本（或其增量更新的基础版本）加载级联阈值；没有时关闭级联"""
+        had_gate = self.detector.cascade is not None
+        self._cascade_version = self.detector.model_version
+        self._gate_source = self._find_gate()
+        gate = load_gate(self.registry.root, self._gate_source[0]) if self._gate_source else None
+        self.detector.set_cascade(gate)
+        if gate is None and had_gate:
+            print(f"⚠️ 模型 {self.detector.model_version} 没有可用的级联阈值，级联已关闭")
+        elif gate is not None and gate.model_version != self.detector.model_version:
+            print(f"✅ 模型 {self.detector.model_version} 沿用 {gate.model_version} 的级联阈值")
+
+    def poll(self):
+        """检查一次: 阈值文件变化、检测器被就地切换了版本（增量训练直接 swap_model）、清单变化"""
+        if self._find_gate() != self._gate_source or self.detector.model_version != self._cascade_version:
+            self.reload_cascade()
+        mtime = self.registry.manifest_mtime()
+        if mtime == self._last_mtime:
+            return
+        self._last_mtime = mtime
+        try:
+            self.reload()
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"❌ 模型热加载失败: {e}")
+
+    def _run(self):
+        self.reload_cascade()
+        while not self._stop.wait(self.interval_s):
+            self.poll()
+
+    def reload(self, version=None):
+        """加载指定或当前激活版本并切换；与正在使用的版本相同时不做任何事"""
+        target = version or self.registry.active_version()
+        if target == self.detector.model_version:
+            return target
+        model, loaded = self.registry.load(target)
+        self.detector.swap_model(model, loaded)
+        self.reload_cascade()
+        self.last_error = None
+        print(f"✅ 模型已热切换到 {loaded}")
+        return loaded
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--root', default='model')
+    ap.add_argument('--list', action='store_true')
+    ap.add_argument('--publish', help='登记模型文件为新版本并激活')
+    ap.add_argument('--note', default='')
+    ap.add_argument('--activate', help='激活已有版本')
+    args = ap.parse_args()
+
+    registry = ModelRegistry(args.root, default_model=os.path.join(args.root, 'svm_defect.xml'))
+    if args.publish:
+        registry.publish_file(args.publish, note=args.note)
+    if args.activate:
+        registry.activate(args.activate)
+        print(f"✅ 已激活: {args.activate}")
+    if args.list or not (args.publish or args.activate):
+        print(json.dumps(registry.manifest(), ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
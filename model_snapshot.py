@@ -0,0 +1,152 @@
+# model_snapshot.py
+"""SVM 二进制快照
+把 OpenCV SVM 的支持向量、系数(alpha)、偏置(rho)和核参数导出为 NumPy .npz，
+加载时无需 XML 解析，显著缩短服务冷启动到首次预测的时间。
+SnapshotSVM 实现了检测器与增量训练用到的 cv2.ml.SVM 接口子集（predict / getSupportVectors /
+getDecisionFunction / getVarCount 等），可直接替换 OpenCV 模型对象使用。
+
+仅支持两类 C_SVC + RBF/LINEAR 核（即 train.py 训练出的模型）。
+决策值与 OpenCV 的差异在 1e-6 量级（OpenCV 内部使用 float32 累加）。
+
+export_edge_model 导出同样参数的紧凑 JSON（数组为 base64 编码的小端二进制），
+供浏览器端 static/js/edge_svm.js 离线推理使用。
+"""
+
+import base64
+
+import numpy as np
+
+SVM_C_SVC = 100        # cv2.ml.SVM_C_SVC
+SVM_LINEAR = 0         # cv2.ml.SVM_LINEAR
+SVM_RBF = 2            # cv2.ml.SVM_RBF
+STAT_MODEL_RAW_OUTPUT = 1  # cv2.ml.STAT_MODEL_RAW_OUTPUT
+
+# 分块计算核矩阵，避免大批量（如切片推理）时一次性分配 N×SV×D 的临时数组
+_PREDICT_CHUNK = 256
+
+
+def _decision_params(model):
+    """返回 (support_vectors float32, 按支持向量顺序排列的 alpha, rho)"""
+    if model.getType() != SVM_C_SVC or model.getKernelType() not in (SVM_RBF, SVM_LINEAR):
+        raise ValueError("快照仅支持 C_SVC + RBF/LINEAR 核模型")
+    sv = model.getSupportVectors().astype(np.float32)
+    rho, alpha, sv_idx = model.getDecisionFunction(0)
+    alpha_full = np.zeros(len(sv), dtype=np.float64)
+    alpha_full[np.asarray(sv_idx).ravel()] = np.asarray(alpha).ravel()
+    return sv, alpha_full, float(rho)
+
+
+def export_snapshot(model, path):
+    """将 OpenCV SVM 导出为 .npz 快照"""
+    sv, alpha_full, rho = _decision_params(model)
+    crit_type, max_iter, epsilon = model.getTermCriteria()
+    class_labels = np.array([0, 1], dtype=np.int32)
+    np.savez(path,
+             support_vectors=sv,
+             alpha=alpha_full,
+             rho=np.float64(rho),
+             gamma=np.float64(model.getGamma()),
+             C=np.float64(model.getC()),
+             kernel=np.int32(model.getKernelType()),
+             class_labels=class_labels,
+             term_criteria=np.array([crit_type, max_iter, epsilon], dtype=np.float64))
+
+
+def _b64(array, dtype):
+    return base64.b64encode(np.ascontiguousarray(array, dtype=dtype).tobytes()).decode('ascii')
+
+
+def export_edge_model(model, version=None, schema_version=None):
+    """导出浏览器端推理用的紧凑模型描述（可直接 JSON 序列化）"""
+    sv, alpha_full, rho = _decision_params(model)
+    return {
+        'format': 'paintdefect-svm',
+        'format_version': 1,
+        'model_version': version,
+        'schema_version': schema_version,
+        'kernel': 'rbf' if model.getKernelType() == SVM_RBF else 'linear',
+        'gamma': float(model.getGamma()),
+        'rho': rho,
+        'var_count': int(sv.shape[1]),
+        'sv_count': int(sv.shape[0]),
+        # 决策值 > 0 -> class_labels[0]，与 OpenCV / SnapshotSVM 相同
+        'class_labels': [0, 1],
+        'support_vectors': _b64(sv, '<f4'),
+        'alpha': _b64(alpha_full, '<f8'),
+    }
+
+
+class SnapshotSVM:
+    """从 .npz 快照加载的 SVM，接口与 cv2.ml.SVM 的常用方法保持一致"""
+
+    def __init__(self, path):
+        data = np.load(path, allow_pickle=False)
+        self.support_vectors = data['support_vectors']
+        self.alpha = data['alpha']
+        self.rho = float(data['rho'])
+        self.gamma = float(data['gamma'])
+        self.C = float(data['C'])
+        self.kernel = int(data['kernel'])
+        self.class_labels = data['class_labels']
+        self.term_criteria = data['term_criteria']
+        self._sv64 = self.support_vectors.astype(np.float64)
+        self._sv_sq = np.einsum('ij,ij->i', self._sv64, self._sv64)
+
+    def decision_function(self, samples):
+        x = np.asarray(samples, dtype=np.float64).reshape(-1, self._sv64.shape[1])
+        out = np.empty(len(x), dtype=np.float64)
+        for start in range(0, len(x), _PREDICT_CHUNK):
+            xc = x[start:start + _PREDICT_CHUNK]
+            dot = xc @ self._sv64.T
+            if self.kernel == SVM_RBF:
+                d2 = np.einsum('ij,ij->i', xc, xc)[:, None] - 2.0 * dot + self._sv_sq[None, :]
+                k = np.exp(-self.gamma * np.maximum(d2, 0.0))
+            else:
+                k = dot
+            out[start:start + _PREDICT_CHUNK] = k @ self.alpha - self.rho
+        return out
+
+    def predict(self, samples, flags=0):
+        """与 cv2.ml.SVM.predict 相同的返回形式: (retval, results[N,1] float32)"""
+        df = self.decision_function(samples)
+        if flags & STAT_MODEL_RAW_OUTPUT:
+            results = df
+        else:
+            # OpenCV 约定: 决策值 > 0 -> class_labels[0]
+            results = np.where(df > 0, self.class_labels[0], self.class_labels[1])
+        results = results.astype(np.float32).reshape(-1, 1)
+        return float(results[0, 0]), results
+
+    def getVarCount(self):
+        return self.support_vectors.shape[1]
+
+    def getSupportVectors(self):
+        return self.support_vectors
+
+    def getDecisionFunction(self, i):
+        idx = np.arange(len(self.alpha), dtype=np.int32).reshape(1, -1)
+        return self.rho, self.alpha.reshape(1, -1), idx
+
+    def getType(self):
+        return SVM_C_SVC
+
+    def getKernelType(self):
+        return self.kernel
+
+    def getC(self):
+        return self.C
+
+    def getGamma(self):
+        return self.gamma
+
+    def getTermCriteria(self):
+        crit_type, max_iter, epsilon = self.term_criteria
+        return int(crit_type), int(max_iter), float(epsilon)
+
+
+def load_model(path):
+    """按扩展名加载模型: .npz 快照 -> SnapshotSVM，其余交给 cv2.ml.SVM_load"""
+    if path.endswith('.npz'):
+        return SnapshotSVM(path)
+    import cv2
+    return cv2.ml.SVM_load(path)
@@ -0,0 +1,191 @@
+# online_update.py
+"""增量 / 在线模型更新
+将操作员确认过的样本（特征向量 + 标签）合并进特征缓存，并在后台线程中
+仅用 "当前模型的支持向量 + 新样本" 重新训练 SVM，训练代价与新数据量和支持向量数成正比，
+而不是整个图片集。训练完成后作为新版本登记到模型注册表，并热切换运行中检测器的模型引用。
+
+离线用法（对一批已确认样本做一次增量更新）:
+    python online_update.py --samples confirmed.jsonl
+    # confirmed.jsonl 每行: {"features": [...16 维...], "label": 0 或 1}
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from model_registry import ModelRegistry
+from train import FEATURE_STORE_PATH, load_feature_store, save_feature_store
+
+
+def support_set(model):
+    """从 OpenCV SVM 中取出支持向量及其标签（两类 C_SVC，alpha 符号即类别）"""
+    sv = model.getSupportVectors()
+    _, alpha, sv_idx = model.getDecisionFunction(0)
+    alpha_full = np.zeros(len(sv), dtype=np.float64)
+    alpha_full[sv_idx.ravel()] = alpha.ravel()
+    # OpenCV 约定: alpha > 0 对应 class_labels[0]，即 0(正常)；其余为 1(缺陷)
+    labels = np.where(alpha_full > 0, 0, 1).astype(np.int32)
+    return sv.astype(np.float32), labels
+
+
+def fit_like(template, X, y):
+    """按模板模型的类型/核/超参数训练新的 OpenCV SVM"""
+    model = cv2.ml.SVM_create()
+    model.setType(template.getType())
+    model.setKernel(template.getKernelType())
+    model.setC(template.getC())
+    model.setGamma(template.getGamma())
+    model.setTermCriteria(template.getTermCriteria())
+    model.train(np.asarray(X, dtype=np.float32), cv2.ml.ROW_SAMPLE, np.asarray(y, dtype=np.int32))
+    return model
+
+
+class IncrementalTrainer:
+    """后台增量训练器：收集确认样本 -> 合并特征缓存 -> 重训 -> 热切换"""
+
+    def __init__(self, detector, registry, store_path=FEATURE_STORE_PATH,
+                 min_batch=8, max_wait_s=60.0):
+        self.detector = detector
+        self.registry = registry
+        self.store_path = store_path
+        self.min_batch = min_batch
+        self.max_wait_s = max_wait_s
+
+        self._pending = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_update = None
+
+    def submit(self, features, label, source=None):
+        """加入一条已确认样本，返回当前待训练样本数"""
+        feats = np.asarray(features, dtype=np.float32).ravel()
+        var_count = self.detector.model.getVarCount()
+        if feats.shape[0] != var_count:
+            raise ValueError(f"特征维度不匹配: 期望 {var_count}, 实际 {feats.shape[0]}")
+        if int(label) not in (0, 1):
+            raise ValueError(f"标签必须为 0 或 1: {label}")
+        with self._lock:
+            self._pending.append((feats, int(label), source or 'feedback'))
+            pending = len(self._pending)
+        if pending >= self.min_batch:
+            self._wakeup.set()
+        return pending
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='incremental-trainer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def flush(self):
+        """请求后台线程立即用现有待训练样本重训"""
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(timeout=self.max_wait_s)
+            self._wakeup.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.update_now()
+            except Exception as e:
+                print(f"❌ 增量训练失败: {e}")
+
+    def update_now(self):
+        """同步执行一次增量更新；没有待训练样本时返回 None"""
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return None
+
+        t0 = time.perf_counter()
+        X_new = np.stack([b[0] for b in batch])
+        y_new = np.array([b[1] for b in batch], dtype=np.int32)
+        paths_new = [b[2] for b in batch]
+
+        # 1. 合并进特征缓存（保留全量数据，供之后的离线全量训练使用）
+        X_store, y_store, paths_store = load_feature_store(self.store_path)
+        if X_store.size:
+            X_store = np.vstack([X_store, X_new])
+            y_store = np.concatenate([y_store, y_new])
+        else:
+            X_store, y_store = X_new, y_new
+        save_feature_store(X_store, y_store, paths_store + paths_new, self.store_path)
+
+        # 2. 仅用 当前支持向量 + 新样本 训练
+        current, base_version = self.detector.active()
+        sv, sv_labels = support_set(current)
+        X_train = np.vstack([sv, X_new])
+        y_train = np.concatenate([sv_labels, y_new])
+        new_model = fit_like(current, X_train, y_train)
+        t1 = time.perf_counter()
+
+        # 3. 登记新版本（原子落盘 + 校验和）并热切换
+        version = self.registry.publish(new_model, note=f'incremental +{len(batch)}', base=base_version)
+        self.detector.swap_model(new_model, version)
+
+        self.last_update = {
+            'timestamp': time.time(),
+            'model_version': version,
+            'base_version': base_version,
+            'new_samples': len(batch),
+            'train_rows': int(X_train.shape[0]),
+            'support_vectors': int(new_model.getSupportVectors().shape[0]),
+            'store_rows': int(X_store.shape[0]),
+            'train_ms': (t1 - t0) * 1000
+        }
+        print(f"✅ 增量训练完成: {self.last_update}")
+        return self.last_update
+
+
+def load_samples(path):
+    """读取 JSONL 样本文件: 每行 {"features": [...], "label": 0/1}"""
+    samples = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                samples.append(json.loads(line))
+    return samples
+
+
+def main():
+    from inference import PaintDefectDetector
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--samples', required=True, help='已确认样本 JSONL 文件')
+    ap.add_argument('--root', default='model', help='模型注册表目录')
+    ap.add_argument('--store', default=FEATURE_STORE_PATH)
+    args = ap.parse_args()
+
+    registry = ModelRegistry(args.root, default_model=os.path.join(args.root, 'svm_defect.xml'))
+    version = registry.active_version()
+    detector = PaintDefectDetector(registry.path_of(version), model_version=version)
+    trainer = IncrementalTrainer(detector, registry, store_path=args.store)
+    for s in load_samples(args.samples):
+        trainer.submit(s['features'], s['label'], source=s.get('image_name'))
+    result = trainer.update_now()
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+# perf_log_store.py
+"""客户端性能日志的服务端收集
+页面把每次检测的端到端日志（与导出的 mobile_perf_logs.json 同格式）分批 gzip 后 POST 到 /perf_logs，
+不再依赖手动点击“导出日志”。
+
+- PerfLogStore: 追加写入的 JSONL 存储，按大小轮转（perf_logs.jsonl -> perf_logs-<时间戳>.jsonl），
+  只保留最近 max_files 个历史文件；basename 可改，服务端逐请求日志（request_log.py）也用它落盘。序列化在锁外完成，锁内只有一次 write，多个请求并发写入时竞争很小。
+- LiveClientStats: 按模式保留最近若干条日志的滚动窗口，为 /metrics 提供实时统计，
+  并为 auto 模式估算各模式的端到端耗时（见 recommend）。
+"""
+
+import json
+import math
+import os
+import threading
+import time
+import zlib
+from collections import deque
+
+from tracing import server_time_ms
+
+# 解压后单批日志上限，防止压缩炸弹
+MAX_DECOMPRESSED_BYTES = 8 * 1024 * 1024
+
+
+def decode_body(data, content_encoding=None):
+    """解析请求体: 支持 gzip/deflate 压缩；返回日志条目列表"""
+    if content_encoding in ('gzip', 'deflate'):
+        wbits = 16 + zlib.MAX_WBITS if content_encoding == 'gzip' else zlib.MAX_WBITS
+        d = zlib.decompressobj(wbits)
+        data = d.decompress(data, MAX_DECOMPRESSED_BYTES)
+        if d.unconsumed_tail:
+            raise ValueError(f'解压后超过 {MAX_DECOMPRESSED_BYTES} 字节')
+    elif content_encoding not in (None, '', 'identity'):
+        raise ValueError(f'不支持的 Content-Encoding: {content_encoding}')
+    payload = json.loads(data)
+    entries = payload.get('entries') if isinstance(payload, dict) else payload
+    if not isinstance(entries, list):
+        raise ValueError('需要日志数组或 {"entries": [...]}')
+    return [e for e in entries if isinstance(e, dict)]
+
+
+# 条目中必须为数值（或缺失 / null）的字段
+_NUMERIC_FIELDS = {
+    'client_timing': None,                          # 所有字段
+    'server_timing': None,
+    'server_spans': None,
+    'client_meta': ('original_size', 'uploaded_size', 'original_width', 'original_height', 'compress_ms'),
+    'network_info': ('downlink', 'rtt'),
+}
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def validate_entry(entry):
+    """检查一条客户端日志的数值字段；合法时返回 None，否则返回错误说明"""
+    for section, keys in _NUMERIC_FIELDS.items():
+        values = entry.get(section)
+        if values is None:
+            continue
+        if not isinstance(values, dict):
+            return f'{section} 需为对象'
+        for key in (keys if keys is not None else values):
+            value = values.get(key)
+            if value is not None and not _is_number(value):
+                return f'{section}.{key} 不是数值: {value!r}'
+    return None
+
+
+class PerfLogStore:
+    def __init__(self, directory='output/perf_logs', max_bytes=32 * 1024 * 1024, max_files=20, basename='perf_logs'):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.basename = basename
+        self.current_path = os.path.join(directory, f'{basename}.jsonl')
+        self._lock = threading.Lock()
+        self._file = None
+        self._size = 0
+        self.written = 0
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._file = open(self.current_path, 'ab')
+        self._size = self._file.tell()
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        now = time.time()
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(now)) + f'{int(now * 1000) % 1000:03d}'
+        target = os.path.join(self.directory, f'{self.basename}-{stamp}.jsonl')
+        n = 1
+        while os.path.exists(target):
+            target = os.path.join(self.directory, f'{self.basename}-{stamp}-{n}.jsonl')
+            n += 1
+        os.replace(self.current_path, target)
+        rotated = self.files()
+        for old in rotated[:max(0, len(rotated) - self.max_files)]:
+            os.remove(old)
+        self._open()
+
+    def files(self):
+        """按时间顺序返回所有日志文件（当前文件在最后）"""
+        if not os.path.isdir(self.directory):
+            return []
+        rotated = sorted(os.path.join(self.directory, f) for f in os.listdir(self.directory)
+                         if f.startswith(self.basename + '-') and f.endswith('.jsonl'))
+        if os.path.exists(self.current_path):
+            rotated.append(self.current_path)
+        return rotated
+
+    def append(self, entries, received_at=None):
+        if not entries:
+            return 0
+        received_at = received_at or time.time()
+        data = ''.join(json.dumps(dict(e, received_at=received_at), ensure_ascii=False) + '\n'
+                       for e in entries).encode('utf-8')
+        with self._lock:
+            if self._file is None:
+                self._open()
+            if self._size and self._size + len(data) > self.max_bytes:
+                self._rotate()
+            self._file.write(data)
+            self._file.flush()
+            self._size += len(data)
+            self.written += len(entries)
+        return len(entries)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    s = sorted(values)
+    return s[int(q * (len(s) - 1))]
+
+
+class LiveClientStats:
+    """按模式滚动统计客户端上报的端到端耗时，并据此估算 auto 模式下各方案的代价"""
+
+    def __init__(self, window=200, min_samples=5):
+        self.window = window
+        self.min_samples = min_samples
+        self._by_mode = {}
+        self._lock = threading.Lock()
+
+    def observe(self, entries):
+        rows = []
+        for e in entries:
+            ct = e.get('client_timing') or {}
+            meta = e.get('client_meta') or {}
+            if ct.get('network_ms') is None:
+                continue
+            try:
+                row = {
+                    'network_ms': float(ct['network_ms']),
+                    'total_ms': float(ct.get('total_client_ms') or ct['network_ms']),
+                    'server_ms': float(server_time_ms(e) or 0.0),
+                    'uploaded_size': int(meta.get('uploaded_size') or 0),
+                    'feature_ms_client': float((e.get('server_timing') or {}).get('feature_ms_client') or 0.0),
+                    'rtt': float((e.get('network_info') or {}).get('rtt') or 0.0),
+                }
+            except (TypeError, ValueError, AttributeError):
+                continue  # 字段类型不对的条目不计入统计
+            rows.append((e.get('mode') or 'unknown', row))
+        with self._lock:
+            for mode, row in rows:
+                self._by_mode.setdefault(mode, deque(maxlen=self.window)).append(row)
+        return len(rows)
+
+    def _rows(self, mode):
+        with self._lock:
+            return list(self._by_mode.get(mode, ()))
+
+    def summary(self):
+        with self._lock:
+            modes = list(self._by_mode)
+        out = {}
+        for mode in modes:
+            rows = self._rows(mode)
+            total = [r['total_ms'] for r in rows]
+            network = [r['network_ms'] for r in rows]
+            out[mode] = {
+                'count': len(rows),
+                'total_p50_ms': _percentile(total, 0.5),
+                'total_p90_ms': _percentile(total, 0.9),
+                'network_p50_ms': _percentile(network, 0.5),
+                'network_p90_ms': _percentile(network, 0.9),
+                'upload_mbps': self._throughput_mbps(rows),
+            }
+        return out
+
+    @staticmethod
+    def _throughput_mbps(rows):
+        """上传吞吐中位数: (network_ms - 服务端耗时 - RTT) 视为传输时间，只统计足够大的上传"""
+        samples = []
+        for r in rows:
+            transfer = r['network_ms'] - r['server_ms'] - r['rtt']
+            if r['uploaded_size'] >= 50_000 and transfer > 1:
+                samples.append(r['uploaded_size'] * 8 / 1000 / transfer)
+        return _percentile(samples, 0.5)
+
+    def estimate(self, file_size):
+        """估算当前文件分别走 full_remote / classify_only 的端到端耗时(ms)；样本不足的模式不出现在结果中"""
+        est = {}
+        remote = self._rows('full_remote')
+        if len(remote) >= self.min_samples:
+            mbps = self._throughput_mbps(remote)
+            rtt = _percentile([r['rtt'] for r in remote], 0.5)
+            server = _percentile([r['server_ms'] for r in remote], 0.5)
+            if mbps:
+                est['full_remote'] = rtt + file_size * 8 / 1000 / mbps + server
+        local = self._rows('classify_only')
+        if len(local) >= self.min_samples:
+            est['classify_only'] = _percentile([r['feature_ms_client'] + r['network_ms'] for r in local], 0.5)
+        return est
+
+    def recommend(self, file_size):
+        """两种模式都有足够样本时返回 (推荐模式, 估算值)，否则返回 None 交给规则判断"""
+        est = self.estimate(file_size)
+        if len(est) < 2:
+            return None
+        return min(est, key=est.get), est
@@ -0,0 +1,99 @@
+# quantile_sketch.py
+"""可合并的流式分位数草图（DDSketch 思路）
+值按对数等比分桶: 桶 i 覆盖 (γ^(i-1), γ^i]，γ = (1+α)/(1-α)，
+任意分位数的相对误差不超过 α（默认 1%），内存只与数值的动态范围有关（桶数 ~ log(max/min)/log γ），
+与样本数无关。两个草图按桶相加即可精确合并，适合多进程分片统计后汇总。
+
+同时维护 count / min / max 以及均值与二阶矩（Chan 并行合并公式），输出与
+analyze_mobile_logs.stats 相同的字段。
+"""
+
+import math
+
+
+class QuantileSketch:
+    def __init__(self, relative_accuracy=0.01):
+        self.alpha = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins = {}
+        self.zero_count = 0       # <= 0 的值单独计数（耗时类数据极少出现）
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    def _key(self, value):
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _value(self, key):
+        # 桶 (γ^(k-1), γ^k] 的代表值，使相对误差对称地不超过 α
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def add(self, value):
+        value = float(value)
+        if value > 0:
+            k = self._key(value)
+            self.bins[k] = self.bins.get(k, 0) + 1
+        else:
+            self.zero_count += 1
+        self.count += 1
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        delta = value - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (value - self._mean)
+
+    def merge(self, other):
+        if other.gamma != self.gamma:
+            raise ValueError('只能合并精度相同的草图')
+        if other.count == 0:
+            return self
+        for k, c in other.bins.items():
+            self.bins[k] = self.bins.get(k, 0) + c
+        self.zero_count += other.zero_count
+        n = self.count + other.count
+        delta = other._mean - self._mean
+        self._m2 += other._m2 + delta * delta * self.count * other.count / n
+        self._mean += delta * other.count / n
+        self.count = n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def quantile(self, q):
+        """与“排序后取下标 int(q*(n-1))”同一秩的近似值"""
+        if self.count == 0:
+            return None
+        rank = int(q * (self.count - 1))
+        if rank < self.zero_count:
+            return self.min if self.min <= 0 else 0.0
+        seen = self.zero_count
+        for k in sorted(self.bins):
+            seen += self.bins[k]
+            if seen > rank:
+                # 代表值夹在真实 min/max 之间，保证端点处不越界
+                return min(max(self._value(k), self.min), self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self._mean if self.count else None
+
+    @property
+    def std(self):
+        return math.sqrt(self._m2 / self.count) if self.count > 1 else 0.0
+
+    def stats(self):
+        if self.count == 0:
+            return {}
+        return {
+            'count': self.count,
+            'avg': self._mean,
+            'median': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'min': self.min,
+            'max': self.max,
+            'std': self.std,
+        }
@@ -0,0 +1,328 @@
+"""按记录的真实流量回放压测
+输入可以是服务端逐请求日志（output/request_log/，见 request_log.py），也可以是前端导出的 mobile_perf_logs.json。
+回放时还原三样东西:
+  - 到达过程: 按记录的到达时间间隔发出请求（开环，不等上一个返回），--speeds 可按 1x/2x/10x 等倍速压缩间隔；
+    超过 --max-gap 秒的空闲间隔会被截断，避免在夜间等空闲时段空等；
+  - 模式构成: 每条按原模式发往 /predict（full_remote、auto）或 /classify（classify_only），edge 模式没有服务端请求，跳过；
+  - 负载大小: 从 --images（默认上传归档，即服务端实际收到的图片）取样本图，缩放到记录的分辨率，调 JPEG 质量逼近记录的字节数。
+    记录中没有尺寸时按 --assume-dims 处理（与 replay_upload_policy.py 相同）。所有负载在计时开始前生成好。
+输出各倍速、各模式的客户端延迟（从计划发出时刻算起，含排队）、服务端耗时，
+以及与记录中服务端耗时的差值，用于判断新版本在真实流量形态下是否退化。
+
+示例:
+    python replay_traffic.py --server http://127.0.0.1:5000 --log output/request_log/ --speeds 1 2 10
+    python replay_traffic.py --server http://127.0.0.1:5000 --log mobile_perf_logs.json --max-gap 5
+"""
+
+import argparse
+import json
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import requests
+
+from analyze_mobile_logs import expand_inputs, iter_entries
+from dataset_index import list_images
+from results_table import _timestamp
+from upload_archive import ARCHIVE_BLOBS, shas_named
+
+ENDPOINTS = {'full_remote': '/predict', 'auto': '/predict', 'classify_only': '/classify'}
+SYNTH_PREFIX = 'replay_'
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    s = sorted(values)
+    return s[int(q * (len(s) - 1))]
+
+
+def _recorded_ms(timing):
+    timing = timing or {}
+    return timing.get('total_ms', timing.get('predict_ms'))
+
+
+def trace_event(entry):
+    """服务端日志或客户端性能日志 -> 回放事件；无法回放的返回 None"""
+    if 'endpoint' in entry:
+        # 服务端逐请求日志
+        if not entry.get('ok'):
+            return None
+        mode = entry.get('mode') or entry.get('executed_mode') or 'full_remote'
+        size = entry.get('image_size')
+        return {
+            't': entry.get('received_at'),
+            'mode': mode,
+            'endpoint': entry['endpoint'],
+            'bytes': entry.get('bytes'),
+            'image_size': tuple(size) if size else None,
+            'ext': entry.get('ext') or '.jpg',
+            'recorded_server_ms': _recorded_ms(entry.get('timing')),
+            'recorded_handler_ms': entry.get('handler_ms'),
+        }
+    mode = entry.get('mode')
+    if mode not in ENDPOINTS:
+        return None
+    meta = entry.get('client_meta') or {}
+    plan = meta.get('upload_plan') or {}
+    size = None
+    if plan.get('width') and plan.get('height'):
+        size = (plan['width'], plan['height'])
+    elif meta.get('original_width') and (meta.get('resize_target') or 'none') == 'none':
+        size = (meta['original_width'], meta['original_height'])
+    return {
+        't': _timestamp(entry.get('timestamp') or entry.get('received_at')),
+        'mode': mode,
+        'endpoint': ENDPOINTS[mode],
+        'bytes': meta.get('uploaded_size'),
+        'image_size': size,
+        'ext': os.path.splitext(entry.get('image_name') or '')[1].lower() or '.jpg',
+        'recorded_server_ms': _recorded_ms(entry.get('server_timing')),
+        'recorded_handler_ms': (entry.get('server_timing') or {}).get('endpoint_ms'),
+    }
+
+
+def load_trace(inputs, modes=None, limit=None):
+    events = []
+    for path in expand_inputs(inputs):
+        for entry in iter_entries(path):
+            ev = trace_event(entry) if isinstance(entry, dict) else None
+            if ev is None or ev['t'] is None or (modes and ev['mode'] not in modes):
+                continue
+            events.append(ev)
+    events.sort(key=lambda e: e['t'])
+    return events[:limit] if limit else events
+
+
+def schedule(events, speed, max_gap=None):
+    """每个事件相对回放开始的发出时刻（秒）；空闲间隔先截断到 max_gap 再按倍速压缩"""
+    offsets = []
+    elapsed = 0.0
+    for prev, ev in zip([None] + events[:-1], events):
+        if prev is not None:
+            gap = max(0.0, ev['t'] - prev['t'])
+            elapsed += min(gap, max_gap) if max_gap else gap
+        offsets.append(elapsed / speed)
+    return offsets
+
+
+class PayloadFactory:
+    """按 (分辨率, 格式, 字节数档位) 合成并缓存图片负载；classify 负载复用样本图的特征"""
+
+    def __init__(self, image_dir, assume_dims=(4032, 3024), limit=20):
+        # 服务端会把回放上传的合成图也存进上传归档（按内容哈希命名），按 names.jsonl 中的原文件名前缀排除，
+        # 避免下次回放用合成图再合成；普通目录中按文件名前缀排除
+        synthetic = shas_named(os.path.dirname(os.path.normpath(image_dir)), SYNTH_PREFIX)
+        paths = list_images(image_dir) if os.path.isdir(image_dir) else []
+        self.sources = [p for p in paths if not os.path.basename(p).startswith(SYNTH_PREFIX)
+                        and os.path.splitext(os.path.basename(p))[0] not in synthetic][:limit]
+        if not self.sources:
+            raise FileNotFoundError(f'{image_dir} 下没有样本图片')
+        self.assume_dims = assume_dims
+        self._images = {}
+        self._cache = {}
+        self._features = None
+        self._next = 0
+        self.synthesized = 0
+
+    def _source(self):
+        path = self.sources[self._next % len(self.sources)]
+        self._next += 1
+        if path not in self._images:
+            self._images[path] = cv2.imread(path, cv2.IMREAD_COLOR)
+        return path, self._images[path]
+
+    @staticmethod
+    def _encode_to_size(img, ext, target):
+        if ext == '.png':
+            return cv2.imencode('.png', img)[1].tobytes()
+        # JPEG: 二分质量，取最接近目标字节数的编码
+        lo, hi, best = 5, 100, None
+        while lo <= hi:
+            q = (lo + hi) // 2
+            data = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, q])[1].tobytes()
+            if best is None or abs(len(data) - target) < abs(len(best) - target):
+                best = data
+            if not target or len(data) == target:
+                break
+            if len(data) < target:
+                lo = q + 1
+            else:
+                hi = q - 1
+        return best
+
+    def image(self, ev):
+        w, h = ev['image_size'] or self.assume_dims
+        ext = '.png' if ev['ext'] == '.png' else '.jpg'
+        target = ev['bytes'] or 0
+        bucket = round(math.log(target) / math.log(1.1)) if target > 0 else 0
+        key = (w, h, ext, bucket)
+        if key not in self._cache:
+            path, img = self._source()
+            resized = cv2.resize(img, (int(w), int(h)), interpolation=cv2.INTER_AREA)
+            name = f'{SYNTH_PREFIX}{os.path.splitext(os.path.basename(path))[0]}_{w}x{h}{ext}'
+            self._cache[key] = (name, self._encode_to_size(resized, ext, target))
+            self.synthesized += 1
+        return self._cache[key]
+
+    def features(self):
+        if self._features is None:
+            from benchmark_classify_only import extract_features_batch_py
+            from inference import FEATURE_SCHEMA_VERSION
+            names, feats = extract_features_batch_py(self.sources)
+            self._features = [(n, {'features': f, 'name': n, 'schema_version': FEATURE_SCHEMA_VERSION})
+                              for n, f in zip(names, feats)]
+        return self._features
+
+    def build(self, events):
+        payloads = []
+        for i, ev in enumerate(events):
+            if ev['endpoint'] == '/classify' or ev['mode'] == 'classify_only':
+                feats = self.features()
+                payloads.append(('json', feats[i % len(feats)][1]))
+            else:
+                name, data = self.image(ev)
+                payloads.append(('file', (name, data)))
+        return payloads
+
+
+_session = threading.local()
+
+
+def send(server, ev, payload, scheduled):
+    """发出一个请求；latency 从计划时刻算起（开环回放中排队等待也计入用户感知的延迟）"""
+    if not hasattr(_session, 's'):
+        _session.s = requests.Session()
+    kind, body = payload
+    url = server.rstrip('/') + ev['endpoint']
+    sent = time.perf_counter()
+    try:
+        if kind == 'json':
+            resp = _session.s.post(url, json=body, timeout=60)
+        else:
+            name, data = body
+            mime = 'image/png' if name.endswith('.png') else 'image/jpeg'
+            resp = _session.s.post(url, files={'file': (name, data, mime)}, data={'mode': ev['mode']}, timeout=60)
+        done = time.perf_counter()
+        result = resp.json()
+        ok = resp.status_code == 200 and 'error' not in result
+    except (requests.RequestException, ValueError):
+        done, result, ok = time.perf_counter(), {}, False
+    return {
+        'mode': ev['mode'],
+        'ok': ok,
+        'lag_ms': (sent - scheduled) * 1000,
+        'latency_ms': (done - scheduled) * 1000,
+        'server_ms': _recorded_ms(result.get('timing')) if ok else None,
+        'recorded_server_ms': ev['recorded_server_ms'],
+    }
+
+
+def replay(server, events, payloads, speed, max_gap, workers):
+    offsets = schedule(events, speed, max_gap)
+    futures = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        start = time.perf_counter() + 0.2
+        for ev, payload, off in zip(events, payloads, offsets):
+            at = start + off
+            delay = at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(pool.submit(send, server, ev, payload, at))
+        results = [f.result() for f in futures]
+    wall = time.perf_counter() - start
+    return results, (offsets[-1] if offsets else 0.0), wall
+
+
+def summarize(results, span, wall):
+    ok = [r for r in results if r['ok']]
+    latency = [r['latency_ms'] for r in ok]
+    server = [r['server_ms'] for r in ok if r['server_ms'] is not None]
+    recorded = [r['recorded_server_ms'] for r in ok if r['recorded_server_ms'] is not None]
+    deltas = [r['server_ms'] - r['recorded_server_ms'] for r in ok
+              if r['server_ms'] is not None and r['recorded_server_ms'] is not None]
+    out = {
+        'requests': len(results),
+        'errors': len(results) - len(ok),
+        'offered_rps': len(results) / span if span > 0 else None,
+        'achieved_rps': len(ok) / wall if wall > 0 else None,
+        'lag_p99_ms': _percentile([r['lag_ms'] for r in results], 0.99),
+    }
+    for q in (0.5, 0.9, 0.99):
+        p = int(q * 100)
+        out[f'latency_p{p}_ms'] = _percentile(latency, q)
+        out[f'server_p{p}_ms'] = _percentile(server, q)
+        out[f'recorded_server_p{p}_ms'] = _percentile(recorded, q)
+    out['server_delta_p50_ms'] = _percentile(deltas, 0.5)
+    out['server_delta_p90_ms'] = _percentile(deltas, 0.9)
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--server', default='http://127.0.0.1:5000')
+    ap.add_argument('--log', nargs='+', default=['output/request_log/'], help='服务端逐请求日志或 mobile_perf_logs.json')
+    ap.add_argument('--images', default=ARCHIVE_BLOBS,
+                    help='合成负载用的样本图片目录（默认上传归档；也可用仓库自带的 static/uploads）')
+    ap.add_argument('--speeds', nargs='+', type=float, default=[1, 2, 10])
+    ap.add_argument('--max-gap', type=float, default=30.0, help='截断超过该秒数的空闲间隔；0 表示不截断')
+    ap.add_argument('--modes', nargs='+', default=None, help='只回放这些模式')
+    ap.add_argument('--limit', type=int, default=None, help='最多回放的请求数（按时间顺序取前 N 条）')
+    ap.add_argument('--workers', type=int, default=64, help='同时在途的最大请求数')
+    ap.add_argument('--assume-dims', default='4032x3024', help='记录中缺少分辨率时使用的尺寸')
+    ap.add_argument('--out', default='output/replay_report.json')
+    args = ap.parse_args()
+
+    events = load_trace(args.log, args.modes, args.limit)
+    if not events:
+        print('No replayable requests found.')
+        return
+    mix = defaultdict(int)
+    for ev in events:
+        mix[ev['mode']] += 1
+    span = events[-1]['t'] - events[0]['t']
+    print(f'Loaded {len(events)} requests spanning {span:.1f}s, mix: {dict(mix)}')
+
+    assume_dims = tuple(int(x) for x in args.assume_dims.lower().split('x'))
+    factory = PayloadFactory(args.images, assume_dims)
+    t = time.perf_counter()
+    payloads = factory.build(events)
+    print(f'Synthesized {factory.synthesized} distinct images in {time.perf_counter() - t:.1f}s')
+
+    report = {'server': args.server, 'requests': len(events), 'mix': dict(mix), 'max_gap_s': args.max_gap,
+              'speeds': {}}
+    for speed in args.speeds:
+        print(f'Replaying at {speed:g}x ...')
+        results, sched_span, wall = replay(args.server, events, payloads, speed, args.max_gap or None, args.workers)
+        by_mode = defaultdict(list)
+        for r in results:
+            by_mode[r['mode']].append(r)
+        report['speeds'][f'{speed:g}x'] = {
+            'overall': summarize(results, sched_span, wall),
+            'modes': {m: summarize(rs, sched_span, wall) for m, rs in sorted(by_mode.items())},
+        }
+
+    os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    def fmt(v):
+        return f'{v:.1f}' if isinstance(v, (int, float)) else '-'
+    print(f"\n{'speed':<7}{'mode':<15}{'n':>6}{'err':>5}{'rps':>8}{'lat p50':>9}{'lat p99':>9}"
+          f"{'srv p50':>9}{'rec p50':>9}{'Δsrv p50':>10}{'Δsrv p90':>10}")
+    for speed, r in report['speeds'].items():
+        for mode, s in [('ALL', r['overall'])] + list(r['modes'].items()):
+            print(f"{speed:<7}{mode:<15}{s['requests']:>6}{s['errors']:>5}{fmt(s['achieved_rps']):>8}"
+                  f"{fmt(s['latency_p50_ms']):>9}{fmt(s['latency_p99_ms']):>9}{fmt(s['server_p50_ms']):>9}"
+                  f"{fmt(s['recorded_server_p50_ms']):>9}{fmt(s['server_delta_p50_ms']):>10}"
+                  f"{fmt(s['server_delta_p90_ms']):>10}")
+    print('Saved:', args.out)
+
+
+if __name__ == '__main__':
+    main()
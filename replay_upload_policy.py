@@ -0,0 +1,226 @@
+"""回放 mobile_perf_logs.json，评估自适应上传压缩策略（static/js/upload_policy.js）的端到端收益
+1. 标定: 对 --images 下大于服务端 img_size 的图片，按策略的方式保持宽高比缩小到恰好覆盖 img_size 并编码为 PNG，
+   统计每像素字节数、与原图的分类结果一致率，以及服务端解码+推理的耗时；
+   一致率低于 --min-agreement（默认 99%）时以非零状态退出，此时不应在页面上启用自动压缩；
+2. 回放: 逐条日志构造与浏览器相同的输入（原图大小/尺寸、navigator.connection、此前的上传记录），
+   在 Node 中调用真实的 chooseUploadPlan 得到决策；
+3. 估算: 用该条日志自身的实测吞吐（network_ms 扣除服务端耗时与 RTT）换算压缩后上传的传输时间，
+   加上客户端重编码耗时，得到新的端到端耗时。服务端耗时默认保持日志原值（偏保守），
+   --measured-server 时改用标定中测得的服务端耗时（按策略缩小到覆盖 img_size 的 PNG）。
+
+旧日志没有记录原图尺寸，缺失时按 --assume-dims（默认 4032x3024，常见手机主摄）处理。
+
+示例:
+    python replay_upload_policy.py --logs mobile_perf_logs.json --out output/upload_policy_replay.json
+"""
+
+import argparse
+import json
+import math
+import os
+import shutil
+import statistics
+import subprocess
+import time
+from collections import defaultdict
+
+import cv2
+import numpy as np
+
+POLICY_JS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'js', 'upload_policy.js')
+IMAGE_EXTS = ('.png', '.jpg', '.jpeg', '.bmp')
+MIN_SAMPLE_BYTES = 50000
+
+# 从 stdin 读入上下文列表，逐条调用 chooseUploadPlan
+_NODE_SCRIPT = r'''
+const policy = require(process.argv[1]);
+let input = '';
+process.stdin.on('data', d => input += d);
+process.stdin.on('end', () => {
+    const contexts = JSON.parse(input);
+    process.stdout.write(JSON.stringify({
+        bytes_per_pixel: policy.PNG_BYTES_PER_PIXEL,
+        plans: contexts.map(c => policy.chooseUploadPlan(c)),
+    }));
+});
+'''
+
+
+def server_ms_of(entry):
+    st = entry.get('server_timing') or {}
+    return st.get('endpoint_ms') or st.get('total_ms') or st.get('predict_ms') or 0.0
+
+
+def history_item(entry):
+    """与 index.html 的 uploadHistory() 相同的字段"""
+    return {
+        'uploaded_size': entry['client_meta']['uploaded_size'],
+        'network_ms': entry['client_timing']['network_ms'],
+        'server_ms': server_ms_of(entry),
+        'rtt': (entry.get('network_info') or {}).get('rtt') or 0,
+        'compress_ms': entry['client_meta'].get('compress_ms', 0),
+    }
+
+
+def run_policy(node, contexts):
+    proc = subprocess.run([node, '-e', _NODE_SCRIPT, POLICY_JS], input=json.dumps(contexts),
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f'Node 运行失败 (exit {proc.returncode}): {proc.stderr.strip()}')
+    return json.loads(proc.stdout)
+
+
+def cover_size(width, height, tw, th):
+    """与 upload_policy.js 的 coverSize 相同: 保持宽高比、恰好覆盖 img_size；不需要缩小时返回 None"""
+    scale = max(tw / width, th / height)
+    if scale >= 1:
+        return None
+    return max(tw, math.ceil(width * scale)), max(th, math.ceil(height * scale))
+
+
+def calibrate(detector, image_dir, limit):
+    """返回 {bytes_per_pixel, label_agreement, server_ms, images}；没有需要缩小的图片时返回空字典"""
+    names = sorted(f for f in os.listdir(image_dir) if f.lower().endswith(IMAGE_EXTS))
+    tw, th = detector.img_size
+    bpp, agree, server = [], [], []
+    for name in names:
+        if len(bpp) >= limit:
+            break
+        img = cv2.imread(os.path.join(image_dir, name), cv2.IMREAD_COLOR)
+        size = cover_size(img.shape[1], img.shape[0], tw, th) if img is not None else None
+        if size is None:
+            continue
+        # 浏览器 imageSmoothingQuality='high' 的缩小近似为区域插值
+        ok, buf = cv2.imencode('.png', cv2.resize(img, size, interpolation=cv2.INTER_AREA))
+        if not ok:
+            continue
+        bpp.append(len(buf) / (size[0] * size[1]))
+        t0 = time.perf_counter()
+        decoded = cv2.imdecode(buf, cv2.IMREAD_COLOR)
+        pred = detector.predict_image(decoded)['prediction']
+        server.append((time.perf_counter() - t0) * 1000)
+        agree.append(pred == detector.predict_image(img)['prediction'])
+    if not bpp:
+        return {}
+    return {'bytes_per_pixel': statistics.median(bpp), 'label_agreement': float(np.mean(agree)),
+            'server_ms': statistics.median(server), 'images': len(bpp)}
+
+
+def replay(entries, plans, calib, measured_server):
+    rows = []
+    for entry, plan in zip(entries, plans):
+        meta, ct = entry['client_meta'], entry['client_timing']
+        net = entry.get('network_info') or {}
+        baseline = ct['total_client_ms'] + meta.get('compress_ms', 0)
+        row = {'mode': entry.get('mode'), 'network': net.get('effectiveType') or 'unknown',
+               'plan': plan, 'baseline_ms': baseline, 'replay_ms': baseline,
+               'baseline_bytes': meta['uploaded_size'], 'replay_bytes': meta['uploaded_size']}
+        if plan.get('resize'):
+            server_ms = server_ms_of(entry)
+            transfer_ms = ct['network_ms'] - server_ms - (net.get('rtt') or 0)
+            if meta['uploaded_size'] >= MIN_SAMPLE_BYTES and transfer_ms > 1:
+                mbps = meta['uploaded_size'] * 8 / 1000 / transfer_ms
+            else:
+                mbps = plan['est_mbps']
+                transfer_ms = meta['uploaded_size'] * 8 / 1000 / mbps
+            q = calib
+            bpp = q.get('bytes_per_pixel', plan['est_bytes'] / (plan['width'] * plan['height']))
+            new_bytes = bpp * plan['width'] * plan['height']
+            new_network = ct['network_ms'] - transfer_ms + new_bytes * 8 / 1000 / mbps
+            if measured_server and 'server_ms' in q:
+                new_network += q['server_ms'] - server_ms
+            row['replay_ms'] = ct['total_client_ms'] - ct['network_ms'] + new_network + plan['est_compress_ms']
+            row['replay_bytes'] = new_bytes
+            row['observed_mbps'] = mbps
+        rows.append(row)
+    return rows
+
+
+def summarize(rows):
+    groups = defaultdict(list)
+    for r in rows:
+        groups[(r['network'], r['mode'])].append(r)
+        groups[(r['network'], 'all')].append(r)
+    summary = []
+    for (network, mode), items in sorted(groups.items()):
+        base = statistics.mean(r['baseline_ms'] for r in items)
+        new = statistics.mean(r['replay_ms'] for r in items)
+        summary.append({
+            'network': network, 'mode': mode, 'count': len(items),
+            'resized': sum(1 for r in items if r['plan'].get('resize')),
+            'baseline_ms': base, 'replay_ms': new, 'saving_ms': base - new,
+            'saving_pct': (base - new) / base * 100 if base else 0.0,
+            'baseline_kb': statistics.mean(r['baseline_bytes'] for r in items) / 1024,
+            'replay_kb': statistics.mean(r['replay_bytes'] for r in items) / 1024,
+        })
+    return summary
+
+
+def main():
+    from inference import PaintDefectDetector
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--logs', default='mobile_perf_logs.json')
+    ap.add_argument('--images', default='static/uploads', help='用于标定覆盖 img_size 的 PNG 大小、分类一致率与服务端耗时的图片目录')
+    ap.add_argument('--limit', type=int, default=50)
+    ap.add_argument('--model', default='model/svm_defect.xml')
+    ap.add_argument('--assume-dims', default='4032x3024', help='日志缺少原图尺寸时的假设值 WxH')
+    ap.add_argument('--measured-server', action='store_true', help='压缩后的服务端耗时改用标定实测值')
+    ap.add_argument('--min-agreement', type=float, default=0.99, help='启用自动压缩所需的最低标签一致率')
+    ap.add_argument('--node', default='node')
+    ap.add_argument('--out', default='output/upload_policy_replay.json')
+    args = ap.parse_args()
+
+    if shutil.which(args.node) is None:
+        raise SystemExit(f'未找到 Node.js 可执行文件: {args.node}')
+    with open(args.logs, 'r', encoding='utf-8') as f:
+        entries = [e for e in json.load(f) if e.get('client_meta') and e.get('client_timing')]
+    if not entries:
+        raise SystemExit('日志中没有可回放的记录')
+
+    detector = PaintDefectDetector(args.model)
+    assume_w, assume_h = (int(v) for v in args.assume_dims.lower().split('x'))
+    contexts = []
+    for i, e in enumerate(entries):
+        meta = e['client_meta']
+        contexts.append({
+            'width': meta.get('original_width') or assume_w,
+            'height': meta.get('original_height') or assume_h,
+            'size': meta['original_size'],
+            'mode': e.get('mode'),
+            'connection': e.get('network_info') or {},
+            'history': [history_item(p) for p in entries[:i]],
+            'targetSize': list(detector.img_size),
+        })
+    policy_out = run_policy(args.node, contexts)
+    calib = calibrate(detector, args.images, args.limit)
+
+    rows = replay(entries, policy_out['plans'], calib, args.measured_server)
+    summary = summarize(rows)
+    report = {'calibration': calib,
+              'policy_bytes_per_pixel': policy_out['bytes_per_pixel'],
+              'summary': summary, 'entries': rows}
+    os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if calib:
+        print(f'PNG 标定 ({calib["images"]} 张): {calib["bytes_per_pixel"]:.3f} B/px (策略取值 '
+              f'{policy_out["bytes_per_pixel"]}), 标签一致率 {calib["label_agreement"] * 100:.1f}%, '
+              f'服务端 {calib["server_ms"]:.1f} ms')
+    else:
+        print(f'{args.images} 中没有大于 img_size 的图片，无法标定')
+    print(f'{"网络":<10}{"模式":<16}{"条数":>6}{"压缩":>6}{"原 ms":>10}{"回放 ms":>10}{"节省":>10}{"原 KB":>10}{"新 KB":>10}')
+    for s in summary:
+        print(f'{s["network"]:<10}{s["mode"]:<16}{s["count"]:>6}{s["resized"]:>6}{s["baseline_ms"]:>10.1f}'
+              f'{s["replay_ms"]:>10.1f}{s["saving_pct"]:>9.1f}%{s["baseline_kb"]:>10.1f}{s["replay_kb"]:>10.1f}')
+    print('Saved:', args.out)
+    if not calib or calib['label_agreement'] < args.min_agreement:
+        print(f'❌ 标签一致率未达到 {args.min_agreement:.0%}，不应启用自动压缩')
+        return 1
+    print(f'✅ 标签一致率达到 {args.min_agreement:.0%}')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,95 @@
+# request_log.py
+"""服务端逐请求日志（供 replay_traffic.py 回放真实流量）
+每个推理请求（/predict、/classify）记一行紧凑 JSON，写入 output/request_log/server_requests.jsonl（按大小轮转），
+记录回放所需的全部信息: 到达时间、端点、模式、请求体大小、图片尺寸与格式、状态以及服务端分阶段耗时。例如:
+  {"received_at": 1763706369.57, "endpoint": "/predict", "mode": "auto", "bytes": 2467414, "ext": ".jpg",
+   "image_size": [4032, 3024], "ok": true, "handler_ms": 140.2, "timing": {"total_ms": 131.8, ...}}
+不记录图片内容与文件名，回放时按尺寸/大小从本地样本合成等价的图片。
+请求线程只组装记录并入队，由后台写线程落盘（与 upload_archive.py 相同），磁盘抖动不计入请求耗时；
+队列超过 max_pending 条时丢弃新记录（计入 dropped），不阻塞请求。
+"""
+
+import queue
+import threading
+import time
+
+from perf_log_store import PerfLogStore
+
+# 只保留回放和对比需要的耗时字段
+TIMING_FIELDS = ('decode_ms', 'preprocess_ms', 'roi_ms', 'cascade_ms', 'feature_ms', 'predict_ms', 'total_ms', 'endpoint_ms')
+
+
+class RequestLog:
+    def __init__(self, directory='output/request_log', max_bytes=32 * 1024 * 1024, max_files=20, max_pending=10000):
+        self.store = PerfLogStore(directory, max_bytes=max_bytes, max_files=max_files, basename='server_requests')
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = None
+        self.dropped = 0
+        self.errors = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='request-log', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        self.store.close()
+
+    def flush(self):
+        """等待队列中的记录全部落盘"""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                break
+            entry, received_at = item
+            try:
+                self.store.append([entry], received_at=received_at)
+            except OSError as e:
+                self.errors += 1
+                print(f"❌ 请求日志写入失败: {e}")
+            finally:
+                self._queue.task_done()
+
+    def record(self, received_at, endpoint, status, content_length, handler_ms, details=None):
+        """details: 模式、图片尺寸、耗时等（见 app.log_request）。记录入队后立即返回；未 start() 时同步写入"""
+        details = details or {}
+        entry = {
+            'trace_id': details.get('trace_id'),
+            'endpoint': endpoint,
+            'mode': details.get('mode'),
+            'bytes': content_length,
+            'status': status,
+            'ok': status == 200 and not details.get('error'),
+            'handler_ms': round(handler_ms, 3),
+        }
+        for key in ('executed_mode', 'line', 'ext', 'image_size', 'tiled', 'roi_enabled', 'roi', 'cascade_stage', 'prediction', 'model_version'):
+            if details.get(key) is not None:
+                entry[key] = details[key]
+        timing = details.get('timing') or {}
+        entry['timing'] = {k: round(timing[k], 3) for k in TIMING_FIELDS if timing.get(k) is not None}
+        if details.get('spans'):
+            entry['spans'] = details['spans']
+        received_at = round(received_at or time.time(), 3)
+        if self._thread is None:
+            self.store.append([entry], received_at=received_at)
+            return
+        try:
+            self._queue.put_nowait((entry, received_at))
+        except queue.Full:
+            self.dropped += 1
+
+    @property
+    def written(self):
+        return self.store.written
+
+    def files(self):
+        return self.store.files()
@@ -0,0 +1,257 @@
+# results_table.py
+"""性能日志与基准测试结果的统一列式表
+每行对应一次请求（客户端日志中的一次检测，或压测中的一个请求），列见 COLUMNS：
+阶段耗时、模式、上传大小、网络信息等。analyze_mobile_logs.py、benchmark*.py 通过 --table 写出，
+summarize_concurrency.py、visualize_logs.py 可直接读取，跨多次运行的查询无需重新解析 JSON。
+
+表以目录形式保存，每批行写成一个分片文件（part-*.parquet 或 part-*.csv.gz），可以不断追加新的运行。
+Parquet 需要 pyarrow 或 fastparquet；默认 --table-format auto 在未安装时退回 csv.gz。
+"""
+
+import glob
+import os
+import time
+
+from tracing import server_time_ms, true_network_ms
+
+# 列名 -> pandas dtype
+COLUMNS = {
+    'source': 'category',            # perf_log | benchmark
+    'run_id': 'string',
+    'timestamp': 'float64',          # Unix 秒
+    'mode': 'category',
+    'endpoint': 'category',
+    'resize_target': 'category',
+    'network_type': 'category',
+    'downlink_mbps': 'float64',
+    'rtt_ms': 'float64',
+    'concurrency': 'Int32',
+    'ok': 'boolean',
+    'original_size': 'Int64',
+    'uploaded_size': 'Int64',
+    'client_total_ms': 'float64',    # 客户端端到端耗时（压测中为单请求延迟）
+    'network_ms': 'float64',
+    'capture_ms': 'float64',
+    'compress_ms': 'float64',
+    'response_parse_ms': 'float64',
+    'feature_ms_client': 'float64',
+    'server_total_ms': 'float64',    # total_ms，缺失时取 predict_ms（与 analyze_mobile_logs 相同）
+    'endpoint_ms': 'float64',
+    'preprocess_ms': 'float64',
+    'feature_ms': 'float64',
+    'predict_ms': 'float64',
+    'trace_id': 'string',
+    'server_time_ms': 'float64',     # 服务端处理耗时（Server-Timing total，见 tracing.server_time_ms）
+    'true_network_ms': 'float64',    # network_ms - server_time_ms
+    'prediction': 'Int8',
+    'model_version': 'string',
+    'image_name': 'string',
+}
+
+TABLE_FORMATS = ('auto', 'parquet', 'csv')
+
+
+def new_run_id():
+    return time.strftime('%Y%m%d-%H%M%S') + f'-{os.getpid()}'
+
+
+def _timestamp(value):
+    """ISO 字符串 / 秒 / 毫秒 -> Unix 秒"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return value / 1000 if value > 1e11 else float(value)
+    import pandas as pd
+    try:
+        return pd.Timestamp(value).timestamp()
+    except ValueError:
+        return None
+
+
+def server_timing_columns(timing):
+    timing = timing or {}
+    return {
+        'server_total_ms': timing.get('total_ms', timing.get('predict_ms')),
+        'endpoint_ms': timing.get('endpoint_ms'),
+        'preprocess_ms': timing.get('preprocess_ms'),
+        'feature_ms': timing.get('feature_ms'),
+        'predict_ms': timing.get('predict_ms'),
+        'feature_ms_client': timing.get('feature_ms_client'),
+    }
+
+
+def perf_log_row(entry, run_id=None):
+    """客户端性能日志（mobile_perf_logs.json / /perf_logs 格式）-> 表的一行"""
+    meta = entry.get('client_meta') or {}
+    ct = entry.get('client_timing') or {}
+    net = entry.get('network_info') or {}
+    row = {
+        'source': 'perf_log',
+        'run_id': run_id,
+        'timestamp': _timestamp(entry.get('timestamp') or entry.get('received_at')),
+        'mode': entry.get('mode'),
+        'resize_target': meta.get('resize_target'),
+        'network_type': net.get('effectiveType'),
+        'downlink_mbps': net.get('downlink'),
+        'rtt_ms': net.get('rtt'),
+        'ok': entry.get('prediction') is not None,
+        'original_size': meta.get('original_size'),
+        'uploaded_size': meta.get('uploaded_size'),
+        'client_total_ms': ct.get('total_client_ms'),
+        'network_ms': ct.get('network_ms'),
+        'capture_ms': ct.get('capture_ms'),
+        'compress_ms': meta.get('compress_ms'),
+        'response_parse_ms': ct.get('response_parse_ms'),
+        'prediction': entry.get('prediction'),
+        'model_version': entry.get('model_version'),
+        'image_name': entry.get('image_name'),
+        'trace_id': entry.get('trace_id'),
+        'server_time_ms': server_time_ms(entry),
+        'true_network_ms': true_network_ms(entry),
+    }
+    row.update(server_timing_columns(entry.get('server_timing')))
+    return row
+
+
+def benchmark_row(run_id, mode, endpoint, concurrency, started, latency_ms, ok, uploaded_size=None,
+                  payload=None, resize_target=None, image_name=None):
+    """压测中的一个请求 -> 表的一行；payload 为服务端返回的 JSON（可为 None）"""
+    payload = payload if isinstance(payload, dict) else {}
+    row = {
+        'source': 'benchmark',
+        'run_id': run_id,
+        'timestamp': started,
+        'mode': mode,
+        'endpoint': endpoint,
+        'resize_target': resize_target,
+        'concurrency': concurrency,
+        'ok': ok,
+        'uploaded_size': uploaded_size,
+        'client_total_ms': latency_ms,
+        'network_ms': latency_ms,
+        'prediction': payload.get('prediction'),
+        'model_version': payload.get('model_version'),
+        'image_name': image_name,
+    }
+    row.update(server_timing_columns(payload.get('timing')))
+    return row
+
+
+def to_frame(rows):
+    """按 COLUMNS 的列顺序与类型构造 DataFrame，缺失列填空"""
+    import pandas as pd
+    return _apply_dtypes(pd.DataFrame.from_records(rows, columns=list(COLUMNS)))
+
+
+def _apply_dtypes(df):
+    import pandas as pd
+    for col in df.columns:
+        dtype = COLUMNS.get(col)
+        if dtype is None:
+            continue
+        if dtype in ('Int8', 'Int32', 'Int64'):
+            df[col] = pd.to_numeric(df[col], errors='coerce').round().astype(dtype)
+        elif dtype == 'float64':
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float64')
+        else:
+            df[col] = df[col].astype(dtype)
+    return df
+
+
+def parquet_available():
+    for engine in ('pyarrow', 'fastparquet'):
+        try:
+            __import__(engine)
+            return True
+        except ImportError:
+            pass
+    return False
+
+
+def resolve_format(fmt):
+    """auto: 有 Parquet 引擎时用 parquet，否则退回 csv(.gz) 并打印提示"""
+    if fmt not in TABLE_FORMATS:
+        raise ValueError(f'不支持的表格式: {fmt}')
+    if fmt == 'auto':
+        if parquet_available():
+            return 'parquet'
+        print('⚠️ 未安装 pyarrow / fastparquet，结果表退回 csv.gz（pip install pyarrow 后写 Parquet）')
+        return 'csv'
+    if fmt == 'parquet' and not parquet_available():
+        raise RuntimeError('写 Parquet 需要安装 pyarrow 或 fastparquet，或改用 --table-format csv')
+    return fmt
+
+
+class TableWriter:
+    """分片追加写入: 行先缓存，每满 chunk_rows 行写出一个分片文件"""
+
+    def __init__(self, directory, fmt='auto', prefix='part', chunk_rows=200_000):
+        self.directory = directory
+        self.fmt = resolve_format(fmt)
+        self.prefix = f'{prefix}-{new_run_id()}'
+        self.chunk_rows = chunk_rows
+        self.rows_written = 0
+        self._rows = []
+        self._parts = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def ext(self):
+        return '.parquet' if self.fmt == 'parquet' else '.csv.gz'
+
+    def add(self, row):
+        self._rows.append(row)
+        if len(self._rows) >= self.chunk_rows:
+            self.flush()
+
+    def extend(self, rows):
+        for row in rows:
+            self.add(row)
+
+    def flush(self):
+        if not self._rows:
+            return
+        df = to_frame(self._rows)
+        name = f'{self.prefix}-{self._parts:05d}'
+        if self.fmt == 'parquet':
+            df.to_parquet(os.path.join(self.directory, name + self.ext), index=False)
+        else:
+            df.to_csv(os.path.join(self.directory, name + self.ext), index=False)
+        self._parts += 1
+        self.rows_written += len(self._rows)
+        self._rows = []
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def table_files(paths):
+    files = []
+    for p in paths if isinstance(paths, (list, tuple)) else [paths]:
+        if os.path.isdir(p):
+            files.extend(sorted(glob.glob(os.path.join(p, '*.parquet')) + glob.glob(os.path.join(p, '*.csv.gz'))
+                                + glob.glob(os.path.join(p, '*.csv'))))
+        else:
+            files.append(p)
+    return files
+
+
+def read_table(paths, columns=None):
+    """读取一个或多个表目录 / 分片文件，合并为一个 DataFrame"""
+    import pandas as pd
+    frames = []
+    for f in table_files(paths):
+        if f.endswith('.parquet'):
+            frames.append(pd.read_parquet(f, columns=columns))
+        else:
+            frames.append(pd.read_csv(f, usecols=columns))
+    if not frames:
+        raise FileNotFoundError(f'没有找到表文件: {paths}')
+    # CSV 不带类型；各分片的类别集合不同，合并后也会退化为 object，统一按 COLUMNS 恢复
+    return _apply_dtypes(pd.concat(frames, ignore_index=True))
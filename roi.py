@@ -0,0 +1,73 @@
+# roi.py
+"""感兴趣区域（ROI）裁剪: 在完整预处理之前把画面裁到漆面区域
+手机拍摄的整板照片（如 IMG_2025*.jpg）四周有大片背景（墙面、风扇、线缆），
+原流程对整幅画面做自适应阈值、Canny、形态学和 Sobel，背景杂物还会产生伪轮廓。
+
+find_roi 在长边 128 像素的缩略图上工作，耗时与原图大小基本无关:
+从画面中心（拍摄时对准的漆面）出发做浮动容差的漫水填充，漆面内部颜色渐变平缓可以连通，
+漆面边缘的强边界会截断填充；填充区域的外接矩形（加少量边距）即 ROI。
+填充面积过小（中心是纹理/缺陷密集区，如数据集中的 512x512 近景图）或外接矩形几乎是整幅画面时不裁剪。
+
+decode_reduced 配合使用: 大尺寸 JPEG 按文件头尺寸选择 IMREAD_REDUCED_COLOR_2/4/8，
+在 DCT 阶段直接缩小解码，保证缩小后短边仍不小于模型输入边长，解码耗时显著下降。
+"""
+
+import cv2
+import numpy as np
+
+from dataset_index import image_dims
+
+ROI_SIDE = 128
+REDUCE_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+
+def decode_reduced(source, min_side):
+    """解码图片（文件路径或内存中的文件内容），尺寸允许时按 1/2、1/4、1/8 缩小解码；返回 (BGR 图像, 缩小倍数)"""
+    if isinstance(source, (bytes, bytearray)):
+        data = bytes(source)
+    else:
+        with open(source, 'rb') as f:
+            data = f.read()
+    buf = np.frombuffer(data, np.uint8)
+    dims = image_dims(data)
+    if dims is not None:
+        for factor, flag in REDUCE_FLAGS:
+            if min(dims) // factor >= min_side:
+                img = cv2.imdecode(buf, flag)
+                if img is not None:
+                    return img, factor
+                break
+    return cv2.imdecode(buf, cv2.IMREAD_COLOR), 1
+
+
+def find_roi(img, side=ROI_SIDE, diff=5, min_fill=0.3, max_area=0.9, margin=0.02):
+    """返回漆面区域 (x, y, w, h)（img 坐标）；不需要裁剪时返回 None"""
+    h, w = img.shape[:2]
+    s = side / max(h, w)
+    small = cv2.resize(img, (max(1, int(w * s)), max(1, int(h * s))), interpolation=cv2.INTER_AREA)
+    small = cv2.GaussianBlur(small, (3, 3), 0)
+    sh, sw = small.shape[:2]
+
+    # 种子取中心 5x5 邻域中最接近邻域中值的像素，避免正好落在缺陷点上
+    y0, x0 = max(0, sh // 2 - 2), max(0, sw // 2 - 2)
+    patch = small[y0:y0 + 5, x0:x0 + 5].astype(np.int32)
+    dist = np.abs(patch - np.median(patch.reshape(-1, patch.shape[2]), axis=0)).sum(axis=2)
+    py, px = np.unravel_index(int(np.argmin(dist)), dist.shape)
+    seed = (int(x0 + px), int(y0 + py))
+
+    mask = np.zeros((sh + 2, sw + 2), np.uint8)
+    cv2.floodFill(small, mask, seed, 0, (diff,) * 3, (diff,) * 3, 4 | cv2.FLOODFILL_MASK_ONLY | (255 << 8))
+    filled = cv2.morphologyEx(mask[1:-1, 1:-1], cv2.MORPH_CLOSE, np.ones((5, 5), np.uint8))
+    if np.count_nonzero(filled) < min_fill * sh * sw:
+        return None
+    x, y, bw, bh = cv2.boundingRect(filled)
+    if bw * bh >= max_area * sh * sw:
+        return None
+
+    mx, my = int(margin * sw), int(margin * sh)
+    x0, y0 = max(0, x - mx), max(0, y - my)
+    x1, y1 = min(sw, x + bw + mx), min(sh, y + bh + my)
+    # 映射回原图坐标
+    X0, Y0 = int(x0 / s), int(y0 / s)
+    X1, Y1 = min(w, int(np.ceil(x1 / s))), min(h, int(np.ceil(y1 / s)))
+    return X0, Y0, X1 - X0, Y1 - Y0
@@ -0,0 +1,112 @@
+# sliding_window.py
+"""基于积分图（summed-area table）的滑动窗口统计特征
+对整图的缺陷掩码 mask、mask²、非零像素指示以及梯度幅值各建一张积分图，
+任意窗口的 缺陷占比 / 掩码均值 / 掩码标准差 / 平均梯度幅值 都可以用 4 次查表 O(1) 得到，
+与窗口大小和重叠程度无关；对应 extract_robust_features 的后 4 维（下标 12~15）。
+
+- 缺陷占比、掩码均值与逐窗口调用 extract_robust_features 的结果完全一致（整数和精确表示）；
+  标准差用 E[x²]-E[x]² 计算，与 np.std 的两遍算法只有浮点舍入差（~1e-12）。
+- 梯度幅值由整图 Sobel 一次算出，与 extract_robust_features(..., gradient_magnitude=整图梯度视图)
+  一致；若对窗口裁剪后再做 Sobel，窗口边缘一像素会因边界填充方式不同而略有差异。
+
+示例（输出缺陷占比热力图）:
+    python sliding_window.py --image static/uploads/0576.PNG --window 64 --stride 16 --out output/heatmap.png
+"""
+
+import argparse
+
+import cv2
+import numpy as np
+
+# 统计特征在 extract_robust_features 输出中的位置
+STAT_FEATURE_SLICE = slice(12, 16)
+
+
+class SlidingWindowFeatures:
+    def __init__(self, mask, gradient_magnitude):
+        mask = np.ascontiguousarray(mask)
+        self.height, self.width = mask.shape[:2]
+        # 积分图比原图多一行一列，ii[y, x] = sum(img[:y, :x])
+        self.sum, self.sqsum = cv2.integral2(mask, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+        self.nonzero = cv2.integral((mask > 0).astype(np.uint8), sdepth=cv2.CV_32S)
+        self.grad = cv2.integral(np.ascontiguousarray(gradient_magnitude, dtype=np.float64),
+                                 sdepth=cv2.CV_64F)
+
+    @staticmethod
+    def _box(table, x, y, w, h):
+        """向量化窗口求和: x/y 可为数组"""
+        return table[y + h, x + w] - table[y, x + w] - table[y + h, x] + table[y, x]
+
+    def features(self, xs, ys, w, h):
+        """返回 (N, 4): [缺陷占比, 掩码均值/255, 掩码标准差/255, 平均梯度*1e-3]，与特征向量后 4 维同序"""
+        xs = np.asarray(xs, dtype=np.intp)
+        ys = np.asarray(ys, dtype=np.intp)
+        area = float(w * h)
+        nonzero = self._box(self.nonzero, xs, ys, w, h)
+        s = self._box(self.sum, xs, ys, w, h)
+        sq = self._box(self.sqsum, xs, ys, w, h)
+        g = self._box(self.grad, xs, ys, w, h)
+        mean = s / area
+        var = np.maximum(sq / area - mean * mean, 0.0)
+        return np.stack([nonzero / area, mean / 255.0, np.sqrt(var) / 255.0, (g / area) * 1e-3], axis=1)
+
+    def window_features(self, x, y, w, h):
+        return self.features([x], [y], w, h)[0]
+
+    def grid(self, w, h, stride):
+        """按步长遍历所有完整窗口，返回 (xs, ys, features)"""
+        xs = np.arange(0, self.width - w + 1, stride)
+        ys = np.arange(0, self.height - h + 1, stride)
+        gx, gy = np.meshgrid(xs, ys)
+        return gx.ravel(), gy.ravel(), self.features(gx.ravel(), gy.ravel(), w, h)
+
+    def heatmap(self, w, h, stride, column=0):
+        """以网格形式返回某一统计特征（默认缺陷占比），形状 (行数, 列数)"""
+        xs = np.arange(0, self.width - w + 1, stride)
+        ys = np.arange(0, self.height - h + 1, stride)
+        _, _, feats = self.grid(w, h, stride)
+        return feats[:, column].reshape(len(ys), len(xs))
+
+
+def main():
+    from inference import PaintDefectDetector
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--image', required=True)
+    ap.add_argument('--window', type=int, default=64)
+    ap.add_argument('--stride', type=int, default=16)
+    ap.add_argument('--out', default='output/heatmap.png')
+    ap.add_argument('--verify', type=int, default=20, help='随机抽取若干窗口与 extract_robust_features 对比')
+    args = ap.parse_args()
+
+    det = PaintDefectDetector()
+    gray, mask = det.enhanced_preprocess(args.image)
+    if gray is None:
+        print('无法读取图片')
+        return
+    grad = det.gradient_magnitude(gray)
+    swf = SlidingWindowFeatures(mask, grad)
+
+    w = h = args.window
+    rng = np.random.default_rng(0)
+    max_diff = 0.0
+    for _ in range(args.verify):
+        x = int(rng.integers(0, swf.width - w + 1))
+        y = int(rng.integers(0, swf.height - h + 1))
+        ref = det.extract_robust_features(gray[y:y + h, x:x + w], mask[y:y + h, x:x + w],
+                                          grad[y:y + h, x:x + w])[STAT_FEATURE_SLICE]
+        max_diff = max(max_diff, float(np.abs(ref - swf.window_features(x, y, w, h)).max()))
+    print(f'与 extract_robust_features 的最大差异 ({args.verify} 个窗口): {max_diff:.3e}')
+
+    heat = swf.heatmap(w, h, args.stride)
+    print(f'热力图: {heat.shape[1]}x{heat.shape[0]} 个窗口, 最大缺陷占比 {heat.max():.3f}')
+    vis = cv2.resize((heat / max(heat.max(), 1e-6) * 255).astype(np.uint8), (swf.width, swf.height),
+                     interpolation=cv2.INTER_NEAREST)
+    vis = cv2.addWeighted(cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR), 0.5,
+                          cv2.applyColorMap(vis, cv2.COLORMAP_JET), 0.5, 0)
+    cv2.imwrite(args.out, vis)
+    print('Saved:', args.out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""冷启动分析
+1. 用 `python -X importtime` 统计导入 app 时各模块的累计导入耗时，输出最慢的若干项；
+2. 在全新子进程中分别测量 XML 模型与 .npz 快照两种方式的 "进程启动 -> 首次预测" 耗时。
+
+示例:
+    python startup_profile.py --top 15 --runs 5 --out output/startup_profile.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# 子进程中执行: 导入检测器 -> 加载模型 -> 预测一条特征，分别记录耗时
+_TTFP_SCRIPT = r'''
+import json, sys, time
+t0 = time.perf_counter()
+from inference import PaintDefectDetector
+t1 = time.perf_counter()
+det = PaintDefectDetector(sys.argv[1])
+t2 = time.perf_counter()
+det.classify_features([0.0] * det.model.getVarCount())
+t3 = time.perf_counter()
+print(json.dumps({'import_ms': (t1 - t0) * 1000, 'load_ms': (t2 - t1) * 1000,
+                  'first_predict_ms': (t3 - t2) * 1000, 'total_ms': (t3 - t0) * 1000}))
+'''
+
+
+def profile_imports(module, top):
+    """解析 -X importtime 输出，返回按累计耗时排序的 (模块, 自身us, 累计us)"""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                          capture_output=True, text=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3:
+            continue
+        rows.append((parts[2].strip(), int(parts[0]), int(parts[1])))
+    rows.sort(key=lambda r: r[2], reverse=True)
+    return rows[:top]
+
+
+def time_to_first_prediction(model_path, runs):
+    samples = []
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, '-c', _TTFP_SCRIPT, model_path],
+                              capture_output=True, text=True, check=True)
+        samples.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    keys = samples[0].keys()
+    return {k: sorted(s[k] for s in samples)[len(samples) // 2] for k in keys}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--module', default='app', help='分析导入耗时的模块')
+    ap.add_argument('--top', type=int, default=15)
+    ap.add_argument('--runs', type=int, default=5, help='每种模型格式的子进程重复次数（取中位数）')
+    ap.add_argument('--root', default='model', help='模型注册表目录')
+    ap.add_argument('--out', default=None, help='可选: 结果写入 JSON')
+    args = ap.parse_args()
+
+    print(f'=== 导入耗时 (import {args.module}) Top {args.top} ===')
+    imports = profile_imports(args.module, args.top)
+    for name, self_us, cum_us in imports:
+        print(f'{cum_us / 1000:9.1f} ms  (self {self_us / 1000:7.1f} ms)  {name}')
+
+    from model_registry import ModelRegistry
+    registry = ModelRegistry(args.root, default_model=os.path.join(args.root, 'svm_defect.xml'))
+    xml_path, version = registry.verified_path(prefer_snapshot=False)
+    npz_path, _ = registry.verified_path(prefer_snapshot=True)
+
+    results = {'version': version, 'imports': [
+        {'module': n, 'self_us': s, 'cumulative_us': c} for n, s, c in imports]}
+    print(f'\n=== 首次预测耗时 (模型版本 {version}, {args.runs} 次中位数, ms) ===')
+    for label, path in (('xml', xml_path), ('snapshot', npz_path)):
+        if label == 'snapshot' and path == xml_path:
+            print('snapshot: 该版本没有快照')
+            continue
+        r = time_to_first_prediction(path, args.runs)
+        results[label] = r
+        print(f"{label:9s} import={r['import_ms']:.1f} load={r['load_ms']:.1f} "
+              f"first_predict={r['first_predict_ms']:.2f} total={r['total_ms']:.1f}")
+
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print('Saved:', args.out)
+
+
+if __name__ == '__main__':
+    main()
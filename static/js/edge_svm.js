@@ -0,0 +1,68 @@
+// 端侧 SVM 推理：加载服务端 /model/edge.json 导出的紧凑模型（model_snapshot.export_edge_model），
+// 与 features.js 配合实现完全离线的分类。决策值计算与 model_snapshot.SnapshotSVM 相同
+// 同时用于页面（<script>）与 Node 环境（require）
+(function (root) {
+    function decodeBase64(b64) {
+        if (typeof Buffer !== 'undefined') {
+            const buf = Buffer.from(b64, 'base64');
+            return buf.buffer.slice(buf.byteOffset, buf.byteOffset + buf.byteLength);
+        }
+        const bin = atob(b64);
+        const bytes = new Uint8Array(bin.length);
+        for (let i = 0; i < bin.length; i++) bytes[i] = bin.charCodeAt(i);
+        return bytes.buffer;
+    }
+
+    class EdgeSVM {
+        constructor(spec) {
+            if (spec.format !== 'paintdefect-svm') throw new Error('未知的模型格式: ' + spec.format);
+            this.modelVersion = spec.model_version;
+            this.schemaVersion = spec.schema_version;
+            this.kernel = spec.kernel;
+            this.gamma = spec.gamma;
+            this.rho = spec.rho;
+            this.varCount = spec.var_count;
+            this.svCount = spec.sv_count;
+            this.classLabels = spec.class_labels;
+            this.sv = new Float32Array(decodeBase64(spec.support_vectors));
+            this.alpha = new Float64Array(decodeBase64(spec.alpha));
+            if (this.sv.length !== this.svCount * this.varCount || this.alpha.length !== this.svCount) {
+                throw new Error('模型数据长度不一致');
+            }
+        }
+
+        decision(features) {
+            if (features.length !== this.varCount) {
+                throw new Error(`特征维度不匹配: 期望 ${this.varCount}, 实际 ${features.length}`);
+            }
+            const d = this.varCount;
+            let sum = 0;
+            for (let i = 0; i < this.svCount; i++) {
+                const off = i * d;
+                let k = 0;
+                if (this.kernel === 'rbf') {
+                    for (let j = 0; j < d; j++) { const t = features[j] - this.sv[off + j]; k += t * t; }
+                    k = Math.exp(-this.gamma * k);
+                } else {
+                    for (let j = 0; j < d; j++) k += features[j] * this.sv[off + j];
+                }
+                sum += this.alpha[i] * k;
+            }
+            return sum - this.rho;
+        }
+
+        predict(features) {
+            const df = this.decision(features);
+            // 与 OpenCV 约定一致: 决策值 > 0 -> class_labels[0]
+            const prediction = df > 0 ? this.classLabels[0] : this.classLabels[1];
+            return { prediction, decision: df, model_version: this.modelVersion };
+        }
+    }
+
+    const api = { EdgeSVM };
+    if (typeof module !== 'undefined' && module.exports) {
+        module.exports = api;
+    } else {
+        root.EdgeSVM = EdgeSVM;
+    }
+})(typeof self !== 'undefined' ? self : this);
@@ -0,0 +1,79 @@
+// 特征提取 Web Worker：在后台线程加载 OpenCV.js 并提取特征，UI 线程不被阻塞
+// 优先加载本地 /static/vendor/opencv.js（由 fetch_opencv_js.py 下载，Service Worker 预缓存），缺失时回退 CDN
+const OPENCV_SOURCES = ['/static/vendor/opencv.js', 'https://docs.opencv.org/4.x/opencv.js'];
+
+importScripts('/static/js/features.js');
+
+let cvReady = null;
+
+function loadOpenCv() {
+    if (cvReady) return cvReady;
+    cvReady = new Promise((resolve, reject) => {
+        let lastError = null;
+        for (const src of OPENCV_SOURCES) {
+            try {
+                importScripts(src);
+                break;
+            } catch (e) {
+                lastError = e;
+            }
+        }
+        if (typeof cv === 'undefined') {
+            reject(lastError || new Error('OpenCV.js 加载失败'));
+            return;
+        }
+        // 新版 opencv.js 导出的是 Promise/工厂，旧版在 onRuntimeInitialized 后可用
+        if (cv instanceof Promise) {
+            cv.then(m => { self.cv = m; resolve(m); });
+        } else if (cv.Mat) {
+            resolve(cv);
+        } else {
+            cv.onRuntimeInitialized = () => resolve(cv);
+        }
+    });
+    return cvReady;
+}
+
+async function decode(msg) {
+    if (msg.imageData) return msg.imageData;
+    // Worker 内解码：createImageBitmap + OffscreenCanvas
+    const bitmap = await createImageBitmap(msg.blob);
+    const canvas = new OffscreenCanvas(bitmap.width, bitmap.height);
+    const ctx = canvas.getContext('2d');
+    ctx.drawImage(bitmap, 0, 0);
+    bitmap.close();
+    return ctx.getImageData(0, 0, canvas.width, canvas.height);
+}
+
+self.onmessage = async (ev) => {
+    const msg = ev.data;
+    try {
+        const cvm = await loadOpenCv();
+        const t0 = performance.now();
+        const imageData = await decode(msg);
+        const mat = cvm.matFromImageData(imageData);
+        let features, gray;
+        try {
+            if (msg.kind === 'gray') {
+                // gray_upload: 只缩放并转灰度，特征仍由服务端提取
+                gray = PaintFeatures.grayPixels(cvm, mat, msg.width, msg.height);
+            } else {
+                features = PaintFeatures.extractFeatures(cvm, mat);
+            }
+        } finally {
+            mat.delete();
+        }
+        if (gray) {
+            self.postMessage({ id: msg.id, gray: gray.buffer, width: msg.width, height: msg.height }, [gray.buffer]);
+            return;
+        }
+        self.postMessage({ id: msg.id, features, feature_ms: performance.now() - t0 });
+    } catch (e) {
+        self.postMessage({ id: msg.id, error: e.message || String(e) });
+    }
+};
+
+loadOpenCv().then(
+    () => self.postMessage({ type: 'ready', schema_version: PaintFeatures.SCHEMA_VERSION }),
+    (e) => self.postMessage({ type: 'load_error', error: e.message || String(e) })
+);
@@ -0,0 +1,100 @@
+// 端侧特征提取（OpenCV.js），与 inference.py 的 enhanced_preprocess + extract_robust_features 对应
+// 同时用于 Web Worker（importScripts）与 Node 环境（require）
+(function (root) {
+    const TARGET_SIZE = 512;
+    // 特征格式版本，需与 inference.py 的 FEATURE_SCHEMA_VERSION 保持一致；
+    // 特征顺序或计算方式变化时递增，服务端据此拒绝旧客户端的特征
+    const SCHEMA_VERSION = 1;
+
+    // 与服务端 gray_image 相同: 先缩放再转灰度；输入为 RGBA（服务端 imread 为 BGR），
+    // 通道顺序必须按 RGBA 解释，否则 R/B 权重对调
+    function resizeGray(cv, rgba, width, height, resized) {
+        cv.resize(rgba, resized, new cv.Size(width, height));
+        let gray = new cv.Mat(); cv.cvtColor(resized, gray, cv.COLOR_RGBA2GRAY);
+        return gray;
+    }
+
+    // gray_upload 模式的上传内容: 缩放到服务端模型输入尺寸的灰度像素（Uint8Array，逐行）
+    function grayPixels(cv, rgba, width, height) {
+        let resized = new cv.Mat();
+        let gray = resizeGray(cv, rgba, width, height, resized);
+        const pixels = new Uint8Array(gray.data);
+        resized.delete(); gray.delete();
+        return pixels;
+    }
+
+    // rgba: 4 通道 cv.Mat（cv.imread / cv.matFromImageData 的输出）
+    function extractFeatures(cv, rgba) {
+        let resized = new cv.Mat();
+        let gray = resizeGray(cv, rgba, TARGET_SIZE, TARGET_SIZE, resized);
+        // adaptive threshold
+        let binary = new cv.Mat();
+        cv.adaptiveThreshold(gray, binary, 255, cv.ADAPTIVE_THRESH_MEAN_C, cv.THRESH_BINARY_INV, 15, 8);
+        // edges
+        let edges = new cv.Mat(); cv.Canny(gray, edges, 50, 150);
+        let combined = new cv.Mat(); cv.bitwise_or(binary, edges, combined);
+        let kernel = cv.getStructuringElement(cv.MORPH_ELLIPSE, new cv.Size(3,3));
+        let cleaned = new cv.Mat();
+        cv.morphologyEx(combined, cleaned, cv.MORPH_OPEN, kernel);
+        // Hu moments (OpenCV.js 需要输出 Mat 作为第二个参数)
+        // binaryImage=false 与服务端 cv2.moments(mask) 一致：掩码取值 0/255，Hu 矩对灰度缩放不具不变性
+        const moments = cv.moments(cleaned, false);
+        let hu = new cv.Mat();
+        cv.HuMoments(moments, hu);
+        let features = [];
+        for(let i=0;i<7;i++){
+            const h = hu.doubleAt(i,0);
+            features.push(h!==0 ? -Math.sign(h)*Math.log10(Math.abs(h)) : 0);
+        }
+        // contours
+        let cnts = new cv.MatVector(); let hierarchy = new cv.Mat();
+        cv.findContours(cleaned, cnts, hierarchy, cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE);
+        let contourData=[];
+        for(let i=0;i<cnts.size();i++){
+            const c = cnts.get(i); const area=cv.contourArea(c);
+            if(area>=10){ contourData.push({area, perimeter: cv.arcLength(c,true)}); }
+            c.delete();
+        }
+        contourData.sort((a,b)=>b.area-a.area);
+        const top=contourData.slice(0,3);
+        if(top.length){
+            const totalArea=top.reduce((s,x)=>s+x.area,0);
+            const maxArea=top[0].area;
+            const totalPer=top.reduce((s,x)=>s+x.perimeter,0);
+            const count=top.length;
+            features.push(totalArea*1e-4);
+            features.push(maxArea*1e-4);
+            features.push(totalArea/(TARGET_SIZE*TARGET_SIZE));
+            features.push(count);
+            features.push(totalPer*1e-2);
+        } else { features.push(0,0,0,0,0); }
+        // defect ratio
+        const nonZero = cv.countNonZero(cleaned);
+        features.push(nonZero/(cleaned.rows*cleaned.cols));
+        // mean/std of mask
+        let mean = new cv.Mat(); let stddev = new cv.Mat();
+        cv.meanStdDev(cleaned, mean, stddev);
+        features.push(mean.doubleAt(0,0)/255.0);
+        features.push(stddev.doubleAt(0,0)/255.0);
+        // gradient magnitude mean：直接遍历 Float64Array，避免逐像素 doubleAt 调用
+        let sobelx = new cv.Mat(); let sobely = new cv.Mat();
+        cv.Sobel(gray, sobelx, cv.CV_64F, 1,0,3);
+        cv.Sobel(gray, sobely, cv.CV_64F, 0,1,3);
+        const gxs = sobelx.data64F; const gys = sobely.data64F;
+        let gradSum=0;
+        for(let i=0;i<gxs.length;i++){
+            gradSum += Math.sqrt(gxs[i]*gxs[i]+gys[i]*gys[i]);
+        }
+        features.push((gradSum/gxs.length)*1e-3);
+        // cleanup
+        [resized,gray,binary,edges,combined,kernel,cleaned,hu,cnts,hierarchy,mean,stddev,sobelx,sobely].forEach(m=>{ try{ m.delete(); }catch(e){} });
+        return features;
+    }
+
+    const api = { extractFeatures, grayPixels, TARGET_SIZE, SCHEMA_VERSION };
+    if (typeof module !== 'undefined' && module.exports) {
+        module.exports = api;
+    } else {
+        root.PaintFeatures = api;
+    }
+})(typeof self !== 'undefined' ? self : this);
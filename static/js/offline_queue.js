@@ -0,0 +1,82 @@
+// 离线结果队列：端侧推理结果与性能日志先写入 IndexedDB，联网后分批提交到 /sync_batch
+// 同步成功（服务端确认 client_id）后才从队列删除；失败保留，下次联网时重试
+(function (root) {
+    const DB_NAME = 'paintdefect';
+    const STORE = 'pending_results';
+    const BATCH_SIZE = 50;
+
+    let dbPromise = null;
+
+    function openDb() {
+        if (dbPromise) return dbPromise;
+        dbPromise = new Promise((resolve, reject) => {
+            const req = indexedDB.open(DB_NAME, 1);
+            req.onupgradeneeded = () => {
+                req.result.createObjectStore(STORE, { keyPath: 'client_id' });
+            };
+            req.onsuccess = () => resolve(req.result);
+            req.onerror = () => reject(req.error);
+        });
+        return dbPromise;
+    }
+
+    function tx(mode, fn) {
+        return openDb().then(db => new Promise((resolve, reject) => {
+            const t = db.transaction(STORE, mode);
+            const result = fn(t.objectStore(STORE));
+            t.oncomplete = () => resolve(result && 'result' in result ? result.result : undefined);
+            t.onerror = () => reject(t.error);
+        }));
+    }
+
+    function newClientId() {
+        if (root.crypto && root.crypto.randomUUID) return root.crypto.randomUUID();
+        return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2);
+    }
+
+    function enqueue(record) {
+        const item = Object.assign({ client_id: newClientId(), queued_at: new Date().toISOString() }, record);
+        return tx('readwrite', store => store.put(item)).then(() => item);
+    }
+
+    function count() {
+        return tx('readonly', store => store.count());
+    }
+
+    function peek(limit) {
+        return tx('readonly', store => store.getAll(null, limit));
+    }
+
+    function remove(ids) {
+        return tx('readwrite', store => { ids.forEach(id => store.delete(id)); });
+    }
+
+    let syncing = null;
+
+    // 分批提交直到队列为空或出错；返回本次同步成功的条数。并发调用复用同一次同步
+    function sync(endpoint) {
+        if (syncing) return syncing;
+        syncing = (async () => {
+            let synced = 0;
+            while (true) {
+                const batch = await peek(BATCH_SIZE);
+                if (!batch.length) break;
+                const resp = await fetch(endpoint || '/sync_batch', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ records: batch })
+                });
+                if (!resp.ok) throw new Error('同步失败: HTTP ' + resp.status);
+                const body = await resp.json();
+                const accepted = body.accepted || [];
+                if (!accepted.length) throw new Error(body.error || '服务端未接受任何记录');
+                await remove(accepted);
+                synced += accepted.length;
+            }
+            return synced;
+        })().finally(() => { syncing = null; });
+        return syncing;
+    }
+
+    root.OfflineQueue = { enqueue, count, peek, remove, sync };
+})(typeof self !== 'undefined' ? self : this);
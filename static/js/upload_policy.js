@@ -0,0 +1,78 @@
+// 自适应上传压缩策略：根据实测带宽（最近上传的 network_ms）与 navigator.connection 决定是否在上传前缩小图片
+// 只做保持宽高比的缩小（缩到恰好覆盖 img_size，最终缩放仍由服务端完成），并用无损 PNG 编码：
+// JPEG 重编码在 static/uploads 上任何质量下都有约 20% 的预测翻转（replay_upload_policy.py 标定），不再使用
+// 同时用于页面（<script>）与 Node 环境（replay_upload_policy.py 回放 mobile_perf_logs.json）
+(function (root) {
+    const DEFAULT_TARGET = [512, 512];
+    // 无历史、无 downlink 时按 effectiveType 取的保守带宽（Mbps）
+    const EFFECTIVE_TYPE_MBPS = { 'slow-2g': 0.05, '2g': 0.25, '3g': 1.5, '4g': 8 };
+    const DEFAULT_MBPS = 4;
+    // 缩小后 PNG 每像素字节数（static/uploads 的整板照片实测约 1.05，偏保守取值，可用回放脚本重新标定）
+    const PNG_BYTES_PER_PIXEL = 1.2;
+    const DEFAULT_COMPRESS_MS = 40;
+    // 小于该大小的上传主要受 RTT 影响，不参与带宽估计
+    const MIN_SAMPLE_BYTES = 50000;
+    const HISTORY_WINDOW = 5;
+
+    function median(values) {
+        const s = values.slice().sort((a, b) => a - b);
+        const m = s.length >> 1;
+        return s.length % 2 ? s[m] : (s[m - 1] + s[m]) / 2;
+    }
+
+    // history: [{uploaded_size, network_ms, server_ms, rtt, compress_ms}]，按时间顺序
+    function estimateMbps(connection, history) {
+        const samples = [];
+        for (const h of (history || []).slice(-HISTORY_WINDOW)) {
+            // fetch 耗时包含服务端处理与一次往返，扣除后才是纯传输时间
+            const transferMs = h.network_ms - (h.server_ms || 0) - (h.rtt || 0);
+            if (h.uploaded_size >= MIN_SAMPLE_BYTES && transferMs > 1) {
+                samples.push(h.uploaded_size * 8 / 1000 / transferMs);
+            }
+        }
+        if (samples.length) return { mbps: median(samples), source: 'history' };
+        if (connection && connection.downlink > 0) return { mbps: connection.downlink, source: 'downlink' };
+        if (connection && EFFECTIVE_TYPE_MBPS[connection.effectiveType]) {
+            return { mbps: EFFECTIVE_TYPE_MBPS[connection.effectiveType], source: 'effective_type' };
+        }
+        return { mbps: DEFAULT_MBPS, source: 'default' };
+    }
+
+    // 保持宽高比、恰好覆盖 targetSize 的尺寸（服务端再缩放到 targetSize）；已经不大于它时返回 null
+    function coverSize(width, height, tw, th) {
+        const scale = Math.max(tw / width, th / height);
+        if (scale >= 1) return null;
+        return [Math.max(tw, Math.ceil(width * scale)), Math.max(th, Math.ceil(height * scale))];
+    }
+
+    // ctx: {width, height, size, mode, connection, history, targetSize}
+    // 返回 {resize, width, height, format, reason, est_mbps, bandwidth_source, est_bytes, saved_ms}
+    function chooseUploadPlan(ctx) {
+        const [tw, th] = ctx.targetSize || DEFAULT_TARGET;
+        const { mbps, source } = estimateMbps(ctx.connection, ctx.history);
+        const plan = { resize: false, est_mbps: mbps, bandwidth_source: source };
+        // classify_only / edge 只在本地提特征，不上传图片；重编码反而会改变特征
+        if (ctx.mode === 'classify_only' || ctx.mode === 'edge') return Object.assign(plan, { reason: 'features_only' });
+        // gray_upload 自己在端侧缩放并转灰度
+        if (ctx.mode === 'gray_upload') return Object.assign(plan, { reason: 'gray_upload' });
+        const size = coverSize(ctx.width, ctx.height, tw, th);
+        if (!size) return Object.assign(plan, { reason: 'already_small' });
+
+        const [width, height] = size;
+        const estBytes = Math.round(width * height * PNG_BYTES_PER_PIXEL);
+        const savedMs = (ctx.size - estBytes) * 8 / 1000 / mbps;
+        const compressSamples = (ctx.history || []).filter(h => h.compress_ms > 0).map(h => h.compress_ms);
+        const compressMs = compressSamples.length ? median(compressSamples) : DEFAULT_COMPRESS_MS;
+        Object.assign(plan, { format: 'png', est_bytes: estBytes, saved_ms: savedMs, est_compress_ms: compressMs });
+        // 快网络下省下的传输时间不足以抵消客户端重编码耗时，则直接上传原图
+        if (savedMs <= compressMs) return Object.assign(plan, { reason: 'not_worth' });
+        return Object.assign(plan, { resize: true, width, height, reason: 'bandwidth' });
+    }
+
+    const api = { chooseUploadPlan, estimateMbps, coverSize, PNG_BYTES_PER_PIXEL, DEFAULT_TARGET };
+    if (typeof module !== 'undefined' && module.exports) {
+        module.exports = api;
+    } else {
+        root.UploadPolicy = api;
+    }
+})(typeof self !== 'undefined' ? self : this);
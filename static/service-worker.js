@@ -1,14 +1,68 @@
+const CACHE_NAME = 'paintdefect-v6';
+// 核心资源：安装时必须全部缓存成功
+const CORE_ASSETS = [
+  '/',
+  '/static/manifest.json',
+  '/static/js/features.js',
+  '/static/js/upload_policy.js',
+  '/static/js/edge_svm.js',
+  '/static/js/offline_queue.js',
+  '/static/js/feature_worker.js'
+];
+// 可选资源：本地 OpenCV.js 体积较大且需另行下载 (fetch_opencv_js.py)，缺失时不影响安装
+const OPTIONAL_ASSETS = [
+  '/static/vendor/opencv.js'
+];
+
 self.addEventListener('install', event => {
   event.waitUntil(
-    caches.open('paintdefect-v1').then(cache => cache.addAll([
-      '/',
-      '/templates/index.html'
-    ]))
+    caches.open(CACHE_NAME).then(cache =>
+      cache.addAll(CORE_ASSETS).then(() =>
+        Promise.all(OPTIONAL_ASSETS.map(url => cache.add(url).catch(() => {})))
+      )
+    ).then(() => self.skipWaiting())
+  );
+});
+
+self.addEventListener('activate', event => {
+  // 清理旧版本缓存
+  event.waitUntil(
+    caches.keys().then(keys => Promise.all(
+      keys.filter(k => k !== CACHE_NAME).map(k => caches.delete(k))
+    )).then(() => self.clients.claim())
   );
 });
 
 self.addEventListener('fetch', event => {
+  if (event.request.method !== 'GET') return;
+  const url = new URL(event.request.url);
+  if (url.origin === self.location.origin && url.pathname.startsWith('/static/')) {
+    // 静态资源 cache-first，未命中时取网络并写入缓存
+    event.respondWith(
+      caches.match(event.request).then(resp => resp || fetch(event.request).then(net => {
+        if (net.ok) {
+          const copy = net.clone();
+          caches.open(CACHE_NAME).then(cache => cache.put(event.request, copy));
+        }
+        return net;
+      }))
+    );
+    return;
+  }
+  if (url.origin === self.location.origin && url.pathname === '/model/edge.json') {
+    // 端侧模型 network-first：在线时总是拿到当前版本，离线时使用最近一次缓存的版本
+    event.respondWith(
+      fetch(event.request).then(net => {
+        if (net.ok) {
+          const copy = net.clone();
+          caches.open(CACHE_NAME).then(cache => cache.put(event.request, copy));
+        }
+        return net;
+      }).catch(() => caches.match(event.request))
+    );
+    return;
+  }
   event.respondWith(
     caches.match(event.request).then(resp => resp || fetch(event.request))
   );
-});
\ No newline at end of file
+});
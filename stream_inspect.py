@@ -0,0 +1,209 @@
+# stream_inspect.py
+"""视频流 / 摄像头连续检测
+客户端不断 POST 帧（JPEG 字节），服务端每个会话只保留 "最新一帧" 的槽位：
+检测线程处理不过来时，旧帧直接被新帧覆盖丢弃，而不是排队积压。
+处理前先做低成本的帧间变化检测（64×64 灰度缩略图的平均绝对差），
+画面基本没变时直接复用上一帧的检测结果，只有变化明显的帧才走完整流水线。
+完整流水线交给推理线程池执行（submit，通常为 InferenceExecutor.submit），与 /predict 共用同一并行度上限；
+会话线程只负责取帧和等待结果。
+结果通过 Server-Sent Events（分块 HTTP）按产生顺序推送给客户端。
+
+接口（见 app.py）:
+    POST /stream/start              -> {"session_id": ...}
+    POST /stream/<id>/frame         请求体为 JPEG 字节，立即返回，不等待检测
+    GET  /stream/<id>/events        text/event-stream，每条检测结果一个事件；每个会话同时只允许一个订阅者
+    POST /stream/<id>/stop
+"""
+
+import json
+import queue
+import threading
+import time
+import uuid
+
+import cv2
+import numpy as np
+
+THUMB_SIZE = (64, 64)
+
+
+class StreamSession:
+    def __init__(self, detector, change_threshold=3.0, max_pending_events=32, submit=None):
+        self.session_id = uuid.uuid4().hex
+        self.detector = detector
+        self.submit = submit
+        self.change_threshold = change_threshold
+        self.created = time.time()
+        self.last_active = self.created
+
+        self._cond = threading.Condition()
+        self._slot = None            # (seq, bytes, 接收时刻)，只保留最新一帧
+        self._seq = 0
+        self._closed = False
+        self._events = queue.Queue(maxsize=max_pending_events)
+        self._subscribed = False     # 事件队列只有一份，多个订阅者会互相抢走事件，因此只允许一个
+
+        self._last_thumb = None
+        self._last_result = None
+        self.stats = {'received': 0, 'processed': 0, 'reused': 0, 'dropped': 0, 'events_dropped': 0}
+
+        self._thread = threading.Thread(target=self._run, name=f'stream-{self.session_id[:8]}', daemon=True)
+        self._thread.start()
+
+    def push_frame(self, data):
+        """放入一帧；若上一帧尚未被处理则将其丢弃。返回 (seq, 是否覆盖了旧帧)"""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('会话已关闭')
+            self._seq += 1
+            replaced = self._slot is not None
+            if replaced:
+                self.stats['dropped'] += 1
+            self._slot = (self._seq, data, time.perf_counter())
+            self.stats['received'] += 1
+            self.last_active = time.time()
+            self._cond.notify()
+            return self._seq, replaced
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._publish(None)
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def _publish(self, event):
+        # 订阅端跟不上时丢弃最旧的事件，保证推送的总是较新的结果
+        while True:
+            try:
+                self._events.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self._events.get_nowait()
+                    self.stats['events_dropped'] += 1
+                except queue.Empty:
+                    pass
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._slot is None and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                seq, data, received_at = self._slot
+                self._slot = None
+            try:
+                self._publish(self._process(seq, data, received_at))
+            except Exception as e:
+                self._publish({'seq': seq, 'error': f'帧处理失败: {e}'})
+
+    def _process(self, seq, data, received_at):
+        t0 = time.perf_counter()
+        img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            return {'seq': seq, 'error': '无法解码帧'}
+        thumb = cv2.cvtColor(cv2.resize(img, THUMB_SIZE, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        change = None
+        if self._last_thumb is not None:
+            change = float(cv2.absdiff(thumb, self._last_thumb).mean())
+
+        if change is not None and change < self.change_threshold and self._last_result is not None:
+            result = dict(self._last_result)
+            result['reused'] = True
+            self.stats['reused'] += 1
+        else:
+            if self.submit is not None:
+                result = self.submit(self.detector.predict_image, img, with_timing=True, started=t0).result()
+            else:
+                result = self.detector.predict_image(img, with_timing=True, started=t0)
+            result['reused'] = False
+            self._last_thumb = thumb
+            self._last_result = {k: v for k, v in result.items() if k != 'timing'}
+            self.stats['processed'] += 1
+        t1 = time.perf_counter()
+
+        result['seq'] = seq
+        result['change'] = change
+        result['queue_ms'] = (t0 - received_at) * 1000
+        result['latency_ms'] = (t1 - received_at) * 1000
+        result['stats'] = dict(self.stats)
+        return result
+
+    def subscribe(self, keepalive_s=10.0):
+        """登记订阅者并返回 SSE 事件生成器；会话已关闭或已有订阅者时抛出 RuntimeError。
+        订阅者断开（生成器被关闭）后可以重新订阅"""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('会话已关闭')
+            if self._subscribed:
+                raise RuntimeError('该会话已有订阅者')
+            self._subscribed = True
+        stream = self._event_stream(keepalive_s)
+        next(stream)  # 先进入 try 块: 之后无论是否开始迭代，生成器被关闭或回收时都会释放订阅
+        return stream
+
+    def _event_stream(self, keepalive_s):
+        """SSE 事件生成器；会话关闭后结束"""
+        try:
+            yield None
+            while True:
+                try:
+                    event = self._events.get(timeout=keepalive_s)
+                except queue.Empty:
+                    if self._closed:
+                        return
+                    yield ': keepalive\n\n'
+                    continue
+                if event is None:
+                    return
+                yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+        finally:
+            with self._cond:
+                self._subscribed = False
+
+
+class StreamManager:
+    """管理所有流会话，超时未活动的会话自动关闭"""
+
+    def __init__(self, detector, idle_timeout_s=120.0, max_sessions=16, submit=None):
+        self.detector = detector
+        self.submit = submit
+        self.idle_timeout_s = idle_timeout_s
+        self.max_sessions = max_sessions
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def create(self, **kwargs):
+        self._expire()
+        with self._lock:
+            if len(self._sessions) >= self.max_sessions:
+                raise RuntimeError('流会话数已达上限')
+            session = StreamSession(self.detector, submit=self.submit, **kwargs)
+            self._sessions[session.session_id] = session
+        return session
+
+    def get(self, session_id):
+        """返回会话；超时未活动的会话在此一并关闭，已过期的会话返回 None"""
+        self._expire()
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def stop(self, session_id):
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is not None:
+            session.close()
+        return session
+
+    def _expire(self):
+        now = time.time()
+        with self._lock:
+            idle = [sid for sid, s in self._sessions.items() if now - s.last_active > self.idle_timeout_s]
+            expired = [self._sessions.pop(sid) for sid in idle]
+        for session in expired:
+            session.close()
@@ -0,0 +1,114 @@
+# stress_inference.py
+"""并发推理压力测试: 验证共享检测器（同一个 cv2.ml.SVM）在多线程下结果确定，并测量 1..N 线程的扩展性
+1. 单线程逐张计算参考结果（特征向量 + 预测）；
+2. 对每个线程数 N，把 “图片 × 轮数” 打乱后交给 N 个线程，所有线程共用同一个检测器，
+   每个结果都与参考逐位比较（特征 np.array_equal，预测完全相同）；
+3. 输出每个 N 的吞吐、相对单线程的加速比与并行效率；出现任何不一致时以非零状态退出。
+图片预先读入内存，测的是解码之后的 CPU 部分（与服务端 InferenceExecutor 执行的内容一致）。
+
+示例:
+    python stress_inference.py --threads 1 2 4 8 --rounds 5                # 默认取上传归档中的图片
+    python stress_inference.py --images static/uploads --threads 1 2 4    # 仓库自带的样本图
+    python stress_inference.py --images dataset/valid --opencv-threads -1   # 对比 OpenCV 默认内部并行
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from dataset_index import list_images
+from inference import read_image
+from upload_archive import ARCHIVE_BLOBS
+from inference_pool import configure_opencv_threads
+
+
+def run_once(detector, data):
+    img = read_image(data)
+    gray, mask = detector.preprocess_image(img)
+    feats = detector.extract_robust_features(gray, mask).astype(np.float32)
+    model, _ = detector.active()
+    _, result = model.predict(feats.reshape(1, -1))
+    return feats, int(result[0, 0])
+
+
+def stress(detector, payloads, threads, rounds, opencv_threads=None, seed=0):
+    reference = [run_once(detector, data) for data in payloads]
+    tasks = [i for i in range(len(payloads)) for _ in range(rounds)]
+    random.Random(seed).shuffle(tasks)
+
+    rows = []
+    for n in threads:
+        configure_opencv_threads(n, opencv_threads)
+
+        def work(i):
+            feats, pred = run_once(detector, payloads[i])
+            ref_feats, ref_pred = reference[i]
+            return np.array_equal(feats, ref_feats) and pred == ref_pred
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=n) as pool:
+            ok = list(pool.map(work, tasks))
+        wall = time.perf_counter() - t0
+        rows.append({'threads': n, 'tasks': len(tasks), 'mismatches': ok.count(False), 'wall_s': wall,
+                     'throughput_ips': len(tasks) / wall})
+    base = rows[0]['throughput_ips'] / rows[0]['threads']
+    for r in rows:
+        r['speedup'] = r['throughput_ips'] / base
+        r['efficiency'] = r['speedup'] / r['threads']
+    return rows
+
+
+def main():
+    from evaluate import load_detector
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--images', default=ARCHIVE_BLOBS, help='图片目录（默认上传归档，即服务端实际收到的图片）')
+    ap.add_argument('--limit', type=int, default=16)
+    ap.add_argument('--threads', type=int, nargs='+', default=None, help='默认 1、2、4 … 直到 2 倍 CPU 核数')
+    ap.add_argument('--rounds', type=int, default=3, help='每张图片在每个线程数下处理的次数')
+    ap.add_argument('--opencv-threads', type=int, default=None,
+                    help='OpenCV 内部线程数；默认与服务端相同（多线程时为 1），-1 为 OpenCV 默认')
+    ap.add_argument('--model', default=None, help='模型文件；默认使用注册表中的激活版本')
+    ap.add_argument('--out', default=None)
+    args = ap.parse_args()
+
+    paths = list_images(args.images, args.limit) if os.path.isdir(args.images) else []
+    if not paths:
+        print(f'{args.images} 下未找到图片（可用 --images static/uploads 指定仓库自带的样本图）')
+        return 1
+    payloads = []
+    for p in paths:
+        with open(p, 'rb') as f:
+            payloads.append(f.read())
+    threads = args.threads
+    if not threads:
+        cores = os.cpu_count() or 1
+        threads, n = [], 1
+        while n <= 2 * cores:
+            threads.append(n)
+            n *= 2
+    detector = load_detector(args.model)
+
+    rows = stress(detector, payloads, sorted(set([1] + threads)), args.rounds, args.opencv_threads)
+    print(f"\n=== 并发推理压力测试 ({len(paths)} 张 × {args.rounds} 轮, CPU 核数 {os.cpu_count()}) ===")
+    print(f"{'线程':>4} {'吞吐(张/秒)':>12} {'加速比':>8} {'效率':>6} {'不一致':>6}")
+    for r in rows:
+        print(f"{r['threads']:>4} {r['throughput_ips']:>12.1f} {r['speedup']:>8.2f} {r['efficiency']:>6.0%} "
+              f"{r['mismatches']:>6}")
+    failed = sum(r['mismatches'] for r in rows)
+    print('✅ 所有线程数下结果与单线程参考完全一致' if not failed else f'❌ {failed} 个结果与参考不一致')
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({'images': len(paths), 'rounds': args.rounds, 'cpu_count': os.cpu_count(), 'results': rows},
+                      f, ensure_ascii=False, indent=2)
+        print('Saved:', args.out)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -5,10 +5,12 @@ import matplotlib.pyplot as plt
 
 """
 汇总并发压测结果：输入一个或多个 JSON（benchmark_concurrent.py / benchmark_classify_only.py 输出），
+或这两个脚本 --table 写出的逐请求列式表（results_table.py），
 生成 CSV 对比表和两张图：RPS vs 并发、P90 延迟 vs 并发。
 
 示例：
   python summarize_concurrency.py --files full_remote_conc.json classify_only_conc.json --outdir output/conc
+  python summarize_concurrency.py --tables output/bench_table --outdir output/conc
 """
 
 
@@ -37,12 +39,39 @@ def load_results(paths):
     return datasets
 
 
+def load_tables(paths):
+    """从逐请求表按 (run_id, mode, concurrency) 聚合，结构与 load_results 相同"""
+    from results_table import read_table
+    df = read_table(paths, columns=['source', 'run_id', 'timestamp', 'mode', 'concurrency', 'ok',
+                                    'client_total_ms'])
+    df = df[(df['source'] == 'benchmark') & df['concurrency'].notna()]
+    df = df.assign(end=df['timestamp'] + df['client_total_ms'].fillna(0) / 1000)
+    runs = df[['run_id', 'mode']].drop_duplicates()
+    multi = runs['mode'].duplicated(keep=False)
+    datasets = []
+    for (run_id, mode), run in df.groupby(['run_id', 'mode'], observed=True, sort=True):
+        label = f'{mode}@{run_id}' if multi[(runs['run_id'] == run_id) & (runs['mode'] == mode)].any() else str(mode)
+        rows = []
+        for conc, g in run.groupby('concurrency', sort=True):
+            ok = g.loc[g['ok'].fillna(False), 'client_total_ms'].dropna()
+            elapsed = g['end'].max() - g['timestamp'].min()
+            rows.append({
+                'concurrency': int(conc),
+                'rps': len(ok) / elapsed if elapsed > 0 else 0,
+                'avg_ms': ok.mean() if len(ok) else None,
+                # 与 JSON 结果相同的分位定义: 排序后取下标 int(p*(n-1))
+                'p90_ms': ok.quantile(0.9, interpolation='lower') if len(ok) else None,
+                'p99_ms': ok.quantile(0.99, interpolation='lower') if len(ok) else None,
+            })
+        datasets.append({'label': label, 'rows': rows})
+    return datasets
+
+
 def write_csv(datasets, out_csv):
-    with open(out_csv, 'w', encoding='utf-8') as f:
-        f.write('dataset,concurrency,rps,avg_ms,p90_ms,p99_ms\n')
-        for ds in datasets:
-            for r in ds['rows']:
-                f.write(f"{ds['label']},{r['concurrency']},{r['rps']},{r['avg_ms']},{r['p90_ms']},{r['p99_ms']}\n")
+    import pandas as pd
+    df = pd.DataFrame([dict(dataset=ds['label'], **r) for ds in datasets for r in ds['rows']],
+                      columns=['dataset', 'concurrency', 'rps', 'avg_ms', 'p90_ms', 'p99_ms'])
+    df.to_csv(out_csv, index=False)
 
 
 def plot(datasets, outdir):
@@ -80,12 +109,17 @@ def plot(datasets, outdir):
 
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument('--files', nargs='+', required=True, help='并发结果 JSON 列表')
+    ap.add_argument('--files', nargs='+', default=[], help='并发结果 JSON 列表')
+    ap.add_argument('--tables', nargs='+', default=[], help='逐请求列式表目录或分片文件')
     ap.add_argument('--outdir', default='output/conc')
     ap.add_argument('--csv', default='conc_summary.csv')
     args = ap.parse_args()
+    if not args.files and not args.tables:
+        ap.error('需要 --files 或 --tables')
 
-    datasets = load_results(args.files)
+    datasets = load_results(args.files) if args.files else []
+    if args.tables:
+        datasets += load_tables(args.tables)
     os.makedirs(args.outdir, exist_ok=True)
     out_csv = os.path.join(args.outdir, args.csv)
     write_csv(datasets, out_csv)
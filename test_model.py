@@ -5,8 +5,9 @@ import os
 import glob
 from inference import PaintDefectDetector
 
-def comprehensive_test():
-    """全面测试模型性能"""
+def comprehensive_test(source="dataset/train", workers=None):
+    """全面测试模型性能（并行提特征 + 特征缓存 + 批量分类，见 evaluate.py）"""
+    from evaluate import index_source, FeatureCache, evaluate, print_report
     print("=== 漆面缺陷检测模型测试 ===")
     
     # 加载模型
@@ -15,71 +16,26 @@ def comprehensive_test():
         print("❌ 模型文件不存在，请先运行 train.py 训练模型")
         return
     
-    detector = PaintDefectDetector()
-    
-    # 测试训练集中的图片
-    train_dir = "dataset/train"
-    test_results = []
-    
-    print("正在测试训练集图片...")
-    for file in os.listdir(train_dir):
-        if file.endswith('.png'):
-            img_path = os.path.join(train_dir, file)
-            base_name = os.path.splitext(file)[0]
-            label_path = os.path.join(train_dir, f"{base_name}.txt")
-            
-            # 真实标签
-            true_label = 1 if os.path.exists(label_path) and os.path.getsize(label_path) > 0 else 0
-            
-            # 预测
-            result = detector.predict_single(img_path)
-            if 'prediction' in result:
-                pred_label = result['prediction']
-                
-                test_results.append({
-                    'file': file,
-                    'true_label': true_label,
-                    'pred_label': pred_label,
-                    'correct': true_label == pred_label
-                })
+    items, missing = index_source(source)
+    if not items:
+        print(f"未找到测试图片: {source}")
+        return
     
-    # 分析结果
-    if test_results:
-        total = len(test_results)
-        correct = sum(1 for r in test_results if r['correct'])
-        
-        # 按类别统计
-        defect_results = [r for r in test_results if r['true_label'] == 1]
-        normal_results = [r for r in test_results if r['true_label'] == 0]
-        
-        defect_correct = sum(1 for r in defect_results if r['correct'])
-        normal_correct = sum(1 for r in normal_results if r['correct'])
-        
-        print(f"\n=== 测试结果汇总 ===")
-        print(f"总测试图片: {total}")
-        print(f"总体准确率: {correct}/{total} = {correct/total:.3f}")
-        
-        if defect_results:
-            print(f"缺陷检测: {defect_correct}/{len(defect_results)} = {defect_correct/len(defect_results):.3f}")
-        if normal_results:
-            print(f"正常检测: {normal_correct}/{len(normal_results)} = {normal_correct/len(normal_results):.3f}")
-        
-        # 显示错误案例
-        wrong_predictions = [r for r in test_results if not r['correct']]
-        if wrong_predictions:
-            print(f"\n=== 错误预测案例 (前10个) ===")
-            for i, result in enumerate(wrong_predictions[:10]):
-                true_type = "缺陷" if result['true_label'] == 1 else "正常"
-                pred_type = "缺陷" if result['pred_label'] == 1 else "正常"
-                print(f"❌ {result['file']}: 真实={true_type}, 预测={pred_type}")
-        
-        # 显示正确案例
-        correct_predictions = [r for r in test_results if r['correct']]
-        if correct_predictions:
-            print(f"\n=== 正确预测案例 (前5个) ===")
-            for i, result in enumerate(correct_predictions[:5]):
-                true_type = "缺陷" if result['true_label'] == 1 else "正常"
-                print(f"✅ {result['file']}: {true_type}")
+    detector = PaintDefectDetector()
+    cache = FeatureCache()
+    print(f"正在测试 {source} 中的 {len(items)} 张图片...")
+    report = evaluate(detector, items, workers or os.cpu_count() or 4, cache)
+    cache.save()
+    print_report(report)
+    
+    # 显示正确案例
+    correct_predictions = [r for r in report['results'] if r['correct']]
+    if correct_predictions:
+        print(f"\n=== 正确预测案例 (前5个) ===")
+        for i, result in enumerate(correct_predictions[:5]):
+            true_type = "缺陷" if result['true_label'] == 1 else "正常"
+            print(f"✅ {result['file']}: {true_type}")
+    return report
 
 def test_single_image(image_path):
     """测试单张图片"""
@@ -138,6 +94,40 @@ def test_custom_images():
     for img_path in test_files:
         result = test_single_image(img_path)
 
+def test_cascade_gate_inherited_by_incremental_version(tmp_path):
+    """增量更新发布的新版本沿用基础版本的级联阈值: 干净面板仍在第一级放行（cascade_stage == 1）"""
+    import shutil
+    from cascade import CascadeGate, gate_path
+    from model_registry import ModelRegistry, ModelWatcher
+
+    root = str(tmp_path / "model")
+    os.makedirs(root)
+    shutil.copyfile("model/svm_defect.xml", os.path.join(root, "svm_defect.xml"))
+    registry = ModelRegistry(root, default_model=os.path.join(root, "svm_defect.xml"))
+    path, version = registry.verified_path(prefer_snapshot=False)
+    detector = PaintDefectDetector(path, model_version=version)
+    CascadeGate((0.01, 0.05), version, 0.99).save(gate_path(root, version))
+    watcher = ModelWatcher(registry, detector)
+    watcher.reload_cascade()
+    clean = np.full((512, 512, 3), 128, dtype=np.uint8)
+    assert detector.predict_image(clean)['cascade_stage'] == 1
+
+    # 与 IncrementalTrainer 相同: 登记派生版本后直接在检测器上热切换，不经过 watcher.reload
+    model, base = detector.active()
+    derived = registry.publish(model, note='incremental +1', base=base)
+    detector.swap_model(model, derived)
+    watcher.poll()
+    assert detector.model_version == derived
+    assert detector.cascade is not None and detector.cascade.model_version == base
+    assert detector.predict_image(clean)['cascade_stage'] == 1
+
+    # 全量重训登记的版本没有基础版本，也没有自己的阈值: 关闭级联
+    retrained = registry.publish(model, note='full retrain')
+    watcher.poll()
+    assert detector.model_version == retrained
+    assert detector.cascade is None
+    assert 'cascade_stage' not in detector.predict_image(clean)
+
 if __name__ == "__main__":
     # 全面测试
     comprehensive_test()
@@ -0,0 +1,120 @@
+# tracing.py
+"""请求追踪: 贯穿客户端与服务端的 trace id + 服务端分阶段 span
+客户端（templates/index.html）为每次推理生成 trace id，放在 X-Trace-Id 请求头中；服务端沿用该 id（没有时生成），
+按阶段记录 span 并通过响应头返回:
+    X-Trace-Id: 3f9c...
+    Server-Timing: receive;dur=41.2, save;dur=2.1, queue;dur=0.3, decode;dur=6.0, preprocess;dur=3.9,
+                   features;dur=9.8, predict;dur=0.2, serialize;dur=0.1, total;dur=22.4
+span 同时写入逐请求日志（request_log.py），客户端把解析出的 span 与 trace id 一起放进性能日志，两边可以按 id 关联。
+
+total 为服务端处理耗时，不含 receive: werkzeug 在处理函数里才从 socket 读取请求体，大图上传时这段时间属于网络传输。
+因此 “客户端往返 network_ms - 服务端 total” 才是真正的网络耗时（true_network_ms）；
+原来的分析把 network_ms 直接当网络耗时、再加上服务端耗时，服务端时间被算了两次。
+"""
+
+import re
+import time
+import uuid
+
+TRACE_HEADER = 'X-Trace-Id'
+# 不计入服务端处理耗时的 span
+NETWORK_SPANS = ('receive',)
+_TRACE_ID_RE = re.compile(r'^[0-9A-Za-z\-]{8,64}$')
+
+
+def new_trace_id():
+    return uuid.uuid4().hex
+
+
+class Trace:
+    def __init__(self, trace_id=None, started=None):
+        self.trace_id = trace_id if trace_id and _TRACE_ID_RE.match(trace_id) else new_trace_id()
+        self.started = time.perf_counter() if started is None else started
+        self.spans = {}
+
+    def add(self, name, ms):
+        """累加一个 span（同名 span 多次出现时求和）"""
+        if ms is not None:
+            self.spans[name] = self.spans.get(name, 0.0) + float(ms)
+
+    def span(self, name):
+        return _Span(self, name)
+
+    def add_timing(self, timing):
+        """把推理结果中的 timing（preprocess_ms 含解码）拆成 decode / preprocess / features / predict span"""
+        timing = timing or {}
+        decode = timing.get('decode_ms')
+        preprocess = timing.get('preprocess_ms')
+        self.add('decode', decode)
+        if preprocess is not None:
+            self.add('preprocess', max(0.0, preprocess - (decode or 0.0)))
+        self.add('features', timing.get('feature_ms'))
+        self.add('predict', timing.get('predict_ms'))
+
+    def total_ms(self):
+        elapsed = (time.perf_counter() - self.started) * 1000
+        return elapsed - sum(self.spans.get(n, 0.0) for n in NETWORK_SPANS)
+
+    def finish(self):
+        """返回 {span: ms}，含 total"""
+        spans = {k: round(v, 3) for k, v in self.spans.items()}
+        spans['total'] = round(self.total_ms(), 3)
+        return spans
+
+    @staticmethod
+    def header(spans):
+        return ', '.join(f'{name};dur={ms:.3f}' for name, ms in spans.items())
+
+
+class _Span:
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.add(self.name, (time.perf_counter() - self.t0) * 1000)
+        return False
+
+
+def parse_server_timing(value):
+    """解析 Server-Timing 头: 'a;dur=1.2, b;dur=3' -> {'a': 1.2, 'b': 3.0}"""
+    spans = {}
+    for part in (value or '').split(','):
+        fields = [f.strip() for f in part.split(';')]
+        if not fields or not fields[0]:
+            continue
+        for f in fields[1:]:
+            if f.startswith('dur='):
+                try:
+                    spans[fields[0]] = float(f[4:])
+                except ValueError:
+                    pass
+    return spans
+
+
+def server_time_ms(entry):
+    """客户端性能日志条目中的服务端处理耗时: 优先 Server-Timing 的 total，其次端点耗时、推理总耗时、分类耗时"""
+    spans = entry.get('server_spans') or {}
+    if spans.get('total') is not None:
+        return spans['total']
+    st = entry.get('server_timing') or {}
+    for key in ('endpoint_ms', 'total_ms', 'predict_ms'):
+        if st.get(key) is not None:
+            return st[key]
+    return None
+
+
+def true_network_ms(entry):
+    """真正的网络耗时 = 客户端往返 network_ms - 服务端处理耗时；缺少任一项时返回 None"""
+    ct = entry.get('client_timing') or {}
+    if ct.get('true_network_ms') is not None:
+        return ct['true_network_ms']
+    network = ct.get('network_ms')
+    server = server_time_ms(entry)
+    if network is None or server is None:
+        return None
+    return max(0.0, network - server)
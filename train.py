@@ -2,11 +2,27 @@
 import cv2
 import numpy as np
 import os
-import glob
-from sklearn import svm
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import classification_report
-import pandas as pd
+from dataset_index import open_index, DatasetIndex
+from model_registry import ModelRegistry
+
+# 特征缓存：全量训练时提取的特征矩阵，供增量训练合并使用
+FEATURE_STORE_PATH = "model/feature_store.npz"
+
+def load_feature_store(path=FEATURE_STORE_PATH):
+    """读取特征缓存，返回 (X, y, paths)；不存在时返回空数组"""
+    if not os.path.exists(path):
+        return np.empty((0, 0), dtype=np.float32), np.empty((0,), dtype=np.int32), []
+    data = np.load(path, allow_pickle=False)
+    return data['X'], data['y'], [str(p) for p in data['paths']]
+
+def save_feature_store(X, y, paths, path=FEATURE_STORE_PATH):
+    """原子写入特征缓存（先写临时文件再替换）"""
+    tmp_path = path + ".tmp.npz"
+    np.savez_compressed(tmp_path,
+                        X=np.asarray(X, dtype=np.float32),
+                        y=np.asarray(y, dtype=np.int32),
+                        paths=np.asarray(paths, dtype=str))
+    os.replace(tmp_path, path)
 
 class PaintDefectTrainer:
     def __init__(self, img_size=(512, 512)):
@@ -104,15 +120,13 @@ class PaintDefectTrainer:
         defect_files = []
         normal_files = []
         
-        # 分类文件
-        for file in glob.glob(os.path.join(train_dir, "*.png")):
-            base_name = os.path.splitext(os.path.basename(file))[0]
-            label_path = os.path.join(train_dir, f"{base_name}.txt")
-            
-            if os.path.exists(label_path) and os.path.getsize(label_path) > 0:
-                defect_files.append(file)
+        # 分类文件：图片与标注摘要来自数据集清单（增量更新，只重新读取改动过的文件）
+        index = open_index(train_dir, refresh=True)
+        for entry in index.images(under=train_dir):
+            if DatasetIndex.label_of(entry):
+                defect_files.append(index.abspath(entry))
             else:
-                normal_files.append(file)
+                normal_files.append(index.abspath(entry))
         
         print(f"原始数据 - 缺陷: {len(defect_files)}, 正常: {len(normal_files)}")
         
@@ -150,6 +164,11 @@ class PaintDefectTrainer:
     
     def train_model(self):
         """训练模型"""
+        # sklearn 仅训练时需要；延迟导入，避免 app.py 经 online_update 引入本模块时拖慢冷启动
+        from sklearn import svm
+        from sklearn.model_selection import train_test_split
+        from sklearn.metrics import classification_report
+
         print("开始训练漆面缺陷检测模型...")
         
         X, y, paths = self.create_balanced_dataset()
@@ -190,8 +209,11 @@ class PaintDefectTrainer:
         model.setKernel(cv2.ml.SVM_RBF)
         model.train(X.astype(np.float32), cv2.ml.ROW_SAMPLE, y.astype(np.int32))
         model.save("model/svm_defect.xml")
+        save_feature_store(X, y, paths)
+        version = ModelRegistry("model").publish_file("model/svm_defect.xml", note='full retrain')
         
-        print(f"\n模型已保存: model/svm_defect.xml")
+        print(f"\n模型已保存: model/svm_defect.xml (版本 {version})")
+        print(f"特征缓存已保存: {FEATURE_STORE_PATH}")
         print(f"特征维度: {X.shape[1]}")
         
         return clf
@@ -0,0 +1,272 @@
+# upload_archive.py
+"""上传图片归档: 后台写盘 + 内容寻址 + 保留策略
+原来 /predict 在请求线程里用客户端文件名同步写 static/uploads: 同名文件互相覆盖，目录只增不减，
+磁盘抖动直接体现在 p99 上。现在请求线程只计算 sha256 并把文件内容放入队列（推理直接用内存中的内容），
+由后台写线程落盘:
+
+- 内容寻址: output/upload_archive/blobs/<sha 前两位>/<sha256><扩展名>，相同内容只存一份（重复上传只刷新 mtime）；
+  names.jsonl 追加记录“文件名 -> sha256”，/feedback 可以按 upload_id（sha256）或文件名找回图片；
+- 可选重压缩: recompress_quality 为 JPEG 质量、max_side 为最长边上限，都为空时按原样保存；
+- 保留策略: 超过 max_age_days 的文件删除；总大小超过 max_bytes 时按 mtime 从旧到新删除；
+  写线程每处理完一项（以及空闲时每秒）检查墙钟时间，距上次整理超过 compact_interval_s 或总量超限就整理一次，
+  持续有上传时也不会推迟；整理时把 names.jsonl 重写为仍存在的文件的最新记录；
+- 背压: 待写内容超过 max_pending_bytes 时丢弃本次归档（计入 dropped），不阻塞请求。
+
+示例:
+    python upload_archive.py --stats
+    python upload_archive.py --compact --max-bytes 2000000000 --max-age-days 30
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+
+ARCHIVE_ROOT = 'output/upload_archive'
+ARCHIVE_BLOBS = os.path.join(ARCHIVE_ROOT, 'blobs')  # 压测、回放、特征一致性脚本默认从这里取真实上传的图片
+ARCHIVE_EXTS = ('.png', '.jpg', '.jpeg', '.bmp', '.webp', '.pdg')  # .pdg: gray_upload 的原始灰度格式
+
+
+def shas_named(root, prefix):
+    """names.jsonl 中上传文件名以 prefix 开头的内容 sha256 集合（回放脚本据此排除自己合成的负载）"""
+    path = os.path.join(root, 'names.jsonl')
+    shas = set()
+    if not os.path.exists(path):
+        return shas
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            if rec.get('name', '').startswith(prefix):
+                shas.add(rec.get('sha256'))
+    return shas
+
+
+class UploadArchive:
+    def __init__(self, root=ARCHIVE_ROOT, max_bytes=2 * 1024 ** 3, max_age_days=30, recompress_quality=None,
+                 max_side=None, max_pending_bytes=256 * 1024 * 1024, compact_interval_s=600):
+        self.root = root
+        self.blob_dir = os.path.join(root, 'blobs')
+        self.names_path = os.path.join(root, 'names.jsonl')
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.recompress_quality = recompress_quality
+        self.max_side = max_side
+        self.max_pending_bytes = max_pending_bytes
+        self.compact_interval_s = compact_interval_s
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._pending = {}          # sha256 -> (文件内容, 扩展名)
+        self._pending_bytes = 0
+        self._blobs = {}            # sha256 -> [相对路径, 大小, mtime]
+        self._names = {}            # 文件名 -> sha256
+        self._total_bytes = 0
+        self._thread = None
+        self._last_compact = time.time()
+        self.stats = {'submitted': 0, 'written': 0, 'deduplicated': 0, 'dropped': 0, 'removed': 0,
+                      'compactions': 0, 'errors': 0}
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        for sub in os.scandir(self.blob_dir):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                if entry.name.endswith('.tmp'):
+                    continue
+                st = entry.stat()
+                sha = os.path.splitext(entry.name)[0]
+                self._blobs[sha] = [f'{sub.name}/{entry.name}', st.st_size, st.st_mtime]
+                self._total_bytes += st.st_size
+        if os.path.exists(self.names_path):
+            with open(self.names_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._names[rec['name']] = rec['sha256']
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='upload-archive', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, data, filename):
+        """请求线程调用: 计算内容哈希并入队，立即返回 upload_id（sha256）"""
+        sha = hashlib.sha256(data).hexdigest()
+        ext = os.path.splitext(filename or '')[1].lower()
+        ext = ext if ext in ARCHIVE_EXTS else '.bin'
+        with self._lock:
+            self.stats['submitted'] += 1
+            if sha not in self._pending:
+                if self._pending_bytes + len(data) > self.max_pending_bytes:
+                    self.stats['dropped'] += 1
+                    return sha
+                self._pending[sha] = (data, ext)
+                self._pending_bytes += len(data)
+        self._queue.put((sha, os.path.basename(filename or '')))
+        return sha
+
+    def read(self, key):
+        """按 upload_id 或文件名取回图片内容（含尚未落盘的）；找不到时返回 None"""
+        with self._lock:
+            sha = key if key in self._pending or key in self._blobs else self._names.get(os.path.basename(key))
+            if sha is None:
+                return None
+            pending = self._pending.get(sha)
+            blob = self._blobs.get(sha)
+        if pending is not None:
+            return pending[0]
+        if blob is None:
+            return None
+        try:
+            with open(os.path.join(self.blob_dir, blob[0]), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def flush(self):
+        """等待队列中的内容全部落盘"""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                self._maybe_compact()
+                continue
+            if item is None:
+                self._queue.task_done()
+                break
+            try:
+                self._store(*item)
+            except OSError as e:
+                self.stats['errors'] += 1
+                print(f"❌ 上传归档失败: {e}")
+            finally:
+                with self._lock:
+                    data, _ = self._pending.pop(item[0], (b'', None))
+                    self._pending_bytes -= len(data)
+                self._queue.task_done()
+            self._maybe_compact()
+
+    def _maybe_compact(self):
+        if self._total_bytes > self.max_bytes or time.time() - self._last_compact >= self.compact_interval_s:
+            self.compact()
+
+    def _encode(self, data, ext):
+        if not self.recompress_quality and not self.max_side:
+            return data, ext
+        import cv2
+        import numpy as np
+        img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            return data, ext
+        h, w = img.shape[:2]
+        if self.max_side and max(h, w) > self.max_side:
+            s = self.max_side / max(h, w)
+            img = cv2.resize(img, (int(w * s), int(h * s)), interpolation=cv2.INTER_AREA)
+        ok, buf = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, int(self.recompress_quality or 90)])
+        return (buf.tobytes(), '.jpg') if ok else (data, ext)
+
+    def _store(self, sha, name):
+        with self._lock:
+            pending = self._pending.get(sha)
+            blob = self._blobs.get(sha)
+        if blob is not None:
+            # 重复内容: 只刷新 mtime，使保留策略按最近一次上传计算
+            os.utime(os.path.join(self.blob_dir, blob[0]))
+            blob[2] = time.time()
+            self.stats['deduplicated'] += 1
+        elif pending is not None:
+            data, ext = self._encode(*pending)
+            rel = f'{sha[:2]}/{sha}{ext}'
+            path = os.path.join(self.blob_dir, rel)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + '.tmp', 'wb') as f:
+                f.write(data)
+            os.replace(path + '.tmp', path)
+            with self._lock:
+                self._blobs[sha] = [rel, len(data), time.time()]
+            self._total_bytes += len(data)
+            self.stats['written'] += 1
+        else:
+            return
+        if name:
+            with self._lock:
+                self._names[name] = sha
+            with open(self.names_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'name': name, 'sha256': sha, 'at': round(time.time(), 3)},
+                                   ensure_ascii=False) + '\n')
+
+    def compact(self):
+        """按保留策略删除文件，并重写 names.jsonl；返回删除的文件数"""
+        now = time.time()
+        with self._lock:
+            blobs = sorted(self._blobs.items(), key=lambda kv: kv[1][2])
+        total = sum(b[1] for _, b in blobs)
+        removed = []
+        for sha, (rel, size, mtime) in blobs:
+            expired = self.max_age_days is not None and now - mtime > self.max_age_days * 86400
+            if not expired and total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.blob_dir, rel))
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed.append(sha)
+        with self._lock:
+            for sha in removed:
+                self._blobs.pop(sha, None)
+            self._names = {n: s for n, s in self._names.items() if s in self._blobs}
+            names = dict(self._names)
+        self._total_bytes = total
+        tmp_path = self.names_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for name, sha in names.items():
+                f.write(json.dumps({'name': name, 'sha256': sha}, ensure_ascii=False) + '\n')
+        os.replace(tmp_path, self.names_path)
+        self._last_compact = now
+        self.stats['removed'] += len(removed)
+        self.stats['compactions'] += 1
+        return len(removed)
+
+    def summary(self):
+        with self._lock:
+            return dict(self.stats, files=len(self._blobs), bytes=self._total_bytes, names=len(self._names),
+                        pending=len(self._pending), pending_bytes=self._pending_bytes)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--root', default=ARCHIVE_ROOT)
+    ap.add_argument('--stats', action='store_true', help='输出归档统计')
+    ap.add_argument('--compact', action='store_true', help='按保留策略立即整理')
+    ap.add_argument('--max-bytes', type=int, default=2 * 1024 ** 3)
+    ap.add_argument('--max-age-days', type=float, default=30)
+    args = ap.parse_args()
+
+    archive = UploadArchive(args.root, max_bytes=args.max_bytes, max_age_days=args.max_age_days)
+    if args.compact:
+        print(f'删除 {archive.compact()} 个文件')
+    print(json.dumps(archive.summary(), ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -6,26 +6,79 @@ import matplotlib.pyplot as plt
 """将 analyze_mobile_logs.py 的 summary.json 或原始 mobile_perf_logs.json 转换为图表.
 示例:
     python visualize_logs.py --summary summary.json --outdir output/figs
+    python visualize_logs.py --table output/perf_table --outdir output/figs
 输出:
   - bar_end_to_end.png : 各分组平均端到端耗时条形图
   - stacked_time_breakdown.png : 客户端 vs 服务器平均耗时堆叠
-  - network_vs_upload.png : 上传大小 vs 网络耗时散点
+  - network_vs_upload.png : 上传大小 vs 网络耗时散点（仅 --table，需要逐条数据）
 """
 
 def load_summary(path):
     with open(path,'r',encoding='utf-8') as f:
         return json.load(f)
 
+def groups_from_table(df):
+    """逐条表 -> 与 summary 相同的分组均值（分组键、端到端与服务端耗时的定义同 analyze_mobile_logs: 端到端即客户端总耗时，
+    服务端耗时取 server_time_ms，即 Server-Timing 的 total，旧日志退回 endpoint_ms / total_ms / predict_ms）"""
+    df = df.assign(
+        mode=df['mode'].astype('string').fillna('unknown'),
+        resize_target=df['resize_target'].astype('string').fillna('none'),
+        network_type=df['network_type'].astype('string').fillna('unknown'),
+        end_to_end=df['client_total_ms'],
+    )
+    groups = []
+    for (mode, resize, net), g in df.groupby(['mode', 'resize_target', 'network_type'], sort=False):
+        groups.append({
+            'key': f'{mode}|{resize}|{net}',
+            'mode': mode,
+            'resize': resize,
+            'network': net,
+            'end_avg': g['end_to_end'].mean(skipna=True) if g['end_to_end'].notna().any() else 0,
+            'client_avg': g['client_total_ms'].mean() if g['client_total_ms'].notna().any() else 0,
+            'server_avg': g['server_time_ms'].mean() if g['server_time_ms'].notna().any() else 0,
+            'samples': len(g)
+        })
+    return groups
+
+def plot_network_vs_upload(df, outdir):
+    df = df[df['uploaded_size'].notna() & df['network_ms'].notna()]
+    if df.empty:
+        return False
+    plt.figure(figsize=(8,6))
+    for mode, g in df.groupby(df['mode'].astype('string').fillna('unknown')):
+        plt.scatter(g['uploaded_size'].astype(float) / 1024, g['network_ms'], s=12, alpha=0.6, label=mode)
+    plt.xlabel('Uploaded Size (KB)')
+    plt.ylabel('Network (ms)')
+    plt.title('Network Time vs Upload Size')
+    plt.grid(True, alpha=0.3)
+    plt.legend()
+    plt.tight_layout()
+    plt.savefig(os.path.join(outdir,'network_vs_upload.png'))
+    plt.close()
+    return True
+
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument('--summary', required=True, help='summary.json 文件')
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument('--summary', help='summary.json 文件')
+    src.add_argument('--table', nargs='+', help='analyze_mobile_logs.py --table 写出的列式表目录')
     ap.add_argument('--outdir', default='output/figs')
     args = ap.parse_args()
 
-    data = load_summary(args.summary)
     os.makedirs(args.outdir, exist_ok=True)
+    if args.table:
+        from results_table import read_table
+        table = read_table(args.table, columns=['source', 'mode', 'resize_target', 'network_type',
+                                                'client_total_ms', 'server_time_ms', 'network_ms',
+                                                'uploaded_size'])
+        table = table[table['source'] == 'perf_log']
+        groups = groups_from_table(table)
+        data = {}
+    else:
+        table = None
+        groups = []
+        data = load_summary(args.summary)
 
-    groups = []
     for k,v in data.items():
         end_stats = v.get('end_to_end_stats',{})
         client_stats = v.get('client_total_stats',{})
@@ -57,11 +110,11 @@ def main():
     plt.savefig(os.path.join(args.outdir,'bar_end_to_end.png'))
     plt.close()
 
-    # 堆叠图: 客户端 vs 服务器耗时
+    # 堆叠图: 客户端（含网络）vs 服务器耗时；客户端总耗时已包含服务端处理，堆叠前先扣除
     plt.figure(figsize=(max(10,len(labels)*0.6),6))
-    client_vals = [g['client_avg'] for g in groups]
     server_vals = [g['server_avg'] for g in groups]
-    plt.bar(labels, client_vals, label='Client', color='#8ecae6')
+    client_vals = [max(0, g['client_avg'] - g['server_avg']) for g in groups]
+    plt.bar(labels, client_vals, label='Client + Network', color='#8ecae6')
     plt.bar(labels, server_vals, bottom=client_vals, label='Server', color='#ffb703')
     plt.xticks(rotation=60, ha='right')
     plt.ylabel('Avg Latency (ms)')
@@ -71,9 +124,11 @@ def main():
     plt.savefig(os.path.join(args.outdir,'stacked_time_breakdown.png'))
     plt.close()
 
-    # 散点图: 上传大小 vs 网络耗时 (需要原始日志另处理; 这里使用 summary 无法提供)
-    # 若扩展: 可以允许传原始日志文件; 暂留占位说明.
-    print('Created figures: bar_end_to_end.png, stacked_time_breakdown.png')
+    # 散点图: 上传大小 vs 网络耗时 (summary 只有分组统计, 需要 --table 的逐条数据)
+    created = ['bar_end_to_end.png', 'stacked_time_breakdown.png']
+    if table is not None and plot_network_vs_upload(table, args.outdir):
+        created.append('network_vs_upload.png')
+    print('Created figures: ' + ', '.join(created))
 
 if __name__ == '__main__':
     main()
\ No newline at end of file